@@ -0,0 +1,203 @@
+"""
+Eräajo
+
+Komentorivityökalu, jolla spektrianalyysi voidaan suorittaa ilman graafista
+käyttöliittymää, esim. suurelle joukolle mittauskansioita palvelimella.
+Kustakin kansiosta luetaan mittausdata, siitä poistetaan tausta ja annettujen
+piikkien intensiteetit lasketaan. Oletuksena tausta on suora annettujen energioiden
+kohdalta; muut taustamallit (ks. taustat.py) valitaan --malli-valitsimella.
+Tulokset kirjoitetaan sarkaimin eroteltuina riveinä tiedostoon tai näytölle.
+
+Esimerkkejä:
+    python eraajo.py data/ajo1 data/ajo2 --tausta 296 274 --piikki 283 287 --piikki 288 291
+    python eraajo.py data/ajo1 --malli shirley --tausta 280 295 --piikki 283 287
+    python eraajo.py data/ajo1 --malli polynomi --aste 2 --alue 270 278 --alue 292 300 \
+        --piikki 283 287
+    python eraajo.py data/ajo1 data/ajo2 --tausta 296 274 --etsi-piikit
+
+--etsi-piikit etsii piikit ja niiden integrointivälit kustakin kansiosta automaattisesti
+(ks. piikit.py), jolloin --piikki-välejä ei tarvita.
+
+--matriisi tallentaa kunkin kansion tiedostokohtaiset intensiteetit levylle
+(ks. matriisi.py), jolloin niitä voidaan myöhemmin käsitellä lukematta tekstitiedostoja.
+
+--valimuisti-koko rajaa välimuistin koon. Käsiteltävän kansion tiedostoja ei poisteta
+välimuistista, joten sitä suuremmankin kansion uudelleenajo lukee tiedostot välimuistista.
+
+--toleranssi määrää, kuinka paljon tiedoston energiat saavat poiketa ensimmäisen
+tiedoston energioista (suhteessa energia-askeleeseen); muussa hilassa mitatut tiedostot
+interpoloidaan ensimmäisen tiedoston energioihin.
+
+Työkalu ei tuo tkinteriä eikä matplotlibiä.
+"""
+
+import argparse
+import contextlib
+import csv
+import sys
+import spektrilaskenta as sl
+import taustat
+import piikit as pk
+import matriisi as mt
+
+OTSAKE = ["kansio", "tiedostoja", "e_min", "e_max", "intensiteetti"]
+
+def poista_tausta(energiat, summaintensiteetit, asetukset):
+    """
+    Poistaa summaintensiteeteistä asetusten mukaisen taustan. Lineaarisella mallilla
+    tausta on kahden energian monikko; taustasuora kulkee niitä lähimpien mittauspisteiden
+    kautta. Shirley- ja Tougaard-malleilla tausta on energiaväli, ja polynomimalli
+    sovitetaan alueet-listan (e_min, e_max) -alueisiin.
+    Palauttaa taustattoman signaalin tai None, jos taustaa ei voitu poistaa.
+    """
+
+    tausta = asetukset.tausta
+
+    if asetukset.malli == "lineaarinen":
+        piste_a = sl.lahin_piste(energiat, summaintensiteetit, tausta[0])
+        piste_b = sl.lahin_piste(energiat, summaintensiteetit, tausta[1])
+
+        if piste_a == piste_b: # Pisteet eivät saa olla samat (vrt. käyttöliittymä).
+            return None
+
+        mallin_asetukset = {"piste_a": piste_a, "piste_b": piste_b}
+    elif asetukset.malli == "polynomi":
+        mallin_asetukset = {"alueet": asetukset.alueet, "aste": asetukset.aste}
+    else:
+        mallin_asetukset = {"minimi": tausta[0], "maksimi": tausta[1]}
+
+    try:
+        return taustat.poista_tausta(asetukset.malli, energiat, summaintensiteetit,
+                                     **mallin_asetukset)
+    except ValueError: # Esim. taustan alueille ei osunut tarpeeksi mittauspisteitä.
+        return None
+
+def kasittele_kansio(polku, asetukset):
+    """
+    Lukee kansion mittausdatan, poistaa siitä taustan ja laskee piikkien intensiteetit.
+    asetukset on lue_argumentit -funktion palauttama nimiavaruus: taustan malli ja
+    energiat (ks. poista_tausta), piikit (e_min, e_max) -monikoina (None, jos ne etsitään
+    taustattomasta datasta automaattisesti) sekä lukemisen asetukset. Jos matriisi on
+    annettu, kansion tiedostokohtainen intensiteettimatriisi tallennetaan sen alle
+    (ks. matriisi.polku). toleranssi on energioiden vertailun toleranssi
+    (ks. spektrilaskenta.ENERGIATOLERANSSI) ja valimuisti_koko välimuistin enimmäiskoko
+    megatavuina.
+    Palauttaa kelvollisten tiedostojen lukumäärän, piikkien integrointivälit ja listan
+    intensiteeteistä piikkien järjestyksessä, tai None, jos kansiosta ei saatu luettua dataa.
+    """
+
+    energiat, summaintensiteetit, lkm, _ = sl.lue_kansio(
+        polku, asetukset.prosesseja, asetukset.valimuisti,
+        matriisi=mt.polku(asetukset.matriisi, polku) if asetukset.matriisi else None,
+        matriisin_tyyppi=asetukset.matriisin_tyyppi, toleranssi=asetukset.toleranssi,
+        valimuistin_koko=asetukset.valimuisti_koko * 1024 ** 2)
+    sl.unohda_kansio(polku) # Kansiota ei lueta uudelleen, joten sen tilaa ei tarvitse säilyttää.
+
+    if energiat is None: # Yksikään tiedosto ei kelvannut.
+        return None
+
+    taustaton = poista_tausta(energiat, summaintensiteetit, asetukset)
+
+    if taustaton is None:
+        return None
+
+    piikit = asetukset.piikit
+
+    if piikit is None:
+        _, piikit = pk.etsi_piikit(energiat, taustaton)
+        # Automaattisessa etsinnässä piikit etsitään kansiokohtaisesti.
+
+    intensiteetit = sl.laske_piikkien_intensiteetit(energiat, taustaton, piikit).tolist()
+    # Kaikki piikit lasketaan kerralla yhdestä kumulatiivisesta integraalista samalla
+    # tavalla kuin käyttöliittymässä, joten sama ikkuna antaa saman intensiteetin.
+
+    return lkm, piikit, intensiteetit
+
+def lue_argumentit(argumentit=None):
+    """
+    Tulkitsee komentoriviargumentit.
+    """
+
+    jasennin = argparse.ArgumentParser(
+        description="Laskee mittauskansioiden piikkien intensiteetit ilman käyttöliittymää.")
+    jasennin.add_argument("kansiot", nargs="+", metavar="KANSIO",
+                          help="kansio, josta measurement_X.txt -tiedostot luetaan")
+    jasennin.add_argument("--malli", choices=list(taustat.MALLIT), default="lineaarinen",
+                          help="taustamalli (oletuksena lineaarinen)")
+    jasennin.add_argument("--tausta", nargs=2, type=float, metavar=("E_A", "E_B"),
+                          help="energiat, joiden kautta lineaarinen tausta kulkee, tai "
+                               "Shirley- ja Tougaard-taustan energiaväli")
+    jasennin.add_argument("--alue", nargs=2, type=float, action="append",
+                          metavar=("E_MIN", "E_MAX"), dest="alueet",
+                          help="polynomitaustan sovitusalue; voidaan antaa useasti")
+    jasennin.add_argument("--aste", type=int, default=1,
+                          help="polynomitaustan asteluku (oletuksena 1)")
+    jasennin.add_argument("--piikki", nargs=2, type=float, action="append",
+                          metavar=("E_MIN", "E_MAX"), dest="piikit",
+                          help="integroitava energiaväli; voidaan antaa useasti")
+    jasennin.add_argument("--etsi-piikit", action="store_true",
+                          help="etsi piikit ja niiden integrointivälit automaattisesti")
+    jasennin.add_argument("--prosesseja", type=int, default=1,
+                          help="rinnakkain tiedostoja jäsentävien prosessien määrä")
+    jasennin.add_argument("--valimuisti", default=None,
+                          help="kansio, johon jäsennetyt tiedostot tallennetaan välimuistiin")
+    jasennin.add_argument("--valimuisti-koko", type=int, metavar="MT",
+                          default=sl.VALIMUISTIN_KOKO // 1024 ** 2,
+                          help="välimuistin enimmäiskoko megatavuina; käsiteltävän kansion "
+                               "tiedostot säilytetään aina (oletuksena %(default)s)")
+    jasennin.add_argument("--matriisi", default=None, metavar="KANSIO",
+                          help="kansio, jonka alle kunkin kansion tiedostokohtainen "
+                               "intensiteettimatriisi tallennetaan")
+    jasennin.add_argument("--matriisin-tyyppi", choices=mt.TYYPIT, default="float64",
+                          help="matriisin tietotyyppi (oletuksena float64)")
+    jasennin.add_argument("--toleranssi", type=float, default=sl.ENERGIATOLERANSSI,
+                          help="energioiden vertailun toleranssi suhteessa energia-askeleeseen "
+                               f"(oletuksena {sl.ENERGIATOLERANSSI})")
+    jasennin.add_argument("--tuloste", default=None,
+                          help="tiedosto, johon tulokset kirjoitetaan (oletuksena näytölle)")
+
+    asetukset = jasennin.parse_args(argumentit)
+
+    if asetukset.malli == "polynomi" and not asetukset.alueet:
+        jasennin.error("polynomitausta tarvitsee vähintään yhden --alue-valitsimen")
+    elif asetukset.malli != "polynomi" and asetukset.tausta is None:
+        jasennin.error(f"mallille {asetukset.malli} täytyy antaa --tausta")
+
+    if asetukset.etsi_piikit == bool(asetukset.piikit):
+        jasennin.error("anna joko --piikki-välit tai --etsi-piikit")
+
+    return asetukset
+
+def main(argumentit=None):
+    """
+    Käsittelee komentorivillä annetut kansiot ja kirjoittaa tulokset.
+    Palauttaa paluukoodin: 0, jos kaikki kansiot saatiin käsiteltyä, muuten 1.
+    """
+
+    asetukset = lue_argumentit(argumentit)
+    paluukoodi = 0
+
+    with (open(asetukset.tuloste, "w", newline="", encoding="utf-8") if asetukset.tuloste
+          else contextlib.nullcontext(sys.stdout)) as kohde:
+        # Tulostiedosto on aina UTF-8, riippumatta järjestelmän oletusmerkistöstä;
+        # näytölle kirjoitettaessa sys.stdout jätetään auki.
+        kirjoittaja = csv.writer(kohde, delimiter="\t", lineterminator="\n")
+        kirjoittaja.writerow(OTSAKE)
+
+        for kansio in asetukset.kansiot:
+            tulos = kasittele_kansio(kansio, asetukset)
+
+            if tulos is None:
+                print(f"Kansiosta {kansio} ei saatu laskettua tuloksia.", file=sys.stderr)
+                paluukoodi = 1
+                continue
+
+            lkm, ikkunat, intensiteetit = tulos
+
+            for (e_min, e_max), intensiteetti in zip(ikkunat, intensiteetit):
+                kirjoittaja.writerow([kansio, lkm, e_min, e_max, repr(intensiteetti)])
+
+    return paluukoodi
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Harvennus
+
+Suurten spektrien piirtäminen tarkkuustasoittain (level of detail): kuvaajalle
+piirretään vain näkyvä energiaväli, joka jaetaan yhtä moneen lokeroon kuin
+piirtoalueella on pikselisarakkeita. Kustakin lokerosta piirretään pienin ja suurin
+intensiteetti, joten piikit ja kohina näyttävät samalta kuin täydellä datalla, mutta
+pisteitä on enintään kaksi pikselisaraketta kohden miljoonienkin pisteiden spektrissä.
+
+Harvennus palauttaa valittujen pisteiden indeksit alkuperäisiin taulukoihin, joten
+harvennetulta kuvaajalta valittu piste vastaa tarkasti täyden datan mittauspistettä.
+Moduuli ei tuo matplotlibiä.
+"""
+
+import numpy as np
+import spektrilaskenta as sl
+
+def _aaripisteet(intensiteetit, alku, loppu, koko):
+    """
+    Jakaa välin alku...loppu koko pisteen lokeroihin (viimeinen voi olla vajaa) ja
+    palauttaa kunkin lokeron pienimmän ja suurimman intensiteetin indeksit
+    lokeroittain indeksijärjestyksessä.
+    """
+
+    taydet = (loppu - alku) // koko
+    raja = alku + taydet * koko
+    lohkot = np.asarray(intensiteetit[alku:raja]).reshape(taydet, koko)
+    # Täydet lokerot käsitellään yhtenä matriisina ilman Python-silmukkaa.
+    pohjat = alku + koko * np.arange(taydet)
+    pienimmat = pohjat + lohkot.argmin(axis=1)
+    suurimmat = pohjat + lohkot.argmax(axis=1)
+
+    if raja < loppu: # Vajaa viimeinen lokero.
+        loput = np.asarray(intensiteetit[raja:loppu])
+        pienimmat = np.append(pienimmat, raja + loput.argmin())
+        suurimmat = np.append(suurimmat, raja + loput.argmax())
+
+    indeksit = np.empty(2 * len(pienimmat), dtype=np.intp)
+    indeksit[0::2] = np.minimum(pienimmat, suurimmat)
+    indeksit[1::2] = np.maximum(pienimmat, suurimmat)
+    # Lokeron pisteet piirretään siinä järjestyksessä, jossa ne ovat datassa.
+
+    return indeksit
+
+def harvenna(energiat, intensiteetit, minimi, maksimi, lokeroita):
+    """
+    Palauttaa harvennetun kuvaajan pisteiden indeksit nousevassa järjestyksessä.
+    Energiaväli minimi...maksimi jaetaan lokeroita lokeroon, joista kustakin otetaan
+    pienimmän ja suurimman intensiteetin pisteet. Välin kummallekin puolelle otetaan
+    lisäksi yksi välin ulkopuolinen piste, jotta viiva jatkuu kuvaajan reunoille.
+    Jos välillä on enintään kaksi pistettä lokeroa kohden, palautetaan kaikki pisteet.
+    Energiat voivat olla nousevassa tai laskevassa järjestyksessä.
+    """
+
+    n = len(energiat)
+    alku, loppu = sl.etsi_indeksit(energiat, minimi, maksimi)
+    alku = max(alku - 1, 0)
+    loppu = min(loppu + 1, n)
+    lokeroita = max(int(lokeroita), 1)
+
+    if loppu - alku <= 2 * lokeroita:
+        return np.arange(alku, loppu)
+
+    koko = -(-(loppu - alku) // lokeroita) # Lokeron koko pyöristettynä ylöspäin.
+    indeksit = _aaripisteet(intensiteetit, alku, loppu, koko)
+
+    return np.unique(np.concatenate(([alku], indeksit, [loppu - 1])))
+    # Välin päätepisteet otetaan aina mukaan; unique poistaa päällekkäiset indeksit.
@@ -32,6 +32,8 @@ Muokkaus (Jimi Käyrä):
   juuri kuvaajalta.
 * Funktioon avaa_tallennusikkuna on lisätty lisäparametri paate, joka määrittelee
   tiedostopäätteen.
+* Lisättiin funktio ajasta, jolla käsittelijä voidaan ajastaa suoritettavaksi
+  pääsilmukassa (esim. taustasäikeen tulosten käsittelyä varten).
 
 """
 
@@ -149,8 +151,9 @@ def luo_kuvaaja(kehys, hiiri_kasittelija, leveys, korkeus):
     kuvaaja = Figure(figsize=(leveys / 100, korkeus / 100), dpi=100)
     piirtoalue = FigureCanvasTkAgg(kuvaaja, master=kehys)
     piirtoalue.get_tk_widget().pack(side=tk.TOP)
-    piirtoalue.mpl_connect("pick_event", hiiri_kasittelija)
-    # Muutos: valitaan pick-event, jotta piste tulee kuvaajalta.
+    piirtoalue.mpl_connect("button_press_event", hiiri_kasittelija)
+    # Muutos: käsittelijä etsii klikkausta lähimmän mittauspisteen itse, joten
+    # matplotlibin pick-eventin pistekohtaista osumatestausta ei tarvita.
     return piirtoalue, kuvaaja
 
 def luo_tekstilaatikko(kehys, leveys=80, korkeus=20):
@@ -468,6 +471,19 @@ def piilota_ali_ikkuna(ali):
 
     ali.withdraw()
 
+def ajasta(viive, kasittelija):
+    """
+    Ajastaa käsittelijäfunktion suoritettavaksi pääsilmukassa annetun viiveen
+    jälkeen. Käsittelijä ei saa argumentteja. Tällä tavalla voidaan esim.
+    tarkistaa säännöllisesti, onko taustasäie saanut työnsä valmiiksi, sillä
+    käyttöliittymää saa käsitellä vain pääsäikeestä.
+
+    :param int viive: viive millisekunteina
+    :param function kasittelija: funktio, jota kutsutaan viiveen jälkeen
+    """
+
+    ikkuna.after(viive, kasittelija)
+
 def kaynnista():
     """
     Käynnistää ohjelman. Kutsu tätä kun olet määritellyt käyttöliittymän.
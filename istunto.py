@@ -0,0 +1,108 @@
+"""
+Istunto
+
+Usean rinnakkain ladatun mittauskansion (aineiston) istunto. Istunto on sanakirja:
+    aineistot   kansion polku -> aineisto (sanakirja, jossa on ainakin "spektri",
+                spektrilaskenta.Spektri, jolla on oma taustansa); latausjärjestyksessä
+    aktiivinen  aktiivisen aineiston kansio tai None
+    nakyma      muiden aineistojen näyttötapa (ks. NAKYMAT)
+
+Aktiivisen aineiston tiedot pidetään käyttäjän omassa sanakirjassa (esim. käyttöliittymän
+datasanakirjassa), ja vaihda-funktio tallettaa ne takaisin istuntoon ennen seuraavan
+aineiston tietojen siirtämistä sanakirjaan. Siirrettäessä kopioidaan vain viittaukset:
+spektrit ovat muistissa ja tiedostokohtaiset matriisit levyllä muistikuvauksina
+yhteisen juurikansion alla (ks. matriisi.py), joten aineistoa vaihdettaessa mitään
+ei lueta levyltä. Moduuli ei tuo matplotlibiä.
+"""
+
+import numpy as np
+
+NAKYMAT = ("paallekkain", "pinottu")
+# Muut aineistot piirretään joko aktiivisen päälle samalle asteikolle tai pinottuina
+# sen yläpuolelle.
+PINON_RAKO = 0.1
+# Pinottujen spektrien väliin jäävä rako suhteessa suurimpaan intensiteettien vaihteluväliin.
+
+def uusi():
+    """
+    Luo tyhjän istunnon.
+    """
+
+    return {"aineistot": {}, "aktiivinen": None, "nakyma": NAKYMAT[0]}
+
+def hae(istunto, kansio, aktiiviset):
+    """
+    Palauttaa sanakirjan, jossa kansion aineiston ajantasaiset tiedot ovat:
+    aktiiviset, jos kansio on aktiivinen, muuten istuntoon talletetun aineiston.
+    Palauttaa None, jos kansiota ei ole istunnossa.
+    """
+
+    if kansio not in istunto["aineistot"]:
+        return None
+
+    if kansio == istunto["aktiivinen"]:
+        return aktiiviset
+
+    return istunto["aineistot"][kansio]
+
+def vaihda(istunto, kansio, aktiiviset, avaimet):
+    """
+    Tekee kansion aineistosta aktiivisen: tallettaa aktiivisen aineiston tiedot
+    (avaimet aktiiviset-sanakirjasta) istuntoon ja siirtää kansion aineiston tiedot
+    aktiiviset-sanakirjaan.
+    """
+
+    if istunto["aktiivinen"] in istunto["aineistot"]:
+        istunto["aineistot"][istunto["aktiivinen"]] = {avain: aktiiviset[avain]
+                                                       for avain in avaimet}
+
+    aktiiviset.update(istunto["aineistot"][kansio])
+    istunto["aktiivinen"] = kansio
+
+def seuraava(istunto):
+    """
+    Palauttaa aktiivista seuraavan aineiston kansion latausjärjestyksessä (viimeisen
+    jälkeen ensimmäisen) tai None, jos istunnossa ei ole muita aineistoja.
+    """
+
+    kansiot = list(istunto["aineistot"])
+
+    if istunto["aktiivinen"] not in kansiot:
+        return kansiot[0] if kansiot else None
+
+    if len(kansiot) < 2:
+        return None
+
+    return kansiot[(kansiot.index(istunto["aktiivinen"]) + 1) % len(kansiot)]
+
+def poista(istunto, kansio):
+    """
+    Poistaa kansion aineiston istunnosta. Jos se oli aktiivinen, aktiivista
+    aineistoa ei enää ole.
+    """
+
+    istunto["aineistot"].pop(kansio, None)
+
+    if istunto["aktiivinen"] == kansio:
+        istunto["aktiivinen"] = None
+
+def siirtymat(rajat, nakyma):
+    """
+    Laskee aineistojen pystysiirtymät, kun rajat ovat niiden intensiteettien pienimmät
+    ja suurimmat arvot (minimi, maksimi) piirtojärjestyksessä. Pinotussa näkymässä
+    ensimmäinen jää paikalleen ja kunkin seuraavan pienin arvo nostetaan edellisen
+    suurimman yläpuolelle PINON_RAKO kertaa suurimman vaihteluvälin päähän, joten
+    spektrit eivät mene päällekkäin, vaikka niiden taustat olisivat eri tasoilla.
+    Päällekkäisessä näkymässä siirtymät ovat nollia.
+    """
+
+    rajat = np.asarray(rajat, dtype=np.float64).reshape(-1, 2)
+
+    if nakyma != "pinottu" or len(rajat) == 0:
+        return np.zeros(len(rajat))
+
+    rako = PINON_RAKO * float(np.max(rajat[:, 1] - rajat[:, 0]))
+    askeleet = rajat[:-1, 1] - rajat[1:, 0] + rako
+    # Kuinka paljon kutakin spektriä on nostettava edellisen siirretyn spektrin yläpuolelle.
+
+    return np.concatenate(([0.0], np.cumsum(askeleet)))
@@ -0,0 +1,271 @@
+"""
+Matriisi
+
+Levylle tallentuva tiedostokohtainen intensiteettimatriisi: jokainen hyväksytty
+mittaustiedosto on yksi rivi (N_tiedostoja x N_energioita), joten yksittäisten
+tiedostojen vaihtelu säilyy summan rinnalla. Osajoukot, poikkeavien tiedostojen
+hylkääminen ja aikasarjat voidaan laskea matriisista lukematta tekstitiedostoja
+uudelleen.
+
+Matriisi on kansio, jossa ovat
+    energiat.npy        yhteinen energia-akseli
+    intensiteetit.bin   rivit peräkkäin raakadatana (float32 tai float64)
+    tiedot.json         tietotyyppi, energioiden määrä ja rivien tiedostopolut
+Rivit lisätään tiedoston loppuun yksi kerrallaan ja matriisi luetaan muistikuvauksena
+(np.memmap), joten se voi olla suurempi kuin käytettävissä oleva muisti.
+tiedot.json kirjoitetaan vasta rivien jälkeen, joten keskeytynyt kirjoitus jättää
+matriisin edelliseen eheään tilaansa.
+
+Saman juurikansion alla olevien matriisien yhteiskoko voidaan pitää annetussa rajassa
+poistamalla pisimpään käyttämättä olleet matriisit (LRU, ks. karsi_vanhimmat).
+Käyttöaikana toimii tiedot.json-tiedoston muokkausaika, jota päivitetään luettaessa.
+"""
+
+import os
+import json
+from hashlib import sha1
+import numpy as np
+
+ENERGIAT = "energiat.npy"
+INTENSITEETIT = "intensiteetit.bin"
+TIEDOT = "tiedot.json"
+TYYPIT = ("float32", "float64") # Sallitut rivien tietotyypit.
+KOPIOITAVIA_RIVEJA = 1024 # Kuinka monta riviä kerrallaan kopioidaan matriisia karsittaessa.
+
+def polku(juuri, kansio):
+    """
+    Muodostaa mittauskansion matriisille polun juurikansion alle kansion polusta.
+    """
+
+    tunniste = sha1(os.path.realpath(kansio).encode("utf-8")).hexdigest()
+    return os.path.join(juuri, tunniste)
+
+def lue_tiedot(kansio):
+    """
+    Lukee matriisin tiedot (sanakirja: tyyppi, pisteita, tiedostot).
+    Palauttaa None, jos matriisia ei ole tai sen tietoja ei saatu luettua.
+    """
+
+    try:
+        with open(os.path.join(kansio, TIEDOT), encoding="utf-8") as lahde:
+            tiedot = json.load(lahde)
+    except (OSError, ValueError):
+        return None
+
+    if tiedot.get("tyyppi") not in TYYPIT:
+        return None
+
+    return tiedot
+
+def _kirjoita_tiedot(kansio, tiedot):
+    """
+    Kirjoittaa matriisin tiedot väliaikaisen tiedoston kautta, jotta lukija ei koskaan
+    näe puolivalmista tiedostoa.
+    """
+
+    kohde = os.path.join(kansio, TIEDOT)
+    valiaikainen = f"{kohde}.{os.getpid()}.tmp"
+
+    with open(valiaikainen, "w", encoding="utf-8") as tiedosto:
+        json.dump(tiedot, tiedosto)
+
+    os.replace(valiaikainen, kohde)
+
+def lue(kansio):
+    """
+    Avaa matriisin luettavaksi. Palauttaa energiat, intensiteettimatriisin
+    muistikuvauksena (vain luku) ja listan rivejä vastaavista tiedostopoluista,
+    tai None, jos matriisia ei ole.
+    """
+
+    tiedot = lue_tiedot(kansio)
+
+    if tiedot is None:
+        return None
+
+    try:
+        os.utime(os.path.join(kansio, TIEDOT)) # Päivitetään käyttöaika LRU-poistoa varten.
+    except OSError:
+        pass
+
+    energiat = np.load(os.path.join(kansio, ENERGIAT))
+    riveja = len(tiedot["tiedostot"])
+
+    if riveja == 0:
+        return energiat, np.empty((0, tiedot["pisteita"]), dtype=tiedot["tyyppi"]), []
+
+    try:
+        intensiteetit = np.memmap(os.path.join(kansio, INTENSITEETIT), dtype=tiedot["tyyppi"],
+                                  mode="r", shape=(riveja, tiedot["pisteita"]))
+        # Tiedoston lopussa voi olla keskeytyneen kirjoituksen rivejä; ne jätetään huomiotta.
+    except (OSError, ValueError):
+        return None # Rivejä on vähemmän kuin tiedoissa; matriisi ei ole eheä.
+
+    return energiat, intensiteetit, tiedot["tiedostot"]
+
+def aloita(kansio, energiat, tyyppi="float64"):
+    """
+    Luo uuden tyhjän matriisin (vanha korvataan) ja palauttaa kirjoittimen
+    (sanakirja), jolla rivejä lisätään.
+    """
+
+    if tyyppi not in TYYPIT:
+        raise ValueError("Matriisin tietotyypin on oltava float32 tai float64.")
+
+    os.makedirs(kansio, exist_ok=True)
+    tiedosto = open(os.path.join(kansio, INTENSITEETIT), "wb") # pylint: disable=consider-using-with
+    # Tiedosto jää kirjoittimelle, ja sulje-funktio sulkee sen.
+
+    try:
+        np.save(os.path.join(kansio, ENERGIAT), np.asarray(energiat, dtype=np.float64))
+        tiedot = {"tyyppi": tyyppi, "pisteita": len(energiat), "tiedostot": []}
+        _kirjoita_tiedot(kansio, tiedot)
+    except BaseException:
+        tiedosto.close() # Kirjoitinta ei palauteta, joten tiedosto suljetaan tässä.
+        raise
+
+    return {"kansio": kansio, "tiedot": tiedot, "tiedosto": tiedosto}
+
+def jatka(kansio):
+    """
+    Avaa olemassa olevan matriisin rivien lisäämistä varten. Keskeytyneen
+    kirjoituksen ylimääräiset tavut katkaistaan pois. Palauttaa kirjoittimen tai
+    None, jos matriisia ei ole tai se ei ole eheä.
+    """
+
+    tiedot = lue_tiedot(kansio)
+
+    if tiedot is None:
+        return None
+
+    intensiteetit = os.path.join(kansio, INTENSITEETIT)
+    koko = len(tiedot["tiedostot"]) * tiedot["pisteita"] * np.dtype(tiedot["tyyppi"]).itemsize
+
+    try:
+        if os.path.getsize(intensiteetit) < koko:
+            return None # Rivejä puuttuu; matriisi ei ole eheä.
+
+        tiedosto = open(intensiteetit, "r+b") # pylint: disable=consider-using-with
+        # Tiedosto jää kirjoittimelle, ja sulje-funktio sulkee sen.
+    except OSError:
+        return None
+
+    try:
+        tiedosto.truncate(koko)
+        tiedosto.seek(0, os.SEEK_END)
+    except OSError:
+        tiedosto.close()
+        return None
+
+    return {"kansio": kansio, "tiedot": tiedot, "tiedosto": tiedosto}
+
+def lisaa(kirjoitin, tiedosto, intensiteetit):
+    """
+    Lisää matriisiin rivin annetun mittaustiedoston intensiteeteistä.
+    """
+
+    np.asarray(intensiteetit, dtype=kirjoitin["tiedot"]["tyyppi"]).tofile(kirjoitin["tiedosto"])
+    kirjoitin["tiedot"]["tiedostot"].append(tiedosto)
+
+def sulje(kirjoitin):
+    """
+    Kirjoittaa lisätyt rivit levylle ja päivittää matriisin tiedot.
+    """
+
+    kirjoitin["tiedosto"].close()
+    _kirjoita_tiedot(kirjoitin["kansio"], kirjoitin["tiedot"])
+
+def karsi(kansio, pidettavat):
+    """
+    Poistaa matriisista rivit, joiden tiedostot eivät ole pidettavat-joukossa.
+    Rivit kopioidaan uuteen tiedostoon osissa, joten koko matriisin ei tarvitse
+    mahtua muistiin. Palauttaa False, jos matriisia ei ole.
+    """
+
+    luettu = lue(kansio)
+
+    if luettu is None:
+        return False
+
+    _, intensiteetit, tiedostot = luettu
+    del luettu # Muistikuvaukseen ei saa jäädä muita viittauksia (ks. alla).
+    rivit = [indeksi for indeksi, tiedosto in enumerate(tiedostot) if tiedosto in pidettavat]
+
+    if len(rivit) == len(tiedostot):
+        return True # Kaikki rivit pidetään; ei kopioitavaa.
+
+    kohde = os.path.join(kansio, INTENSITEETIT)
+    valiaikainen = f"{kohde}.{os.getpid()}.tmp"
+
+    with open(valiaikainen, "wb") as tiedosto:
+        for alku in range(0, len(rivit), KOPIOITAVIA_RIVEJA):
+            intensiteetit[rivit[alku:alku + KOPIOITAVIA_RIVEJA]].tofile(tiedosto)
+
+    del intensiteetit # Suljetaan muistikuvaus ennen tiedoston korvaamista.
+    tiedot = lue_tiedot(kansio)
+    tiedot["tiedostot"] = [tiedostot[indeksi] for indeksi in rivit]
+    os.replace(valiaikainen, kohde)
+    _kirjoita_tiedot(kansio, tiedot)
+
+    return True
+
+def tyhjenna(kansio):
+    """
+    Poistaa matriisin tiedostot. Tiedot poistetaan ensin, jolloin matriisia ei enää
+    tulkita olemassa olevaksi, vaikka muiden tiedostojen poistaminen keskeytyisi.
+    """
+
+    for nimi in (TIEDOT, INTENSITEETIT, ENERGIAT):
+        try:
+            os.remove(os.path.join(kansio, nimi))
+        except OSError:
+            pass
+
+    try:
+        os.rmdir(kansio) # Tyhjä matriisikansio poistetaan; muut tiedostot jätetään.
+    except OSError:
+        pass
+
+def karsi_vanhimmat(juuri, enimmaiskoko, sailytettava=None):
+    """
+    Pienentää juurikansion alla olevien matriisien yhteiskoon enintään annetuksi
+    (tavuina) poistamalla pisimpään käyttämättä olleet matriisit. Sailytettava-kansion
+    matriisia (esim. juuri kirjoitettu) ei poisteta.
+    """
+
+    try:
+        kansiot = [kansio.path for kansio in os.scandir(juuri) if kansio.is_dir()]
+    except OSError:
+        return
+
+    tiedot = []
+
+    for kansio in kansiot:
+        koko = 0
+        kaytetty = 0.0
+
+        for nimi in (TIEDOT, INTENSITEETIT, ENERGIAT):
+            try:
+                tila = os.stat(os.path.join(kansio, nimi))
+            except OSError:
+                continue
+
+            koko += tila.st_size
+
+            if nimi == TIEDOT:
+                kaytetty = tila.st_mtime
+
+        tiedot.append((kaytetty, koko, kansio))
+
+    yhteensa = sum(tieto[1] for tieto in tiedot)
+    tiedot.sort() # Vanhin käyttöaika ensin.
+
+    for _, koko, kansio in tiedot:
+        if yhteensa <= enimmaiskoko:
+            break
+
+        if sailytettava and os.path.realpath(kansio) == os.path.realpath(sailytettava):
+            continue
+
+        tyhjenna(kansio)
+        yhteensa -= koko
@@ -0,0 +1,251 @@
+"""
+Piikit
+
+Piikkien automaattinen etsiminen summaspektristä. Spektri tasoitetaan kolmioikkunalla
+(liukuva keskiarvo kahdesti), piikkiehdokkaat löydetään tasoitetun spektrin derivaatan
+merkin vaihtumisesta ja ehdokkaista hyväksytään ne, joiden korostus (prominence) on
+riittävä. Kullekin piikille muodostetaan integrointiväli (e_min, e_max), joten tulokset
+voidaan antaa suoraan spektrilaskenta.laske_piikkien_intensiteetit-funktiolle.
+
+Oletusasetukset mukautuvat dataan, joten etsintä toimii ilman käsin valittuja arvoja:
+tasoituksen leveys on osuus energia-akselin pituudesta, ja pienin hyväksytty korostus
+lasketaan intensiteettien kohinatasosta (ks. arvioi_kohina), jolloin tasoitetun
+kohinan satunnaiset huiput jäävät sen alle pisteiden määrästä riippumatta.
+
+Ehdokkaiden korostukset lasketaan taulukko-operaatioina ilman Python-silmukoita;
+silmukat käyvät läpi vain hyväksytyt piikit.
+"""
+
+import numpy as np
+
+TASOITUS = 0.001
+# Tasoitusikkunan oletusleveys osuutena energia-akselin pituudesta (tasavälisessä
+# hilassa osuutena mittauspisteiden määrästä).
+VAHIN_TASOITUS = 5 # Tasoitusikkunan vähimmäisleveys mittauspisteinä.
+KOHINAKERROIN = 1.5
+# Pienin hyväksytty korostus on tämä kerroin kertaa tasoitetun kohinan odotettu
+# vaihteluväli (ks. oletuskorostus), jos korostusta ei anneta suoraan.
+SUHTEELLINEN_KOROSTUS = 0.01
+# Korostuksen alaraja suhteessa tasoitetun spektrin vaihteluväliin; estää kohinattoman
+# datan pyöristysvirheitä tulkitsemasta piikeiksi.
+MAD_KERROIN = 1.4826 # Normaalijakauman keskihajonta suhteessa mediaanipoikkeamaan (MAD).
+IKKUNAKERROIN = 3.0
+# Integrointiväli ulottuu piikin huipusta näin monen puoliintumisleveyden päähän
+# kummallekin puolelle, kuitenkin enintään viereiseen laaksoon.
+
+def _liukuva_keskiarvo(intensiteetit, puoli):
+    """
+    Laskee liukuvan keskiarvon 2 * puoli + 1 pisteen ikkunassa kumulatiivisesta
+    summasta, joten leveys ei vaikuta laskenta-aikaan. Reunoilla keskiarvo lasketaan
+    ikkunan spektriin osuvista pisteistä; reunapisteen toistaminen antaisi leveällä
+    ikkunalla yhden kohinaisen pisteen painaa liikaa.
+    """
+
+    kertyma = np.concatenate(([0.0], np.cumsum(intensiteetit)))
+    indeksit = np.arange(len(intensiteetit))
+    alut = np.maximum(indeksit - puoli, 0)
+    loput = np.minimum(indeksit + puoli + 1, len(intensiteetit))
+
+    return (kertyma[loput] - kertyma[alut]) / (loput - alut)
+
+def _puolikas(leveys):
+    """
+    Palauttaa tasoituksen liukuvan keskiarvon puolileveyden: kaksi 2 * puoli + 1
+    pisteen keskiarvoa peräkkäin muodostavat noin leveyden levyisen kolmioikkunan.
+    """
+
+    return int(leveys) // 4
+
+def tasoita(intensiteetit, leveys=VAHIN_TASOITUS):
+    """
+    Tasoittaa intensiteetit kolmioikkunalla, jonka leveys on noin annettu määrä
+    mittauspisteitä (alle neljä pistettä ei tasoita). Kolmioikkuna on kaksi peräkkäistä
+    liukuvaa keskiarvoa; yksinkertaisen keskiarvon derivaatta on kahden kohinaisen
+    pisteen erotus, jolloin kohinasta syntyisi moninkertaisesti huippuehdokkaita.
+    """
+
+    intensiteetit = np.asarray(intensiteetit, dtype=np.float64)
+    puoli = _puolikas(leveys)
+
+    if puoli < 1:
+        return intensiteetit.copy()
+
+    return _liukuva_keskiarvo(_liukuva_keskiarvo(intensiteetit, puoli), puoli)
+
+def kohinan_vaimennus(leveys):
+    """
+    Palauttaa, kuinka moninkertaiseksi tasoitus muuttaa valkoisen kohinan varianssin:
+    tasoitusikkunan painojen neliösumman. Kahden a pisteen keskiarvon kolmioikkunalle
+    se on (2a² + 1) / (3a³).
+    """
+
+    pisteita = 2 * _puolikas(leveys) + 1
+
+    return (2 * pisteita ** 2 + 1) / (3 * pisteita ** 3)
+
+def arvioi_kohina(intensiteetit):
+    """
+    Arvioi intensiteettien kohinan keskihajonnan peräkkäisten pisteiden erotusten
+    mediaanipoikkeamasta (MAD). Erotuksissa tausta ja leveät piikit lähes kumoutuvat,
+    ja mediaaniin eivät vaikuta kapeiden piikkien jyrkät reunat. Valkoisen kohinan
+    erotusten keskihajonta on √2 kertaa kohinan keskihajonta.
+    """
+
+    erotukset = np.diff(np.asarray(intensiteetit, dtype=np.float64))
+
+    if erotukset.size == 0:
+        return 0.0
+
+    poikkeamat = np.abs(erotukset - np.median(erotukset))
+    return float(MAD_KERROIN * np.median(poikkeamat) / np.sqrt(2))
+
+def tasoituksen_leveys(energiat):
+    """
+    Palauttaa oletustasoituksen leveyden mittauspisteinä: TASOITUS kertaa energia-akselin
+    pituus keskimääräisinä energia-askelina, kuitenkin vähintään VAHIN_TASOITUS pistettä.
+    """
+
+    return max(VAHIN_TASOITUS, int(round(TASOITUS * (len(energiat) - 1))))
+    # Energia-akselin pituus keskimääräisinä askelina on pisteiden määrä miinus yksi.
+
+def _pohjat(korkeudet, laaksot):
+    """
+    Laskee kunkin huipun pohjan yhdeltä puolelta: pienimmän intensiteetin huipun ja
+    lähimmän sitä korkeamman huipun (tai spektrin reunan) välillä. laaksot[i] on pienin
+    intensiteetti huipun i ja sitä edeltävän huipun (tai reunan) välillä.
+
+    Kukin huippu osoittaa aluksi edeltävään huippuun. Niin kauan kuin osoitettu huippu
+    ei ole korkeampi, osoitin siirretään sen osoittamaan huippuun ja ohitettujen väliensä
+    minimit yhdistetään (osoitinhyppely). Kaikki huiput siirretään kerralla taulukko-
+    operaationa, ja hyppyjen pituudet kasvavat, joten kierroksia tarvitaan vähän.
+    """
+
+    edellinen = np.arange(-1, len(korkeudet) - 1)
+    # Huippu, johon kukin huippu osoittaa; -1 on spektrin reuna. Osoitetun huipun ja
+    # huipun välissä olevat huiput ovat enintään yhtä korkeita kuin huippu.
+    pohjat = np.array(laaksot, dtype=np.float64)
+    # Pienin intensiteetti osoitetun huipun ja huipun välillä.
+    kesken = np.flatnonzero(edellinen >= 0)
+
+    while kesken.size:
+        osoitetut = edellinen[kesken]
+        ohitettavat = korkeudet[osoitetut] <= korkeudet[kesken]
+        kesken = kesken[ohitettavat] # Korkeampaan huippuun osoittavat ovat valmiita.
+        osoitetut = osoitetut[ohitettavat]
+        pohjat[kesken] = np.minimum(pohjat[kesken], pohjat[osoitetut])
+        edellinen[kesken] = edellinen[osoitetut]
+        # Oikea puoli lasketaan ennen sijoitusta, joten kaikki hyppäävät samalla kierroksella.
+        kesken = kesken[edellinen[kesken] >= 0]
+
+    return pohjat
+
+def laske_korostukset(intensiteetit, huiput):
+    """
+    Laskee annettujen huippujen (indeksit nousevassa järjestyksessä) korostukset:
+    kuinka paljon huippu nousee korkeamman pohjansa yläpuolelle. Pohja on pienin
+    intensiteetti huipun ja lähimmän sitä korkeamman huipun välillä kummallakin puolella.
+    """
+
+    intensiteetit = np.asarray(intensiteetit, dtype=np.float64)
+
+    if len(huiput) == 0:
+        return np.empty(0)
+
+    laaksot = np.minimum.reduceat(intensiteetit, np.concatenate(([0], huiput)))
+    # laaksot[i] on pienin arvo huippua i edeltävällä välillä; viimeinen alkio
+    # kattaa viimeisen huipun ja spektrin lopun.
+    korkeudet = intensiteetit[huiput]
+    vasen = _pohjat(korkeudet, laaksot[:-1])
+    oikea = _pohjat(korkeudet[::-1], laaksot[:0:-1])[::-1]
+    # Oikeanpuoleiset pohjat saadaan samalla tavalla käännetystä järjestyksestä.
+
+    return korkeudet - np.maximum(vasen, oikea)
+
+def _puolileveys(alue, taso):
+    """
+    Palauttaa, kuinka monen pisteen päässä alueen alusta (huipusta) intensiteetti
+    laskee ensimmäisen kerran annetun tason alle. Jos se ei laske, palautetaan
+    alueen pituus.
+    """
+
+    alle = np.flatnonzero(alue < taso)
+    return int(alle[0]) if alle.size else len(alue)
+
+def oletuskorostus(intensiteetit, tasoitettu, leveys):
+    """
+    Laskee pienimmän hyväksyttävän korostuksen, kun tasoitettu on leveys pisteen
+    tasoituksella tasoitetut intensiteetit: KOHINAKERROIN kertaa tasoitetun kohinan
+    odotettu vaihteluväli, kuitenkin vähintään SUHTEELLINEN_KOROSTUS kertaa tasoitetun
+    spektrin vaihteluväli. n:n riippumattoman normaalijakautuneen arvon vaihteluväli on
+    noin 2√(2 ln n) keskihajontaa, eikä kohinan satunnaisten huippujen korostus voi
+    ylittää kohinan vaihteluväliä.
+    """
+
+    vaimennus = kohinan_vaimennus(leveys)
+    riippumattomia = max(2.0, len(tasoitettu) * vaimennus)
+    # Tasoitetussa datassa riippumattomia arvoja on noin pisteiden määrä jaettuna
+    # ikkunan tehollisella leveydellä (varianssin vaimennuksen käänteisluvulla).
+    vaihteluvali = (2 * np.sqrt(2 * np.log(riippumattomia))
+                    * arvioi_kohina(intensiteetit) * np.sqrt(vaimennus))
+
+    return max(KOHINAKERROIN * vaihteluvali, SUHTEELLINEN_KOROSTUS * float(np.ptp(tasoitettu)))
+
+def _integrointivalit(energiat, tasoitettu, huiput, korostukset, ikkunakerroin):
+    """
+    Muodostaa hyväksytyille huipuille integrointivälit (e_min, e_max): väli ulottuu
+    ikkunakerroin puoliintumisleveyttä huipusta kummallekin puolelle, kuitenkin enintään
+    viereiseen laaksoon.
+    """
+
+    rajat = [0]
+
+    for alku, loppu in zip(huiput[:-1], huiput[1:]):
+        rajat.append(int(alku + np.argmin(tasoitettu[alku:loppu])))
+        # Vierekkäisten piikkien välit eivät mene laakson yli.
+
+    rajat.append(len(tasoitettu) - 1)
+    ikkunat = []
+
+    for i, (huippu, piikin_korostus) in enumerate(zip(huiput, korostukset)):
+        taso = tasoitettu[huippu] - piikin_korostus / 2 # Puolet korostuksesta.
+        vasen = _puolileveys(tasoitettu[rajat[i]:huippu + 1][::-1], taso)
+        oikea = _puolileveys(tasoitettu[huippu:rajat[i + 1] + 1], taso)
+        alku = max(rajat[i], huippu - int(np.ceil(ikkunakerroin * vasen)))
+        loppu = min(rajat[i + 1], huippu + int(np.ceil(ikkunakerroin * oikea)))
+        ikkunat.append(tuple(sorted((float(energiat[alku]), float(energiat[loppu])))))
+
+    return ikkunat
+
+def etsi_piikit(energiat, intensiteetit, tasoitus=None, korostus=None,
+                ikkunakerroin=IKKUNAKERROIN):
+    """
+    Etsii spektristä piikit. tasoitus on tasoitusikkunan leveys mittauspisteinä;
+    oletuksena se lasketaan energia-akselista (ks. tasoituksen_leveys). korostus on
+    pienin hyväksytty korostus intensiteetin yksiköissä; oletuksena se lasketaan
+    kohinatasosta (ks. oletuskorostus). Palauttaa piikkien huippujen energiat
+    taulukkona ja listan integrointivälejä (e_min, e_max) samassa järjestyksessä.
+    Energiat voivat olla nousevassa tai laskevassa järjestyksessä.
+    """
+
+    energiat = np.asarray(energiat, dtype=np.float64)
+
+    if tasoitus is None:
+        tasoitus = tasoituksen_leveys(energiat)
+
+    tasoitettu = tasoita(intensiteetit, tasoitus)
+
+    if len(tasoitettu) < 3:
+        return np.empty(0), []
+
+    derivaatta = np.diff(tasoitettu)
+    huiput = np.flatnonzero((derivaatta[:-1] > 0) & (derivaatta[1:] <= 0)) + 1
+    # Huippu on kohdassa, jossa derivaatta vaihtuu positiivisesta ei-positiiviseksi.
+
+    if korostus is None:
+        korostus = oletuskorostus(intensiteetit, tasoitettu, tasoitus)
+
+    korostukset = laske_korostukset(tasoitettu, huiput)
+    hyvaksytyt = korostukset >= korostus
+
+    return energiat[huiput[hyvaksytyt]], _integrointivalit(
+        energiat, tasoitettu, huiput[hyvaksytyt], korostukset[hyvaksytyt], ikkunakerroin)
@@ -0,0 +1,337 @@
+"""
+Sovitus
+
+Piikkien sovittaminen: energiaväliin sovitetaan Gauss-, Lorentz- ja pseudo-Voigt-
+komponenttien summa Levenberg-Marquardt-menetelmällä, jolloin myös päällekkäisten
+piikkien pinta-alat saadaan erotettua toisistaan.
+
+Kunkin komponentin parametrit ovat korkeus, keskikohta ja puoliarvoleveys (FWHM);
+pseudo-Voigt-komponentilla lisäksi Lorentz-osuus eta (0...1). Mallin arvot ja sen
+jakobiaani (derivaatat parametrien suhteen) lasketaan analyyttisesti koko energiavälille
+kerralla. Samaa mallia voidaan sovittaa myös moneen spektriin kerralla (sovita_joukko),
+jolloin myös iterointi tehdään kaikille spektreille yhtä aikaa.
+
+Energiaväli valitaan samoin kuin intensiteettejä laskettaessa (spektrilaskenta.etsi_indeksit).
+"""
+
+import numpy as np
+import spektrilaskenta as sl
+import piikit as pk
+
+GAUSS_VAKIO = 4 * np.log(2)
+# Gauss-profiili on exp(-GAUSS_VAKIO * u^2), kun u on etäisyys keskikohdasta FWHM:n yksiköissä.
+KIERROKSIA = 200 # Levenberg-Marquardt-iteroinnin kierrosten enimmäismäärä.
+TOLERANSSI = 1e-10
+# Iterointi lopetetaan, kun neliösumma pienenee kierroksella suhteellisesti vähemmän kuin tämä.
+VAIMENNUS = 1e-3 # Levenberg-Marquardt-vaimennuksen alkuarvo.
+SUURIN_VAIMENNUS = 1e12 # Tätä suuremmalla vaimennuksella askel on merkityksetön; lopetetaan.
+PIENIN_LEVEYS = 1e-12 # Leveyden on pysyttävä positiivisena.
+MUISTIRAJA = 256 * 1024 ** 2
+# Kuinka paljon muistia (tavuina) joukkosovituksen jakobiaanit saavat enintään viedä kerralla;
+# suuret joukot sovitetaan osissa.
+
+def _gauss(u, korkeus, leveys):
+    """
+    Gauss-profiili ja sen derivaatat korkeuden, keskikohdan ja leveyden suhteen.
+    """
+
+    g = np.exp(-GAUSS_VAKIO * u ** 2)
+    kerroin = korkeus * g * 2 * GAUSS_VAKIO * u / leveys
+    return korkeus * g, (g, kerroin, kerroin * u)
+
+def _lorentz(u, korkeus, leveys):
+    """
+    Lorentz-profiili ja sen derivaatat korkeuden, keskikohdan ja leveyden suhteen.
+    """
+
+    l = 1 / (1 + 4 * u ** 2)
+    kerroin = korkeus * l ** 2 * 8 * u / leveys
+    return korkeus * l, (l, kerroin, kerroin * u)
+
+def gauss(x, parametrit):
+    """
+    Gauss-komponentti. parametrit on (S, 3)-taulukko (korkeus, keskikohta, leveys)
+    S:lle spektrille. Palauttaa arvot (S, m) ja jakobiaanin (S, m, 3).
+    """
+
+    korkeus, keskikohta, leveys = (parametrit[:, i, None] for i in range(3))
+    arvo, derivaatat = _gauss((x - keskikohta) / leveys, korkeus, leveys)
+    return arvo, np.stack(derivaatat, axis=-1)
+
+def lorentz(x, parametrit):
+    """
+    Lorentz-komponentti. parametrit on (S, 3)-taulukko (korkeus, keskikohta, leveys).
+    """
+
+    korkeus, keskikohta, leveys = (parametrit[:, i, None] for i in range(3))
+    arvo, derivaatat = _lorentz((x - keskikohta) / leveys, korkeus, leveys)
+    return arvo, np.stack(derivaatat, axis=-1)
+
+def pseudovoigt(x, parametrit):
+    """
+    Pseudo-Voigt-komponentti eta * Lorentz + (1 - eta) * Gauss samalla korkeudella,
+    keskikohdalla ja leveydellä. parametrit on (S, 4)-taulukko
+    (korkeus, keskikohta, leveys, eta).
+    """
+
+    korkeus, keskikohta, leveys, eta = (parametrit[:, i, None] for i in range(4))
+    u = (x - keskikohta) / leveys
+    arvo_g, derivaatat_g = _gauss(u, korkeus, leveys)
+    arvo_l, derivaatat_l = _lorentz(u, korkeus, leveys)
+    derivaatat = [eta * d_l + (1 - eta) * d_g for d_l, d_g in zip(derivaatat_l, derivaatat_g)]
+    derivaatat.append(arvo_l - arvo_g) # Derivaatta eta:n suhteen.
+    return eta * arvo_l + (1 - eta) * arvo_g, np.stack(derivaatat, axis=-1)
+
+MUODOT = { # Komponenttien nimet: (profiilifunktio, parametrien määrä)
+    "gauss": (gauss, 3),
+    "lorentz": (lorentz, 3),
+    "pseudovoigt": (pseudovoigt, 4)
+}
+
+def pinta_ala(muoto, parametrit):
+    """
+    Laskee komponentin pinta-alan sen parametreista (taulukko, jonka viimeinen
+    akseli on komponentin parametrit).
+    """
+
+    parametrit = np.asarray(parametrit, dtype=np.float64)
+    gauss_ala = parametrit[..., 0] * parametrit[..., 2] * np.sqrt(np.pi / GAUSS_VAKIO)
+    lorentz_ala = parametrit[..., 0] * parametrit[..., 2] * np.pi / 2
+
+    if muoto == "gauss":
+        return gauss_ala
+    if muoto == "lorentz":
+        return lorentz_ala
+
+    return parametrit[..., 3] * lorentz_ala + (1 - parametrit[..., 3]) * gauss_ala
+
+def _tarkista_muodot(muodot):
+    """
+    Tarkistaa komponenttien nimet ja palauttaa parametrien kokonaismäärän.
+    """
+
+    for muoto in muodot:
+        if muoto not in MUODOT:
+            raise ValueError(f"Tuntematon piikin muoto: {muoto}")
+
+    return sum(MUODOT[muoto][1] for muoto in muodot)
+
+def arvioi(muodot, x, parametrit):
+    """
+    Laskee komponenttien summan ja sen jakobiaanin energioissa x. parametrit on
+    (S, p)-taulukko, jossa komponenttien parametrit ovat peräkkäin muodot-listan
+    järjestyksessä. Palauttaa mallin arvot (S, m) ja jakobiaanin (S, m, p).
+    """
+
+    malli = np.zeros((parametrit.shape[0], len(x)))
+    jakobiaani = np.empty((parametrit.shape[0], len(x), parametrit.shape[1]))
+    alku = 0
+
+    for muoto in muodot:
+        profiili, maara = MUODOT[muoto]
+        arvo, derivaatat = profiili(x, parametrit[:, alku:alku + maara])
+        malli += arvo
+        jakobiaani[:, :, alku:alku + maara] = derivaatat
+        alku += maara
+
+    return malli, jakobiaani
+
+def _rajaa(muodot, parametrit):
+    """
+    Pitää parametrit sallituissa rajoissa: leveys positiivisena ja eta välillä 0...1.
+    """
+
+    alku = 0
+
+    for muoto in muodot:
+        np.maximum(parametrit[:, alku + 2], PIENIN_LEVEYS, out=parametrit[:, alku + 2])
+
+        if muoto == "pseudovoigt":
+            np.clip(parametrit[:, alku + 3], 0, 1, out=parametrit[:, alku + 3])
+
+        alku += MUODOT[muoto][1]
+
+    return parametrit
+
+def _askel(jakobiaani, jaannos, vaimennus):
+    """
+    Ratkaisee Levenberg-Marquardt-askeleen kullekin spektrille: (J^T J + vaimennus *
+    diag(J^T J)) askel = J^T r. jakobiaani on (S, m, p)-, jaannos (S, m)- ja vaimennus
+    (S,)-taulukko. Palauttaa askeleet (S, p).
+    """
+
+    jtj = np.matmul(jakobiaani.transpose(0, 2, 1), jakobiaani) # (S, p, p)
+    jtr = np.matmul(jakobiaani.transpose(0, 2, 1), jaannos[:, :, None])
+    lavistaja = np.diagonal(jtj, axis1=1, axis2=2)
+    lavistaja = np.maximum(lavistaja, 1e-12 * lavistaja.max(axis=1, keepdims=True) + 1e-300)
+    # Marquardtin skaalaus; nollalävistäjäalkio korvataan pienellä luvulla.
+    matriisi = jtj + (vaimennus[:, None] * lavistaja)[:, :, None] * np.eye(jtj.shape[1])
+
+    return np.linalg.solve(matriisi, jtr)[:, :, 0]
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+def _levenberg_marquardt(muodot, x, y, parametrit, kierroksia, toleranssi):
+    """
+    Sovittaa mallin kaikkiin y:n (S, m) spektreihin yhtä aikaa. Kullakin spektrillä on
+    oma vaimennuksensa, ja kierroksen askel hyväksytään spektrikohtaisesti vain, jos
+    neliösumma pienenee. Palauttaa parametrit (S, p), neliösummat (S,) ja
+    kierrosten määrän.
+    """
+
+    parametrit = _rajaa(muodot, parametrit.copy())
+    malli, jakobiaani = arvioi(muodot, x, parametrit)
+    jaannos = y - malli
+    nelio = np.einsum("sm,sm->s", jaannos, jaannos)
+    vaimennus = np.full(len(y), VAIMENNUS)
+    kesken = np.ones(len(y), dtype=bool)
+    kierros = 0
+
+    for kierros in range(1, kierroksia + 1):
+        k = np.flatnonzero(kesken) # Lasketaan vain spektrit, joiden sovitus on vielä kesken.
+
+        if len(k) == 0:
+            break
+
+        askel = _askel(jakobiaani if len(k) == len(y) else jakobiaani[k], jaannos[k],
+                       vaimennus[k])
+        # Kun kaikki ovat kesken, vältetään jakobiaanien kopiointi.
+
+        uudet = _rajaa(muodot, parametrit[k] + askel)
+        uusi_malli, uusi_jakobiaani = arvioi(muodot, x, uudet)
+        uusi_jaannos = y[k] - uusi_malli
+        uusi_nelio = np.einsum("sm,sm->s", uusi_jaannos, uusi_jaannos)
+
+        parani = uusi_nelio < nelio[k]
+        lopeta = parani & (nelio[k] - uusi_nelio <= toleranssi * nelio[k])
+        # Neliösumma pieneni enää merkityksettömästi.
+        hyvaksytyt = k[parani]
+
+        parametrit[hyvaksytyt] = uudet[parani]
+        jakobiaani[hyvaksytyt] = uusi_jakobiaani[parani]
+        jaannos[hyvaksytyt] = uusi_jaannos[parani]
+        nelio[hyvaksytyt] = uusi_nelio[parani]
+        vaimennus[hyvaksytyt] /= 10 # Onnistunut askel: lähemmäs Gauss-Newtonia.
+        vaimennus[k[~parani]] *= 10 # Epäonnistunut askel: lähemmäs gradienttimenetelmää.
+        kesken[k[lopeta]] = False
+        kesken &= vaimennus < SUURIN_VAIMENNUS
+
+    return parametrit, nelio, kierros
+
+def _valin_data(energiat, intensiteetit, minimi, maksimi):
+    """
+    Palauttaa energiavälin minimi...maksimi energiat ja intensiteetit (viimeinen akseli).
+    """
+
+    energiat = np.asarray(energiat, dtype=np.float64)
+    alku, loppu = sl.etsi_indeksit(energiat, minimi, maksimi)
+
+    if loppu - alku < 2:
+        raise ValueError(f"Energiavälille {minimi}...{maksimi} osuu alle kaksi "
+                         "mittauspistettä.")
+
+    return energiat[alku:loppu], np.asarray(intensiteetit, dtype=np.float64)[..., alku:loppu]
+
+def _tulokset(muodot, parametrit, nelio, kierroksia):
+    """
+    Kokoaa sovituksen tulokset sanakirjaan.
+    """
+
+    pinta_alat = []
+    alku = 0
+
+    for muoto in muodot:
+        maara = MUODOT[muoto][1]
+        pinta_alat.append(pinta_ala(muoto, parametrit[..., alku:alku + maara]))
+        alku += maara
+
+    return {
+        "muodot": list(muodot),
+        "parametrit": parametrit, # Komponenttien parametrit peräkkäin.
+        "pinta_alat": np.stack(pinta_alat, axis=-1), # Komponenttien pinta-alat.
+        "neliosumma": nelio, # Jäännösten neliösumma.
+        "kierroksia": kierroksia
+    }
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def sovita(energiat, intensiteetit, minimi, maksimi, muodot, alkuarvot, *,
+           kierroksia=KIERROKSIA, toleranssi=TOLERANSSI):
+    """
+    Sovittaa komponenttien summan spektrin energiaväliin minimi...maksimi.
+    muodot on lista komponenttien nimiä (ks. MUODOT) ja alkuarvot lista vastaavia
+    parametrimonikoita. Palauttaa sanakirjan, jossa ovat sovitetut parametrit
+    (yksiulotteinen taulukko), komponenttien pinta-alat, jäännösten neliösumma ja
+    iterointikierrosten määrä.
+    """
+
+    maara = _tarkista_muodot(muodot)
+    x, y = _valin_data(energiat, intensiteetit, minimi, maksimi)
+    parametrit = np.concatenate([np.asarray(arvot, dtype=np.float64) for arvot in alkuarvot])
+
+    if len(parametrit) != maara:
+        raise ValueError(f"Alkuarvoja on {len(parametrit)}, mutta komponenteilla on {maara} "
+                         "parametria.")
+
+    parametrit, nelio, kierros = _levenberg_marquardt(muodot, x, y[None, :], parametrit[None, :],
+                                                      kierroksia, toleranssi)
+    return _tulokset(muodot, parametrit[0], float(nelio[0]), kierros)
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def sovita_joukko(energiat, intensiteetit, minimi, maksimi, muodot, alkuarvot, *,
+                  kierroksia=KIERROKSIA, toleranssi=TOLERANSSI):
+    """
+    Sovittaa saman mallin moneen samalla energia-akselilla mitattuun spektriin kerralla.
+    intensiteetit on (S, n)-taulukko. alkuarvot on kuten sovita-funktiolla (sama kaikille
+    spektreille) tai (S, p)-taulukko spektrikohtaisista alkuarvoista. Palauttaa sanakirjan
+    kuten sovita, mutta parametrit ovat (S, p)-, pinta-alat (S, k)- ja neliösummat
+    (S,)-taulukkoja. Jakobiaanit lasketaan osissa, jotta ne mahtuvat MUISTIRAJAan.
+    """
+
+    maara = _tarkista_muodot(muodot)
+    x, y = _valin_data(energiat, np.atleast_2d(intensiteetit), minimi, maksimi)
+
+    if isinstance(alkuarvot, np.ndarray) and alkuarvot.ndim == 2:
+        parametrit = alkuarvot.astype(np.float64)
+    else:
+        yhteiset = np.concatenate([np.asarray(arvot, dtype=np.float64) for arvot in alkuarvot])
+        parametrit = np.tile(yhteiset, (len(y), 1))
+
+    if parametrit.shape != (len(y), maara):
+        raise ValueError(f"Alkuarvojen muoto {parametrit.shape} ei vastaa {len(y)} spektriä ja "
+                         f"{maara} parametria.")
+
+    lohko = max(1, MUISTIRAJA // (3 * 8 * len(x) * maara))
+    # Kerralla muistissa on kaksi jakobiaania (nykyinen ja uusi) sekä niiden väliaikaiset.
+    tulokset = [_levenberg_marquardt(muodot, x, y[alku:alku + lohko],
+                                     parametrit[alku:alku + lohko], kierroksia, toleranssi)
+                for alku in range(0, len(y), lohko)]
+
+    return _tulokset(muodot, np.concatenate([tulos[0] for tulos in tulokset]),
+                     np.concatenate([tulos[1] for tulos in tulokset]),
+                     max(tulos[2] for tulos in tulokset))
+
+# pylint: disable-next=too-many-arguments
+def arvaa_alkuarvot(energiat, intensiteetit, sijainnit, ikkunat, *, muoto="pseudovoigt",
+                    ikkunakerroin=pk.IKKUNAKERROIN):
+    """
+    Muodostaa alkuarvot piikkien etsinnän tuloksista (ks. piikit.etsi_piikit):
+    korkeus on intensiteetti huipun kohdalla ja leveys integrointivälin pituus jaettuna
+    ikkunakertoimella (väli ulottuu ikkunakertoimen verran puoliarvoleveyksiä
+    kummallekin puolelle). Pseudo-Voigt-komponentit aloitetaan puoliksi Lorentz-muotoisina.
+    Palauttaa muodot ja alkuarvot sovita-funktiolle sopivina listoina.
+    """
+
+    energiat = np.asarray(energiat, dtype=np.float64)
+    jarjestys = np.argsort(energiat) # np.interp vaatii nousevat energiat.
+    korkeudet = np.interp(sijainnit, energiat[jarjestys], np.asarray(intensiteetit)[jarjestys])
+    alkuarvot = []
+
+    for korkeus, sijainti, (e_min, e_max) in zip(korkeudet, sijainnit, ikkunat):
+        arvot = [float(korkeus), float(sijainti), max((e_max - e_min) / ikkunakerroin,
+                                                      PIENIN_LEVEYS)]
+
+        if muoto == "pseudovoigt":
+            arvot.append(0.5)
+
+        alkuarvot.append(tuple(arvot))
+
+    return [muoto] * len(alkuarvot), alkuarvot
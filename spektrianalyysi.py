@@ -8,22 +8,42 @@ Työkalu sisältää yksinkertaisen graafisen käyttöliittymän, jonka avulla
 käyttäjä voi suorittaa toimintoja.
 Dataa voidaan muokata poistamalla siitä lineaarinen tausta.
 Työkalu mahdollistaa myös datan analyysin laskemalla kuvaajalta löytyvien piikkien pinta-alat
-numeerisella integroinnilla.
-Kuvaaja voidaan tallentaa png-tiedostoksi.
+numeerisella integroinnilla. Piikit voidaan valita kuvaajalta tai etsiä automaattisesti.
+Päällekkäiset piikit voidaan erottaa sovittamalla valitulle välille pseudo-Voigt-komponentteja.
+Mittaustiedostot voidaan yhdistää summan sijaan myös keskiarvoksi, mediaaniksi tai
+sigmaleikatuksi keskiarvoksi, jolloin yksittäinen poikkeava mittaus ei pilaa tulosta.
+Useita mittauskansioita voidaan ladata samaan istuntoon ja näyttää kuvaajalla päällekkäin
+tai pinottuina; analyysit tehdään aktiiviselle aineistolle (ks. istunto.py).
+Kuvaaja voidaan tallentaa png-tiedostoksi. Spektri taustoineen ja piikkien tuloksineen
+voidaan viedä npz-tiedostoon ja tuoda sieltä takaisin ilman mittaustiedostoja (ks. vienti.py).
 
 Ikkunastoon on tehty joitakin muutoksia, jotta se soveltuisi paremmin
 tähän ohjelmaan; ks. ikkunasto.py.
 """
 
-import os # Hyödynnetään kansioiden ja tiedostojen "haravoinnissa".
-from re import search # RegExiä hyödynnetään tutkittaessa, onko tiedostonimet haluttua muotoa.
+import os # Hyödynnetään tiedostopolkujen käsittelyssä.
 from enum import Enum
+import threading
+import queue
+import time
 import locale
 import numpy as np
-import ikkunasto as ik
-
-locale.setlocale(locale.LC_ALL, "FI")
-# Asetetaan locale, jotta saadaan käytettyä oikeaoppisesti desimaalipilkkua.
+import valimuisti as vm
+import matriisi as mt
+import harvennus as hv
+import istunto as it
+import vienti as vi
+import yhdistaminen as yd
+import spektrilaskenta as sl
+import piikit as pk
+import sovitus as sv
+
+ik = None # pylint: disable=invalid-name
+# Ikkunasto (ja sen mukana tkinter ja matplotlib) tuodaan vasta main-funktiossa,
+# jotta moduulia voidaan käyttää laskentaan myös ilman graafista käyttöliittymää.
+
+LOKAALIT = ["FI", "fi_FI.UTF-8", "fi_FI"]
+# Suomenkielisen localen nimet eri käyttöjärjestelmissä (Windows, Linux/macOS).
 
 class Odottaa(Enum):
     """
@@ -34,25 +54,77 @@ class Odottaa(Enum):
     POISTA = 0
     LASKE = 1
     LEPO = 2
+    SOVITA = 3
+
+SPEKTRIN_TYYPPI = "float64" # Intensiteettien tietotyyppi muistissa; float32 puolittaa muistin.
 
 data = { # Määritellään datasanakirja, jotta ladattuja arvoja voidaan käyttää eri funktioissa.
-    "energiat": [], # Sisältää mittausdatasta ladatut energia-arvot.
-    "summaintensiteetit": [], # Saadaan laskemalla tiedostojen intensiteetit yhteen.
-    "summaintensiteetit_taustaton": [], # Lopputulos, kun käyttäjä on poistanut lineaarisen taustan.
+    "spektri": sl.Spektri(tyyppi=SPEKTRIN_TYYPPI),
+    # Ladattu spektri (ks. spektrilaskenta.Spektri): energiat, tiedostojen summa (tai muun
+    # yhdistämistavan tulos, ks. "tapa"), poistettu tausta, taustaton signaali ja sen
+    # kumulatiivinen integraali piikkien laskemista varten.
+    # Spektri, tapa, lkm ja matriisi ovat aktiivisen aineiston tietoja (ks. AINEISTON_AVAIMET);
+    # muiden aineistojen tiedot ovat istunnossa.
+    "tapa": "summa", # Tiedostojen yhdistämistapa (ks. yhdistaminen.TAVAT).
     "lkm": 0, # Ladattujen tiedostojen lukumäärä.
+    "matriisi": None, # Tiedostokohtaisen intensiteettimatriisin kansio (ks. matriisi.py).
+    "piikit": vi.tyhjat_piikit(),
+    # Taustattomasta datasta integroidut piikit riveittäin (huippu, e_min, e_max,
+    # intensiteetti); nollataan, kun data tai tausta muuttuu.
     "piste_a": (), # Kuvaajalta voidaan valita kerralla vain kaksi pistettä.
                    # Määritellään siksi selkeyden vuoksi omina muuttujinaan.
     "piste_b": (), # Tulevat sisältämään monikon (x, y), joka sisältää pisteen koordinaatit.
     "tila": Odottaa.LEPO # Alussa ohjelma on lepotilassa.
 }
 
+AINEISTON_AVAIMET = ("spektri", "tapa", "lkm", "matriisi", "piikit")
+# Datasanakirjan avaimet, jotka kuuluvat aktiiviselle aineistolle ja vaihtuvat sen mukana.
+
+istunto = it.uusi()
+# Istunnon aineistot (ks. istunto.py); avaimena on ladatun tai seuratun kansion polku.
+
+lataus = { # Taustalla käynnissä olevan latauksen tila.
+    "saie": None, # Lataussäie, kun lataus on käynnissä.
+    "peruutus": None, # threading.Event, jolla lataus perutaan.
+    "jono": None, # Säie välittää tuloksen pääsäikeelle jonon kautta.
+    "kasitelty": 0, # Edistymislaskurit: käsitellyt, hyväksytyt, energiahilaan
+    "hyvaksytty": 0, # interpoloidut ja hylätyt tiedostot sekä luettujen tiedostojen
+    "sovitettu": 0, # yhteiskoko tavuina.
+    "hylatty": 0,
+    "tavuja": 0,
+    "alku": 0.0, # Latauksen alkuhetki (time.perf_counter).
+    "ilmoitettu": 0.0, # Milloin edistymisestä viimeksi ilmoitettiin.
+    "kansio": None, # Ladattava kansio.
+    "matriisi": None # Ladattavan kansion matriisin kansio.
+}
+
+seuranta = { # Kansion seurannan tila; seurantasäie lukee uudet tiedostot taustalla.
+    "saie": None, # Seurantasäie, kun seuranta on käynnissä.
+    "lopetus": None, # threading.Event, jolla säie pysäytetään.
+    "jono": None, # Säie välittää luetut tiedot pääsäikeelle jonon kautta.
+    "ajastettu": False, # Onko käyttöliittymän tarkistus ajastettu.
+    "kansio": None, # Seurattava kansio.
+    "matriisi": None # Seurattavan kansion matriisin kansio.
+}
+
 # Asetetaan nappien nimet, jotta niihin voidaan viitata muualla poistettaessa nappi käytöstä.
 napit = {
     "LATAA": None,
     "PIIRRA": None,
     "POISTA": None,
     "LASKE": None,
-    "TALLENNA": None
+    "ETSI": None,
+    "SOVITA": None,
+    "YHDISTA": None,
+    "TALLENNA": None,
+    "TYHJENNA": None,
+    "SEURAA": None,
+    "PERUUTA": None,
+    "VIE": None,
+    "TUO": None,
+    "VAIHDA": None,
+    "NAKYMA": None,
+    "SULJE": None
 }
 
 elementit = { # Määritellään muiden ulkoasuelementtien nimet.
@@ -60,15 +132,55 @@ elementit = { # Määritellään muiden ulkoasuelementtien nimet.
     "piirto": None, # matplotlibin subplot
     "alue": None, # matplotlibin kuvaaja
     "graafi": None,
+    "naytetty": (np.empty(0), np.empty(0)),
+    # Kuvaajan täysi data (energiat, intensiteetit), josta graafi piirretään harvennettuna
+    # (ks. harvennus.py).
+    "indeksit": np.empty(0, dtype=np.intp),
+    # Harvennetun graafin pisteiden indeksit täydessä datassa.
+    "vertailut": {}, # Istunnon muiden aineistojen harvennetut graafit kansioittain.
+    "siirtymat": {}, # Muiden aineistojen pystysiirtymät kansioittain (ks. istunto.siirtymat).
     "kuvaaja": None,
-    "merkit": [] # Sisältää kuvaajalle piirrettävät merkit valittujen pisteiden kohdille.
+    "merkit": [], # Sisältää kuvaajalle piirrettävät merkit valittujen pisteiden kohdille.
+    "esikatselu": None, # Taustasuoran esikatselu toista pistettä valittaessa.
+    "valinta": None, # Valittavan energiavälin korostus toista pistettä valittaessa.
+    "pohjakuva": None, # Piirtoalueen kuva ilman päällystä (merkit ja esikatselut), jonka
+                       # päälle päällys blitataan; tallennetaan jokaisessa piirrossa.
+    "sovitus": None # Sovitettu malli kuvaajalla.
 }
 
-TIEDOSTO_REGEX = r"^measurement_\d+.txt$"
-# Määrittää, minkä nimisistä tiedostoista etsitään mittausdataa (RegEx).
-TOLERANSSI = 1
-# Toleranssi valittaessa pistettä kuvaajalta (picker): "kuinka lähelle" on osuttava,
-# jotta klikkaus rekisteröidään kuvaajan pisteeksi.
+LATAUSPROSESSEJA = 1
+# Kuinka monta prosessia jäsentää mittaustiedostoja rinnakkain ladattaessa;
+# 1 tarkoittaa, että tiedostot luetaan yksitellen ilman prosessipoolia.
+HYLKAYKSIA_NAYTETAAN = 20
+# Kuinka monen eniten hylättyjä pisteitä sisältäneen tiedoston nimet kirjoitetaan.
+VALIMUISTIN_KANSIO = os.path.join(os.path.expanduser("~"), ".spektrianalyysi", "valimuisti")
+# Kansio, johon jäsennetyt mittaustiedostot tallennetaan binäärimuodossa (ks. valimuisti.py).
+VALIMUISTIN_KOKO = sl.VALIMUISTIN_KOKO
+# Välimuistin enimmäiskoko tavuina. Ladatun kansion tiedostot säilytetään aina, joten raja
+# koskee muiden kansioiden tiedostoja; suurenna sitä, jos vuorottelet usean suuren kansion välillä.
+MATRIISIEN_KANSIO = os.path.join(os.path.expanduser("~"), ".spektrianalyysi", "matriisit")
+# Kansio, johon ladattujen kansioiden tiedostokohtaiset intensiteettimatriisit tallennetaan;
+# None, jos matriiseja ei tallenneta.
+MATRIISIN_TYYPPI = "float64" # Matriisin tietotyyppi; float32 puolittaa levytilan.
+MATRIISIEN_KOKO = 2 * 1024 ** 3
+# Matriisien yhteiskoko tavuina; sen ylittyessä pisimpään käyttämättä olleet matriisit
+# poistetaan (ks. matriisi.karsi_vanhimmat).
+VIENNIN_PAKKAUS = False
+# Pakataanko viety spektri. Pakattu tiedosto on pienempi, mutta se puretaan tuotaessa
+# kokonaan muistiin; pakkaamaton avataan muistikuvauksena millisekunneissa.
+VALINNAN_LAPINAKYVYYS = 0.2 # Valittavan energiavälin korostuksen läpinäkymättömyys (alpha).
+KIINNITYSSADE = 0
+# Kuinka monen pikselin säteellä olevaan paikalliseen ääriarvoon valittu piste kiinnitetään:
+# maksimiin, jos klikataan kuvaajan yläpuolelle, ja minimiin, jos alapuolelle.
+# 0 tarkoittaa, että valitaan aina klikkausta lähin mittauspiste.
+LATAUKSEN_PAIVITYSVALI = 100
+# Kuinka usein (millisekunteina) käyttöliittymä tarkistaa, onko lataus valmis.
+LATAUKSEN_ILMOITUSVALI = 1.0
+# Kuinka usein (sekunteina) latauksen edistymisestä kirjoitetaan tekstilaatikkoon.
+SEURANNAN_VALI = 2.0
+# Kuinka usein (sekunteina) seurattu kansio tarkistetaan uusien tiedostojen varalta.
+SEURANNAN_PAIVITYSVALI = 200
+# Kuinka usein (millisekunteina) käyttöliittymä tarkistaa, onko seurantasäie lukenut uutta dataa.
 KUVAAJAN_KOKO = [940, 950] # Määrittää kuvaajan koon (leveys, korkeus).
 LAATIKON_KOKO = [980, 950] # Määrittää tekstilaatikon koon (leveys, korkeus).
 # Edelliset määräävät nappien koon.
@@ -84,15 +196,52 @@ NAPPI_LATAA = "Lataa mittausdata"
 NAPPI_PIIRRA = "Piirrä kuvaaja"
 NAPPI_POISTA = "Poista lineaarinen tausta"
 NAPPI_LASKE = "Laske piikin intensiteetti"
+NAPPI_ETSI = "Etsi piikit automaattisesti"
+NAPPI_SOVITA = "Sovita piikit"
+NAPPI_YHDISTA = "Yhdistämistapa: {}"
+TAPOJEN_NIMET = {
+    "summa": "summa",
+    "keskiarvo": "keskiarvo",
+    "mediaani": "mediaani",
+    "sigmaleikkaus": "sigmaleikattu keskiarvo"
+}
 NAPPI_TALLENNA = "Tallenna kuvaaja"
+NAPPI_PERUUTA = "Peruuta lataus"
+NAPPI_TYHJENNA = "Tyhjennä välimuisti"
+NAPPI_SEURAA = "Seuraa kansiota"
+NAPPI_LOPETA_SEURANTA = "Lopeta kansion seuraaminen"
+NAPPI_VIE = "Vie spektri tiedostoon"
+NAPPI_TUO = "Tuo spektri tiedostosta"
+NAPPI_VAIHDA = "Vaihda aktiivista aineistoa"
+NAPPI_NAKYMA = "Aineistot: {}"
+NAKYMIEN_NIMET = {
+    "paallekkain": "päällekkäin",
+    "pinottu": "pinottuina"
+}
+NAPPI_SULJE = "Sulje aktiivinen aineisto"
 
 LADATTIIN_TIEDOSTOJA = "Ladattiin {} mittaustiedostoa."
+LUETTIIN_TIEDOSTOJA = "Uusia tai muuttuneita tiedostoja luettiin {}."
+LADATAAN = "Ladataan mittausdataa kansiosta {}..."
+LATAUKSEN_EDISTYMINEN = ("Käsitelty {} tiedostoa: {} hyväksytty (joista {} interpoloitu "
+                         "energiahilaan), {} hylätty ({:.1f} Mt/s).")
+LATAUS_PERUTTU = "Lataus peruttiin. Aiemmin ladattu data on edelleen käytössä."
+LATAUS_EPAONNISTUI = "Lataus epäonnistui ({}). Aiemmin ladattu data on edelleen käytössä."
 PIIKIN_INTENSITEETTI = "Valitun piikin intensiteetti on {}."
+PIIKKEJA_LOYTYI = "Löydettiin {} piikkiä:"
+LOYDETTY_PIIKKI = "Piikki {} eV: intensiteetti {} (väli {}...{} eV)."
+PIIKKEJA_EI_LOYTYNYT = "Piikkejä ei löytynyt."
+PIIKIT_TAUSTALLINEN = "Taustaa ei ole poistettu, joten intensiteetit sisältävät taustan."
+SOVITETTIIN_KOMPONENTTEJA = "Välille sovitettiin {} pseudo-Voigt-komponenttia:"
+SOVITETTU_KOMPONENTTI = "Piikki {} eV: leveys (FWHM) {} eV, intensiteetti {}."
+SOVITUS_EPAONNISTUI = "Sovitus epäonnistui. Valitse leveämpi väli."
 
 INFO = "Tervetuloa spektrityökaluun.\n"  \
 "Aloita lataamalla mittaustulokset.\n" \
-"Uusien tulosten lataaminen korvaa aiemmat tulokset ja kuvaajan.\n" \
-"Kuvaaja tallennetaan png-tiedostona.\n\n"
+"Toisen kansion lataaminen lisää sen istuntoon aktiiviseksi aineistoksi;\n" \
+"saman kansion lataaminen uudelleen korvaa sen aiemmat tulokset.\n" \
+"Kuvaaja tallennetaan png-tiedostona.\n" \
+"Spektrin ja tulokset voi viedä npz-tiedostoon ja tuoda myöhemmin takaisin.\n\n"
 
 DATAA_EI_LADATTU = "Dataa ei ole ladattu. Lataa mittausdata \"Lataa mittausdata\"-painikkeesta."
 TAUSTA_POISTETTU = "Lineaarinen tausta poistettiin."
@@ -103,62 +252,36 @@ VALITSE_ERI_PISTEET = "Valitse kaksi eri pistettä."
 
 TALLENNUS_EI = "Tallentaminen epäonnistui."
 TALLENNUS_OK = "Tallentaminen onnistui."
-
-def laske_parametrit(x_1, y_1, x_2, y_2):
-    """
-    Laskee suoran (joka ei ole muotoa x = a) kulmakertoimen ja vakiotermin, kun
-    on annettu kaksi suoran pistettä (x_1, y_1) ja (x_2, y_2).
-    """
-
-    k = (y_2 - y_1) / (x_2 - x_1)
-    b = (x_2 * y_1 - x_1 * y_2) / (x_2 - x_1)
-
-    return k, b
-
-def laske_pisteet_suoralla(k, b, kohdat):
-    """
-    Tuottaa joukon pisteitä, jotka ovat annetulla kulmakertoimella ja vakiotermillä
-    määritetyn suoran arvoja annetuissa x-akselin pisteissä.
-    """
-
-    pisteet = []
-
-    for kohta in kohdat:
-        pisteet.append(k * kohta + b)
-
-    return pisteet
-
-def etsi_indeksit(mittausdata, minimi, maksimi):
-    """
-    Etsii annetusta numeerista dataa sisältävästä listasta alku- ja päätepisteet
-    siten, että alueen arvot ovat annettujen minimi- ja maksimiarvojen välissä.
-    Palauttaa näiden pisteiden indeksit.
-    """
-
-    alku = -1
-    loppu = -1
-    i = None
-
-    for i, luku in enumerate(mittausdata):
-        if luku >= minimi and alku == -1:
-            # Jos löydettiin minimiä suurempi luku ja alkuindeksiä ei ole vielä asetettu,
-            # asetetaan se.
-            alku = i
-
-        if luku > maksimi and loppu == -1:
-            # Jos löydettiin maksimia suurempi luku ja loppuindeksiä ei ole vielä asetettu,
-            # asetetaan se.
-            loppu = i
-
-        if alku > -1 and loppu > -1:
-            # Jos alku- ja päätepisteet löydettiin, palautetaan ne.
-            return alku, loppu
-
-    if alku > -1 and loppu == -1:
-        # Tutkitaan, löydettiinkö alku ja loppu ja palautetaan sen mukaan oikeat arvot.
-        return alku, i + 1
-
-    return i + 1, i + 1
+VIENTI_OK = "Spektri vietiin tiedostoon {}."
+VIENTI_EI = "Spektrin vieminen epäonnistui."
+TUOTIIN = "Tuotiin spektri tiedostosta {}: {} mittaustiedostoa, {} piikkiä."
+TUONTI_EI = "Tiedostoa ei voitu tuoda, sillä se ei ole luettava spektritiedosto."
+
+SEURANTA_ALOITETTU = "Seurataan kansiota {}. Uudet mittaustiedostot lisätään kuvaajaan."
+SEURANTA_LOPETETTU = "Kansion seuraaminen lopetettiin."
+SEURANTA_EPAONNISTUI = "Kansion seuraaminen lopetettiin, koska kansiota ei voitu lukea ({})."
+SEURANTA_PAIVITETTY = "Kansiosta luettiin {} uutta tai muuttunutta tiedostoa; " \
+"mittaustiedostoja on nyt {}."
+SEURANTA_TAUSTA_NOLLATTU = "Tausta palautettiin, koska mittausdata muuttui."
+
+YHDISTETTIIN = "Mittaustiedostot yhdistettiin: {}."
+MATRIISIA_EI_OLE = "Tiedostokohtaista dataa ei ole tallennettu, joten käytetään summaa."
+HYLATTIIN_PISTEITA = "Sigmaleikkaus hylkäsi {} pistettä {} tiedostosta:"
+EI_HYLATTYJA = "Sigmaleikkaus ei hylännyt yhtään pistettä."
+TIEDOSTON_HYLKAYKSET = "{}: {} pistettä"
+MUITA_HYLKAYKSIA = "...sekä {} muuta tiedostoa."
+
+AKTIIVINEN_AINEISTO = "Aktiivinen aineisto: {} ({} mittaustiedostoa)."
+EI_MUITA_AINEISTOJA = "Istunnossa ei ole muita aineistoja. Lataa toinen kansio " \
+"\"Lataa mittausdata\"-painikkeesta."
+AINEISTO_SULJETTU = "Aineisto {} suljettiin."
+AINEISTO_TYHJENI = "Kansiosta {} ei saatu dataa, joten sen aineisto poistettiin istunnosta."
+
+VALIMUISTI_TYHJENNETTY = "Välimuisti tyhjennettiin. Seuraava lataus jäsentää kaikki tiedostot."
+MATRIISIT_TYHJENNETTY = "Tiedostokohtaiset matriisit poistettiin; summaa lukuun ottamatta " \
+"yhdistämistavat ovat käytössä vasta, kun kansio ladataan uudelleen."
+MATRIISIT_KAYTOSSA = "Tiedostokohtaisia matriiseja ei poistettu, koska kansiota luetaan " \
+"parhaillaan."
 
 def onko_data_ladattu():
     """
@@ -168,8 +291,8 @@ def onko_data_ladattu():
     ohje on tarpeen tulostaa aina.
     """
 
-    if (not data["energiat"] or
-            all(summaintensiteetti == 0 for summaintensiteetti in data["summaintensiteetit"])):
+    if (len(data["spektri"].energiat) == 0 or
+            not np.any(data["spektri"].intensiteetit)):
         # Jos energialista on tyhjä tai kaikki summaintensiteetit ovat nollia, dataa ei ole ladattu.
         ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], DATAA_EI_LADATTU)
         # Ilmoitetaan tästä käyttäjälle.
@@ -216,7 +339,7 @@ def onko_tausta_poistettu(tulosta_virhe):
     Palauttaa totuusarvon.
     """
 
-    if data["summaintensiteetit_taustaton"]: # Jos tausta on poistettu...
+    if data["spektri"].taustaton is not None: # Jos tausta on poistettu...
         return True
 
     if tulosta_virhe:
@@ -225,87 +348,68 @@ def onko_tausta_poistettu(tulosta_virhe):
 
     return False
 
-def lue_tiedosto(polku):
-    """"
-    Lukee mittausdatatiedoston.
-    Palauttaa löydetyt energiat ja intensiteetit, jos tiedoston "muotoseikat" ovat kunnossa:
-    sen tulee sisältää rivejä, joilla on kullakin kaksi liukulukua välilyönnillä erotettuna.
-    (Muista vaatimuksista huolehditaan lue_data -funktiossa.)
-    Muuten palautetaan monikko, joka sisältää kaksi totuusarvoa.
+def lue_data(polku, prosesseja=1, valimuisti=None, lisaava=False, matriisi=None):
+    """
+    Lukee kansion mittausdatan lue_kansio -funktiolla (ks. parametrit sieltä) ja
+    tallettaa energiat sekä summaintensiteetit ohjelman muistiin kansion aineistoksi,
+    joka asetetaan aktiiviseksi. Jos kansiosta ei saatu dataa, aineiston spektri
+    tyhjennetään. Palauttaa nyt luettujen tiedostojen lukumäärän.
     """
 
-    energiat = []
-    intensiteetit = []
+    energiat, summaintensiteetit, lkm, luettu = sl.lue_kansio(
+        polku, prosesseja, valimuisti, lisaava=lisaava, matriisi=matriisi,
+        matriisin_tyyppi=MATRIISIN_TYYPPI)
 
-    try:
-        with open(polku) as lahde:
-            for rivi in lahde.readlines():
-                tiedot = rivi.rstrip().split()
-                # Poistetaan lopusta rivinvaihtomerkki ja yritetään jakaa rivi välilyönnin kohdalta.
-
-                if not len(tiedot) == 2:
-                    # Tiedosto hylätään saman tien, jos rivillä ei ole oikeaa määrää tietoja.
-                    return False, False
-
-                energiat.append(float(tiedot[0]))
-                # Lisätään energiat ja intensiteetit listaan, jota käydään läpi funktion sisällä.
-                intensiteetit.append(float(tiedot[1]))
-    except (ValueError, IOError, IndexError):
-        # tietoja ei voitu muuttaa liukuluvuiksi; tiedostoa ei voitu lukea;
-        # rivillä oli vähemmän kuin kaksi arvoa
-        return False, False
-        # Jos tapahtui virhe, tiedosto ei ole kelvollinen ja se hylätään saman tien.
-    else:
-        return energiat, intensiteetit
-
-def lue_data(polku):
-    """
-    Käy läpi polun sisältämät tiedostot alikansioita myöten.
-    Lukee muotoa measurement_X.txt olevista tiedostoista mittausdatan ja
-    tallettaa energiat sekä summaintensiteetit ohjelman muistiin.
-    Tiedosto hylätään, jos sen "muotoseikat" eivät ole kunnossa
-    tai se ei sisällä samoja energiatietoja/saman verran datarivejä.
-    """
-
-    ensimmainen = True
-    # Kyseessä on ensimmäinen iteraatio;
-    # tällöin täytyy tallettaa energiat ja luoda oikean pituinen intensiteettilista.
-    lkm = 0 # Kelvollisten tiedostojen lukumäärä.
-    summaintensiteetit = [0]
-    # Täytetään summaintensiteetit nollilla siltä varalta, että tiedostoja ei saatu ladattua.
-    # Listan pituus on tällöin merkityksetön.
-
-    for kansiopolku, _, tiedostot in os.walk(polku):
-        # os.walkista saadaan kansiopolku, alikansion nimi ja tiedostonimi.
-        for tiedosto in tiedostot:
-            hakemistopolku = os.path.join(kansiopolku, tiedosto) # Muodostetaan koko polku.
-
-            if search(TIEDOSTO_REGEX, tiedosto):
-                # Tutkitaan RegExillä, onko tiedostonimi haluttua muotoa
-                # (määrätty tiedoston alussa).
-                energiat, intensiteetit = lue_tiedosto(hakemistopolku)
-
-                if energiat and intensiteetit: # Itse tiedosto oli kelvollinen.
-                    if ensimmainen: # Jos kyseessä on ensimmäinen tiedosto...
-                        summaintensiteetit = [0] * len(intensiteetit)
-                        # luodaan oikean pituinen summaintensiteettilista ja täytetään se nollilla.
-                        data["energiat"] = energiat # Sijoitetaan energiatiedot datasanakirjaan.
-                        ensimmainen = False
-                        # Tämän jälkeen kyseessä ei tietenkään ole ensimmäinen iteraatio...
-                    else: # Jos kyseessä ei ole ensimmäinen tiedosto...
-                        if data["energiat"] != energiat:
-                            # ...verrataan, ovatko tiedostojen sisältämät energiatiedot samat ja
-                            # tarvittaessa hylätään tiedosto.
-                            continue
-
-                    summaintensiteetit = np.array(summaintensiteetit) + np.array(intensiteetit)
-                    # Käytetään numpyä listojen summamiseen (element-wise addition).
-                    summaintensiteetit = summaintensiteetit.tolist()
-                    # Muutetaan array vielä tavalliseksi listaksi.
-                    lkm += 1 # Jos tiedosto oli kelvollinen, lisätään se lukumäärään.
-
-    data["summaintensiteetit"] = summaintensiteetit
-    data["lkm"] = lkm # Lopuksi asetetaan saadut tiedot koko ohjelman käyttöön (datasanakirjaan).
+    if energiat is None: # Summa on tällöin merkityksetön (yhden alkion nollataulukko).
+        energiat, summaintensiteetit = (), ()
+    valitse_aineisto(polku)
+    aseta_data(energiat, summaintensiteetit, lkm, matriisi)
+
+    return luettu
+
+def matriisin_polku(kansio):
+    """
+    Palauttaa mittauskansion intensiteettimatriisin kansion tai None, jos matriiseja
+    ei tallenneta.
+    """
+
+    if MATRIISIEN_KANSIO and kansio:
+        return mt.polku(MATRIISIEN_KANSIO, kansio)
+
+    return None
+
+def aseta_data(energiat, summaintensiteetit, lkm, matriisi=None, aineisto=None):
+    """
+    Asettaa ladatut tiedot koko ohjelman käyttöön (datasanakirjan spektriin) tai
+    annetun istunnon aineiston tietoihin. Energiat eivät saa olla None: kansio, josta
+    ei saatu dataa, poistetaan istunnosta (ks. poista_aineisto). Koska data muuttuu,
+    sen kumulatiivinen integraali mitätöidään.
+    """
+
+    if aineisto is None:
+        aineisto = data
+
+    aineisto["spektri"].aseta(energiat, summaintensiteetit)
+    aineisto["lkm"] = lkm
+    aineisto["matriisi"] = matriisi
+    aineisto["piikit"] = vi.tyhjat_piikit()
+
+def valitse_aineisto(kansio):
+    """
+    Tekee kansion aineistosta aktiivisen eli siirtää sen tiedot datasanakirjaan.
+    Kansiolle, jota ei vielä ole istunnossa, luodaan tyhjä aineisto nykyisellä
+    yhdistämistavalla. Aineistot ovat muistissa, joten mitään ei lueta levyltä.
+    """
+
+    if kansio == istunto["aktiivinen"]:
+        return
+
+    if kansio not in istunto["aineistot"]:
+        istunto["aineistot"][kansio] = {"spektri": sl.Spektri(tyyppi=SPEKTRIN_TYYPPI),
+                                        "tapa": data["tapa"], "lkm": 0, "matriisi": None,
+                                        "piikit": vi.tyhjat_piikit()}
+
+    it.vaihda(istunto, kansio, data, AINEISTON_AVAIMET)
 
 def nollaa_pisteet():
     """
@@ -317,16 +421,154 @@ def nollaa_pisteet():
     data["piste_b"] = () # Pistekoordinaatit tyhjennetään.
 
     for merkki in elementit["merkit"][:]: # Poistetaan pistemerkit kuvaajalta.
-        merkki.remove()
+        if merkki.axes is not None: # Piirtoalueen tyhjentäminen on jo poistanut merkin.
+            merkki.remove()
+
         elementit["merkit"].remove(merkki)
 
-    elementit["alue"].draw() # Uudelleenpiirto, jotta tilanne päivittyy.
+    piilota_esikatselut()
+    piirra_paallys() # Merkit ovat päällyksessä, joten koko kuvaajaa ei tarvitse piirtää.
+
+def paallysartistit():
+    """
+    Palauttaa päällyksen artistit eli pistemerkit ja näkyvät esikatselut. Ne on luotu
+    animoituina (animated=True), joten matplotlib ei piirrä niitä kuvaajan mukana.
+    """
+
+    artistit = [merkki for merkki in elementit["merkit"] if merkki.axes is not None]
+
+    for nimi in ("esikatselu", "valinta"):
+        artisti = elementit[nimi]
+
+        if artisti is not None and artisti.axes is not None and artisti.get_visible():
+            artistit.append(artisti)
+
+    return artistit
+
+def tallenna_pohjakuva(_=None):
+    """
+    Piirron käsittelijä (draw_event): tallentaa juuri piirretyn piirtoalueen kuvan
+    päällyksen pohjaksi ja piirtää päällyksen sen päälle.
+    """
+
+    elementit["pohjakuva"] = elementit["alue"].copy_from_bbox(elementit["kuvaaja"].bbox)
+
+    for artisti in paallysartistit():
+        elementit["piirto"].draw_artist(artisti)
+
+def piirra_paallys():
+    """
+    Piirtää päällyksen tallennetun pohjakuvan päälle ja päivittää vain sen näytölle
+    (blittaus), joten aika ei riipu spektrin pisteiden määrästä. Jos pohjakuvaa ei vielä
+    ole, piirretään koko kuvaaja, jolloin pohjakuva tallentuu.
+    """
+
+    if elementit["pohjakuva"] is None:
+        elementit["alue"].draw()
+        return
+
+    elementit["alue"].restore_region(elementit["pohjakuva"])
+
+    for artisti in paallysartistit():
+        elementit["piirto"].draw_artist(artisti)
+
+    elementit["alue"].blit(elementit["kuvaaja"].bbox)
+
+def piilota_esikatselut():
+    """
+    Piilottaa taustasuoran ja energiavälin esikatselut. Palauttaa tiedon, oliko
+    jokin niistä näkyvissä.
+    """
+
+    piilotettiin = False
+
+    for nimi in ("esikatselu", "valinta"):
+        if elementit[nimi] is not None and elementit[nimi].get_visible():
+            elementit[nimi].set_visible(False)
+            piilotettiin = True
+
+    return piilotettiin
+
+def esikatsele_valinta(tapahtuma):
+    """
+    Hiiren liikkeen käsittelijä. Kun ensimmäinen piste on valittu ja ohjelma odottaa
+    toista, näyttää taustan poistossa suoran, joka kulkisi ensimmäisen pisteen ja
+    kursoria lähimmän mittauspisteen kautta, ja intensiteetin laskemisessa ja
+    sovituksessa valittavan energiavälin. Esikatselu piirretään päällykseen.
+    """
+
+    odottaa_toista = (data["tila"] in (Odottaa.POISTA, Odottaa.LASKE, Odottaa.SOVITA)
+                      and data["piste_a"] and not data["piste_b"])
+
+    if (not odottaa_toista or not onko_kuvaaja_piirretty(False)
+            or tapahtuma.inaxes is not elementit["piirto"] or tapahtuma.xdata is None):
+        # Esikatseltavaa ei ole tai kursori on kuvaajan ulkopuolella.
+        if piilota_esikatselut():
+            piirra_paallys()
+
+        return
+
+    x_a, y_a = data["piste_a"][0], data["piste_a"][1]
+    x, y = sl.lahin_piste(*elementit["naytetty"], tapahtuma.xdata)
+
+    if data["tila"] == Odottaa.POISTA:
+        if elementit["esikatselu"] is None or elementit["esikatselu"].axes is None:
+            elementit["esikatselu"], = elementit["piirto"].plot([], [], "k--", animated=True)
+            # Luodaan uudelleen myös, jos piirtoalue on tyhjennetty.
+
+        if x == x_a: # Pisteet eivät saa olla samat, joten suoraa ei ole.
+            elementit["esikatselu"].set_visible(False)
+        else:
+            k, b = sl.laske_parametrit(x_a, y_a, x, y)
+            rajat = np.array(elementit["piirto"].get_xlim()) # Suora kuvaajan reunasta reunaan.
+            elementit["esikatselu"].set_data(rajat, sl.laske_pisteet_suoralla(k, b, rajat))
+            elementit["esikatselu"].set_visible(True)
+    else:
+        if elementit["valinta"] is None or elementit["valinta"].axes is None:
+            from matplotlib.patches import Rectangle # pylint: disable=import-outside-toplevel
+            # Matplotlib tuodaan vasta käyttöliittymän kanssa (ks. ik).
+            elementit["valinta"] = elementit["piirto"].add_patch(Rectangle(
+                (x_a, 0), 0, 1, transform=elementit["piirto"].get_xaxis_transform(),
+                alpha=VALINNAN_LAPINAKYVYYS, animated=True))
+            # axvspan palauttaa vanhemmissa matplotlibeissa monikulmion, jolla ei ole
+            # set_bounds-metodia, joten suorakulmio luodaan itse.
+
+        elementit["valinta"].set_bounds(min(x_a, x), 0, abs(x - x_a), 1)
+        # Korostus ulottuu x-suunnassa datan ja y-suunnassa akselien koordinaateissa.
+        elementit["valinta"].set_visible(True)
+
+    piirra_paallys()
+
+def kiinnita_aariarvoon(indeksi, y):
+    """
+    Siirtää valitun pisteen (täyden datan indeksi) KIINNITYSSADE pikselin säteellä olevaan
+    paikalliseen maksimiin, jos klikkauksen y-koordinaatti on pisteen yläpuolella, ja muuten
+    minimiin. Ehdokkaina ovat harvennetun kuvaajan pisteet, joihin kuuluvat jokaisen
+    pikselisarakkeen ääriarvot, joten haun aika ei riipu spektrin pisteiden määrästä.
+    """
+
+    energiat, intensiteetit = elementit["naytetty"]
+    muunnos = elementit["piirto"].transData
+    x_pikseli, _ = muunnos.transform((energiat[indeksi], intensiteetit[indeksi]))
+    (e_1, _), (e_2, _) = muunnos.inverted().transform([(x_pikseli - KIINNITYSSADE, 0),
+                                                       (x_pikseli + KIINNITYSSADE, 0)])
+    # Pikselisäde muutetaan energiaväliksi.
+    ehdokkaat = elementit["indeksit"]
+    alku, loppu = sl.etsi_indeksit(energiat[ehdokkaat], min(e_1, e_2), max(e_1, e_2))
+    ehdokkaat = np.append(ehdokkaat[alku:loppu], indeksi)
+
+    if y >= intensiteetit[indeksi]:
+        return int(ehdokkaat[np.argmax(intensiteetit[ehdokkaat])])
+
+    return int(ehdokkaat[np.argmin(intensiteetit[ehdokkaat])])
 
 def kasittele_pistevalinta(tapahtuma):
     """
-    Funktiota kutsutaan pick-eventissä, kun käyttäjä klikkaa hiirtä
-    kuvaajan kohdalla. Pisteiden valinta aloitetaan, jos ja vain jos ohjelma
-    odottaa käyttäjän syötettä (=pisteiden valintaa) taustan poistoa tai
+    Funktiota kutsutaan, kun käyttäjä klikkaa hiirellä piirtoaluetta (button_press_event).
+    Klikkausta lähin mittauspiste etsitään energia-akselilta binäärihaulla, ja valinta
+    kiinnitetään tarvittaessa paikalliseen ääriarvoon (ks. KIINNITYSSADE), joten valinnan
+    aika ei riipu spektrin pisteiden määrästä. Pisteiden valinta aloitetaan, jos ja vain
+    jos ohjelma odottaa käyttäjän syötettä (=pisteiden valintaa) taustan poistoa tai
     intensiteetin laskemista varten.
 
     Käyttäjä valitsee kaksi pistettä ja niiden kohdalle piirretään markkerit.
@@ -335,19 +577,27 @@ def kasittele_pistevalinta(tapahtuma):
     funktioita tilamuuttujan arvon mukaan.
     """
 
-    artisti = tapahtuma.artist # Artist on nyt kuvaaja.
-    x_lista = artisti.get_xdata()
-    y_lista = artisti.get_ydata() # Hankitaan x- ja y-tiedot listoiksi.
-    indeksi = tapahtuma.ind
-    # Talletetaan indeksi, jotta tiedot osataan lukea oikeasta kohdasta x- ja y-arvojen listasta.
+    if (tapahtuma.inaxes is not elementit["piirto"] or tapahtuma.xdata is None
+            or not onko_kuvaaja_piirretty(False)):
+        return # Klikkaus ei osunut kuvaajaan.
 
-    x = x_lista[indeksi][0]
-    y = y_lista[indeksi][0]
+    if tapahtuma.canvas.toolbar is not None and tapahtuma.canvas.toolbar.mode:
+        return # Klikkaus zoomaa tai panoroi kuvaajaa.
 
-    if data["tila"] == Odottaa.POISTA or data["tila"] == Odottaa.LASKE:
+    x_lista, y_lista = elementit["naytetty"] # Kuvaajan täysi data.
+    indeksi = sl.lahin_indeksi(x_lista, tapahtuma.xdata)
+
+    if KIINNITYSSADE > 0:
+        indeksi = kiinnita_aariarvoon(indeksi, tapahtuma.ydata)
+
+    x = x_lista[indeksi]
+    y = y_lista[indeksi]
+
+    if data["tila"] in (Odottaa.POISTA, Odottaa.LASKE, Odottaa.SOVITA):
         # Ei sallita pisteiden valintaa huvin vuoksi...
-        elementit["merkit"].extend(elementit["piirto"].plot(x, y, "kx")) # Lisätään merkki.
-        elementit["alue"].draw()
+        elementit["merkit"].extend(elementit["piirto"].plot(x, y, "kx", animated=True))
+        # Lisätään merkki päällykseen.
+        piirra_paallys()
 
         if data["piste_a"] and not data["piste_b"]: # Onko piste A jo valittu ja B valitsematta?
             data["piste_b"] = (x, y)
@@ -361,31 +611,189 @@ def kasittele_pistevalinta(tapahtuma):
                     poista_tausta()
                 elif data["tila"] == Odottaa.LASKE:
                     laske_intensiteetit()
+                elif data["tila"] == Odottaa.SOVITA:
+                    sovita_piikit()
         else: # Jos A on kuitenkin vielä valitsematta...
             data["piste_a"] = (x, y)
 
 def avaa_kansio():
     """
     Napinkäsittelijä, joka pyytää käyttäjää valitsemaan kansion avaamalla
-    kansioselaimen. Lataa datan valitusta kansiosta ja ilmoittaa käyttöliittymän
-    tekstilaatikkoon montako tiedostoa luettiin.
+    kansioselaimen. Käynnistää datan lataamisen valitusta kansiosta taustasäikeessä,
+    jotta käyttöliittymä ei jumiudu suurtenkaan kansioiden aikana. Latauksen edistymisestä
+    ja lopuksi luettujen tiedostojen määrästä ilmoitetaan käyttöliittymän tekstilaatikkoon.
+    """
+
+    if lataus["saie"]: # Edellinen lataus on vielä kesken.
+        return
+
+    polku = ik.avaa_hakemistoikkuna("Valitse kansio")
+
+    lataus.update(kasitelty=0, hyvaksytty=0, sovitettu=0, hylatty=0, tavuja=0,
+                  alku=time.perf_counter(), ilmoitettu=time.perf_counter())
+    # Nollataan edistymislaskurit.
+    lataus["kansio"] = polku
+    lataus["matriisi"] = matriisin_polku(polku)
+    lataus["peruutus"] = threading.Event()
+    lataus["jono"] = queue.Queue()
+    lataus["saie"] = threading.Thread(target=lataa_taustalla,
+                                      args=(polku, lataus["peruutus"], lataus["jono"]),
+                                      daemon=True)
+    lataus["saie"].start()
+
+    napit["LATAA"].config(state="disabled")
+    napit["PERUUTA"].config(state="normal")
+    # Samaan aikaan voi olla käynnissä vain yksi lataus, mutta sen voi perua.
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], LADATAAN.format(polku))
+    ik.ajasta(LATAUKSEN_PAIVITYSVALI, kasittele_lataus)
+
+def lataa_taustalla(polku, peruutus, jono):
+    """
+    Lataussäikeen pääfunktio: lukee kansion lisäävästi ja välittää tuloksen jonon kautta
+    pääsäikeelle. Jos lukeminen epäonnistuu, jonoon välitetään poikkeus, jotta pääsäie
+    ei jää odottamaan tulosta. Käyttöliittymää ei saa käsitellä tästä säikeestä.
+    """
+
+    try:
+        tulos = sl.lue_kansio(polku, LATAUSPROSESSEJA, VALIMUISTIN_KANSIO, lisaava=True,
+                              peruutus=peruutus, edistyminen=kirjaa_edistyminen,
+                              matriisi=matriisin_polku(polku), matriisin_tyyppi=MATRIISIN_TYYPPI,
+                              valimuistin_koko=VALIMUISTIN_KOKO)
+        # Saman kansion uudelleenlataus lukee vain uudet ja muuttuneet tiedostot.
+        rajoita_matriisit(polku)
+        jono.put(tulos)
+    except Exception as virhe: # pylint: disable=broad-except
+        sl.unohda_kansio(polku)
+        # Kansion tila voi olla kesken, joten seuraava lataus lukee kansion alusta.
+        jono.put(virhe)
+
+def rajoita_matriisit(kansio):
+    """
+    Pitää matriisien yhteiskoon MATRIISIEN_KOKO-rajassa; juuri luetun kansion matriisi
+    säilytetään. Kutsutaan lukevasta säikeestä latauslukon ollessa vapaana, ja lukko
+    varataan karsimisen ajaksi, jottei toinen säie kirjoita poistettavaa matriisia.
+    """
+
+    if MATRIISIEN_KANSIO:
+        with sl.latauslukko:
+            mt.karsi_vanhimmat(MATRIISIEN_KANSIO, MATRIISIEN_KOKO, matriisin_polku(kansio))
+
+def poista_matriisi(kansio=None):
+    """
+    Poistaa kansion matriisin tai, jos kansiota ei anneta, kaikki matriisit. Matriisia ei
+    poisteta, jos jokin säie lukee parhaillaan kansiota, sillä käyttöliittymä ei saa jäädä
+    odottamaan latauksen valmistumista. Palauttaa False, jos poistaminen ohitettiin.
+    """
+
+    if not MATRIISIEN_KANSIO:
+        return True
+
+    if not sl.latauslukko.acquire(blocking=False): # pylint: disable=consider-using-with
+        return False # with-lause odottaisi lukkoa; se vapautetaan alla finally-lohkossa.
+
+    try:
+        if kansio is None:
+            mt.karsi_vanhimmat(MATRIISIEN_KANSIO, 0)
+        else:
+            mt.tyhjenna(matriisin_polku(kansio))
+    finally:
+        sl.latauslukko.release()
+
+    return True
+
+def kirjaa_edistyminen(polku, hyvaksytty, sovitettu):
+    """
+    Päivittää latauksen edistymislaskurit. Kutsutaan lataussäikeestä jokaisen
+    käsitellyn tiedoston jälkeen.
+    """
+
+    try:
+        lataus["tavuja"] += os.path.getsize(polku)
+    except OSError:
+        pass # Tiedosto on ehditty poistaa; sen kokoa ei lasketa mukaan.
+
+    lataus["hyvaksytty" if hyvaksytty else "hylatty"] += 1
+    lataus["sovitettu"] += sovitettu # Tiedosto oli mitattu eri energiahilassa.
+    lataus["kasitelty"] += 1
+
+def kirjoita_edistyminen():
+    """
+    Kirjoittaa latauksen edistymisen (käsitellyt, hyväksytyt, energiahilaan interpoloidut
+    ja hylätyt tiedostot sekä lukunopeus) tekstilaatikkoon.
     """
 
-    lue_data(ik.avaa_hakemistoikkuna("Valitse kansio"))
+    kesto = max(time.perf_counter() - lataus["alku"], 1e-9)
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                 LATAUKSEN_EDISTYMINEN.format(lataus["kasitelty"],
+                                                              lataus["hyvaksytty"],
+                                                              lataus["sovitettu"],
+                                                              lataus["hylatty"],
+                                                              lataus["tavuja"] / 1e6 / kesto))
+
+def kasittele_lataus():
+    """
+    Tarkistaa pääsäikeessä, onko lataussäie valmis. Jos ei, kirjoittaa edistymisen
+    tekstilaatikkoon sopivin välein ja ajastaa itsensä uudelleen. Valmis tulos
+    asetetaan ohjelman käyttöön samaan tapaan kuin ennen latausta taustasäikeessä.
+    """
+
+    try:
+        tulos = lataus["jono"].get_nowait()
+    except queue.Empty:
+        if time.perf_counter() - lataus["ilmoitettu"] >= LATAUKSEN_ILMOITUSVALI:
+            lataus["ilmoitettu"] = time.perf_counter()
+            kirjoita_edistyminen()
+
+        ik.ajasta(LATAUKSEN_PAIVITYSVALI, kasittele_lataus)
+        return
+
+    lataus["saie"] = None
+    napit["LATAA"].config(state="normal")
+    napit["PERUUTA"].config(state="disabled")
+
+    if tulos is None: # Lataus peruttiin; aiempi data jää voimaan.
+        kirjoita_edistyminen()
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], LATAUS_PERUTTU)
+        return
+
+    if isinstance(tulos, Exception): # Lataus epäonnistui; aiempi data jää voimaan.
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], LATAUS_EPAONNISTUI.format(tulos))
+        return
+
+    energiat, summaintensiteetit, lkm, luettu = tulos
+
     ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], INFO, tyhjaa=True)
     # Tyhjennetään laatikko ja kirjoitetaan info.
-    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
-                                 LADATTIIN_TIEDOSTOJA.format(data["lkm"]))
-    # Ilmoitetaan käyttäjälle ladattujen tiedostojen lukumäärä.
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], LADATTIIN_TIEDOSTOJA.format(lkm))
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], LUETTIIN_TIEDOSTOJA.format(luettu))
+    kirjoita_edistyminen()
+    # Ilmoitetaan käyttäjälle ladattujen ja nyt luettujen tiedostojen lukumäärä.
 
-    napit["PIIRRA"].config(state="normal")
-    napit["POISTA"].config(state="normal")
-    # Asetetaan painikkeet klikattaviksi siltä varalta, että nyt tuodaan uutta mittausdataa.
+    if energiat is None or not lkm:
+        # Kansiosta ei saatu dataa. Vanhaa energia-akselia ei yhdistetä uusiin
+        # intensiteetteihin, vaan kansion mahdollinen aineisto poistetaan istunnosta.
+        if lataus["kansio"] in istunto["aineistot"]:
+            poista_aineisto(lataus["kansio"], AINEISTO_TYHJENI)
 
-    if elementit["graafi"]: # Jos kuvaaja on jo olemassa...
-        elementit["graafi"].remove() # ...poistetaan vanha kuvaaja...
-        elementit["graafi"] = None
-        nollaa_pisteet() # ...ja nollataan mahdolliset pistevalinnat.
+        return
+
+    valitse_aineisto(lataus["kansio"])
+    aseta_data(energiat, summaintensiteetit, lkm, lataus["matriisi"])
+    data["spektri"].palauta_tausta() # Uudelleen ladatun kansion vanha tausta ei enää päde.
+
+    if data["tapa"] != "summa" and lkm:
+        yhdista_data() # Summan sijaan käytetään valittua yhdistämistapaa.
+
+    nayta_aktiivinen()
+
+def peruuta_lataus():
+    """
+    Napinkäsittelijä, joka keskeyttää käynnissä olevan latauksen. Jo luetut tiedostot
+    jäävät muistiin, joten seuraava saman kansion lataus jatkaa siitä.
+    """
+
+    if lataus["saie"]:
+        lataus["peruutus"].set()
 
 def piirra_data():
     """
@@ -395,15 +803,10 @@ def piirra_data():
     if onko_data_ladattu():
         # Vaatimuksena luonnollisesti on, että mittausdata on ladattu.
         # Käyttäjälle tulostetaan ohje, jos näin ei ole.
-        elementit["piirto"].clear()
-        elementit["piirto"].set_xlabel(X_AKSELI)
-        elementit["piirto"].set_ylabel(Y_AKSELI)
-        # Tyhjennetään piirtoalue varalta ja asetetaan akseleiden nimet.
-        elementit["graafi"], = elementit["piirto"].plot(data["energiat"],
-                                                        data["summaintensiteetit"],
-                                                        picker=TOLERANSSI)
-        # picker on valinnan toleranssi, ks. alussa määritelty vakio.
-        elementit["alue"].draw()
+        poista_sovitus()
+        elementit["graafi"], = elementit["piirto"].plot([], [])
+        # Luodaan tyhjä kuvaaja olemassa oleville akseleille.
+        paivita_graafi(data["spektri"].energiat, data["spektri"].intensiteetit, skaalaa=True)
 
         napit["PIIRRA"].config(state="disabled")
         # Poistetaan nappi käytöstä, jotta samasta datasta ei voida piirtää uutta kuvaajaa.
@@ -421,28 +824,22 @@ def poista_tausta():
         # Tarkistetaan, täyttyvätkö edellytykset:
         # data on ladattu, käyttäjä on valinnut pisteet ja kuvaaja on piirretty.
         # Ei tulosteta pisteohjetta useaan kertaan (False).
-        kulmakerroin, vakiotermi = laske_parametrit(data["piste_a"][0], data["piste_a"][1],
-                                                    data["piste_b"][0], data["piste_b"][1])
-        # Lasketaan pisteitä vastaavan suoran parametrit.
-
-        pisteet = laske_pisteet_suoralla(kulmakerroin, vakiotermi, data["energiat"])
-        intensiteetit_erotus = np.array(data["summaintensiteetit"]) - np.array(pisteet)
-        # Vähennetään summaintensiteeteistä suoran pisteet...
-        data["summaintensiteetit_taustaton"] = intensiteetit_erotus.tolist()
-        # ...ja sijoitetaan listaksi muutettu tulos datasanakirjaan.
-
-        elementit["graafi"].remove() # Poistetaan alkuperäinen kuvaaja.
-        elementit["piirto"].clear() # Palautetaan akselit, jotta niiden skaalaus toimii oikein.
+        spektri = data["spektri"]
+        kulmakerroin, vakiotermi = sl.laske_parametrit(data["piste_a"][0], data["piste_a"][1],
+                                                       data["piste_b"][0], data["piste_b"][1])
+        spektri.poista_tausta(sl.laske_pisteet_suoralla(kulmakerroin, vakiotermi,
+                                                        spektri.energiat))
+        # Vähennetään summaintensiteeteistä pisteiden kautta kulkeva suora
+        # ja sijoitetaan tulos spektriin.
+        spektri.hae_kertyma()
+        # Lasketaan uuden taustan kumulatiivinen integraali valmiiksi, jolloin
+        # piikkien intensiteetit saadaan siitä suoraan.
+
+        poista_sovitus() # Sovitus tehtiin vanhan taustan mukaan.
+        data["piikit"] = vi.tyhjat_piikit() # Piikit integroitiin vanhasta taustattomasta.
         nollaa_pisteet() # Nollataan käyttäjän valitsemat pisteet.
-
-        elementit["piirto"].set_xlabel(X_AKSELI)
-        elementit["piirto"].set_ylabel(Y_AKSELI) # Asetetaan akseleiden nimet uudelleen.
-
-        elementit["graafi"], = elementit["piirto"].plot(data["energiat"],
-                                                        data["summaintensiteetit_taustaton"],
-                                                        picker=TOLERANSSI)
-        # Uusi kuvaaja paikalleen.
-        elementit["alue"].draw()
+        paivita_graafi(spektri.energiat, spektri.taustaton)
+        # Vaihdetaan kuvaajan intensiteetit paikallaan; akseleita ei luoda uudelleen.
 
         napit["POISTA"].config(state="disabled") # Poistetaan nappi käytöstä.
         data["tila"] = Odottaa.LEPO # Toiminnon suorituksen jälkeen voidaan levätä.
@@ -465,17 +862,25 @@ def laske_intensiteetit():
             and onko_pisteet_valittu(True)):
         # Tarkistetaan, täyttyvätkö edellytykset:
         # data on ladattu, käyttäjä on valinnut pisteet, kuvaaja on piirretty
-        a, b = etsi_indeksit(data["energiat"], data["piste_a"][0], data["piste_b"][0])
-        # Etsitään, mille indeksivälille käyttäjän valitsema energiaväli osuu.
-
-        intensiteetti = np.trapz(data["summaintensiteetit_taustaton"][a:b], x=data["energiat"][a:b])
+        minimi, maksimi = sorted((data["piste_a"][0], data["piste_b"][0]))
+        # Pisteet voidaan valita kummassa järjestyksessä tahansa.
+        spektri = data["spektri"]
+        intensiteetti = sl.integroi_valilla(spektri.energiat, spektri.taustaton,
+                                            spektri.hae_kertyma(), minimi, maksimi)
         lukuarvo = locale.format_string("%.2f", intensiteetti, True)
-        # Lasketaan puolisuunnikassäännön avulla energiaväliä vastaava intensiteetti...
+        # Lasketaan puolisuunnikassäännön avulla energiaväliä vastaava intensiteetti
+        # kumulatiivisen integraalin erotuksena...
         ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
                                      PIIKIN_INTENSITEETTI.format(lukuarvo))
         # ...ja ilmoitetaan se käyttäjälle.
         # Hyödynnetään localea, jotta desimaalierottimeksi saadaan pilkku.
 
+        alku, loppu = sl.etsi_indeksit(spektri.energiat, minimi, maksimi)
+        huippu = (spektri.energiat[alku + np.argmax(spektri.taustaton[alku:loppu])]
+                  if loppu > alku else (minimi + maksimi) / 2)
+        lisaa_piikit([huippu], [(minimi, maksimi)], [intensiteetti])
+        # Tulos talletetaan vientiä varten; huipuksi valitaan välin suurin intensiteetti.
+
         data["tila"] = Odottaa.LEPO
         nollaa_pisteet()
     elif (onko_kuvaaja_piirretty(False) and onko_tausta_poistettu(False)
@@ -483,6 +888,132 @@ def laske_intensiteetit():
         # Jos vain pisteet ovat valitsematta, jäädään odottamaan sitä.
         data["tila"] = Odottaa.LASKE
 
+def etsi_piikit():
+    """
+    Etsii piikit automaattisesti taustattomasta datasta tai, jos taustaa ei ole poistettu,
+    summaintensiteeteistä. Kunkin piikin intensiteetti lasketaan sen integrointiväliltä
+    samalla puolisuunnikassäännöllä kuin valituille pisteille, ja tulokset kirjoitetaan
+    tekstilaatikkoon.
+    """
+
+    if not onko_data_ladattu():
+        return
+
+    spektri = data["spektri"]
+    taustaton = onko_tausta_poistettu(False)
+
+    if taustaton:
+        intensiteetit = spektri.taustaton
+        kertyma = spektri.hae_kertyma() # Hyödynnetään valmiiksi laskettua kertymää.
+    else:
+        intensiteetit = spektri.intensiteetit
+        kertyma = None
+
+    sijainnit, ikkunat = pk.etsi_piikit(spektri.energiat, intensiteetit)
+
+    if not ikkunat:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], PIIKKEJA_EI_LOYTYNYT)
+        return
+
+    intensiteetit = sl.laske_piikkien_intensiteetit(spektri.energiat, intensiteetit, ikkunat,
+                                                    kertyma)
+
+    if taustaton: # Automaattisen etsinnän tulokset korvaavat aiemmat vientiä varten.
+        data["piikit"] = vi.tyhjat_piikit()
+        lisaa_piikit(sijainnit, ikkunat, intensiteetit)
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], PIIKKEJA_LOYTYI.format(len(ikkunat)))
+
+    for sijainti, (e_min, e_max), intensiteetti in zip(sijainnit, ikkunat, intensiteetit):
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], LOYDETTY_PIIKKI.format(
+            *(locale.format_string("%.2f", luku, True)
+              for luku in (sijainti, intensiteetti, e_min, e_max))))
+        # Desimaalierottimeksi pilkku kuten muissakin tuloksissa.
+
+    if not taustaton:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], PIIKIT_TAUSTALLINEN)
+
+def lisaa_piikit(huiput, ikkunat, intensiteetit):
+    """
+    Lisää aktiivisen aineiston piikkitaulukkoon piikkien huiput, integrointivälit
+    (e_min, e_max) ja intensiteetit.
+    """
+
+    rivit = np.column_stack((np.asarray(huiput, dtype=np.float64),
+                             np.asarray(ikkunat, dtype=np.float64).reshape(-1, 2),
+                             np.asarray(intensiteetit, dtype=np.float64)))
+    data["piikit"] = np.vstack((data["piikit"], rivit))
+
+def poista_sovitus():
+    """
+    Poistaa sovitetun mallin kuvaajalta, jos sellainen on piirretty.
+    """
+
+    if elementit["sovitus"]:
+        elementit["sovitus"].remove()
+        elementit["sovitus"] = None
+
+def kirjoita_sovitus(tulos):
+    """
+    Kirjoittaa sovituksen komponenttien keskikohdat, leveydet ja pinta-alat
+    tekstilaatikkoon (ks. sovitus.sovita).
+    """
+
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                 SOVITETTIIN_KOMPONENTTEJA.format(len(tulos["pinta_alat"])))
+
+    for i, pinta_ala in enumerate(tulos["pinta_alat"]):
+        _, keskikohta, leveys, _ = tulos["parametrit"][4 * i:4 * i + 4]
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                     SOVITETTU_KOMPONENTTI.format(
+                                         *(locale.format_string("%.2f", luku, True)
+                                           for luku in (keskikohta, leveys, pinta_ala))))
+
+def sovita_piikit():
+    """
+    Sovittaa käyttäjän valitsemien pisteiden väliselle alueelle pseudo-Voigt-komponenttien
+    summan, jolloin päällekkäistenkin piikkien intensiteetit saadaan eroteltua.
+    Komponenttien alkuarvot saadaan automaattisesta piikkien etsinnästä.
+    Sovitettu malli piirretään kuvaajalle ja tulokset kirjoitetaan tekstilaatikkoon.
+    """
+
+    if (onko_data_ladattu() and onko_kuvaaja_piirretty(True) and onko_tausta_poistettu(True)
+            and onko_pisteet_valittu(True)):
+        # Samat edellytykset kuin intensiteetin laskemisessa.
+        minimi, maksimi = sorted((data["piste_a"][0], data["piste_b"][0]))
+        spektri = data["spektri"]
+        alku, loppu = sl.etsi_indeksit(spektri.energiat, minimi, maksimi)
+        energiat = spektri.energiat[alku:loppu]
+        intensiteetit = spektri.taustaton[alku:loppu]
+        # Sama energiaväli kuin intensiteetin laskemisessa.
+
+        sijainnit, ikkunat = pk.etsi_piikit(energiat, intensiteetit)
+
+        if not ikkunat and len(energiat):
+            # Välillä ei ole selvää huippua; aloitetaan yhdellä välin levyisellä komponentilla.
+            sijainnit, ikkunat = [energiat[np.argmax(intensiteetit)]], [(minimi, maksimi)]
+
+        try:
+            muodot, alkuarvot = sv.arvaa_alkuarvot(energiat, intensiteetit, sijainnit, ikkunat)
+            tulos = sv.sovita(spektri.energiat, spektri.taustaton, minimi,
+                              maksimi, muodot, alkuarvot)
+        except (ValueError, np.linalg.LinAlgError):
+            # Välille osui liian vähän pisteitä tai sovitus ei ratkea.
+            ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], SOVITUS_EPAONNISTUI)
+        else:
+            kirjoita_sovitus(tulos)
+            malli, _ = sv.arvioi(muodot, energiat, tulos["parametrit"][None, :])
+            poista_sovitus()
+            elementit["sovitus"], = elementit["piirto"].plot(energiat, malli[0], "--")
+            # Piirretään sovitettu malli valitulle välille katkoviivalla.
+            elementit["alue"].draw()
+
+        data["tila"] = Odottaa.LEPO
+        nollaa_pisteet()
+    elif (onko_kuvaaja_piirretty(False) and onko_tausta_poistettu(False)
+          and not onko_pisteet_valittu(False)):
+        # Jos vain pisteet ovat valitsematta, jäädään odottamaan sitä.
+        data["tila"] = Odottaa.SOVITA
+
 def tallenna_kuvaaja():
     """
     Tallentaa kuvaajan png-tiedostona käyttäjän valitsemaan paikkaan (tallennusikkunassa).
@@ -504,22 +1035,572 @@ def tallenna_kuvaaja():
             ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], TALLENNUS_OK)
             # Tallennus onnistui.
 
+def vie_spektri():
+    """
+    Napinkäsittelijä, joka vie aktiivisen aineiston spektrin, taustan, mittaustiedostojen
+    määrän ja piikkien tulokset käyttäjän valitsemaan npz-tiedostoon (ks. vienti.py).
+    """
+
+    if not onko_data_ladattu():
+        return
+
+    polku = ik.avaa_tallennusikkuna("Vie spektri", paate=vi.PAATE)
+
+    if not polku: # Käyttäjä perui valinnan.
+        return
+
+    try:
+        vi.tallenna(polku, data["spektri"], data["lkm"], tapa=data["tapa"],
+                    piikit=data["piikit"], pakkaa=VIENNIN_PAKKAUS)
+    except (OSError, ValueError):
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], VIENTI_EI)
+    else:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], VIENTI_OK.format(polku))
+
+def tuo_spektri():
+    """
+    Napinkäsittelijä, joka tuo viedyn spektrin istuntoon aktiiviseksi aineistoksi.
+    Taustaton signaali ja piikkien tulokset otetaan käyttöön tiedostosta laskematta
+    niitä uudelleen, ja pakkaamattoman tiedoston taulukot luetaan muistikuvauksina.
+    Tuodulla aineistolla ei ole tiedostokohtaista matriisia.
+    """
+
+    polku = ik.avaa_tiedostoikkuna("Tuo spektri")
+
+    if not polku: # Käyttäjä perui valinnan.
+        return
+
+    try:
+        tiedot = vi.lue(polku, muistikuvaus=True)
+    except (OSError, ValueError):
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], TUONTI_EI)
+        return
+
+    valitse_aineisto(polku)
+    aseta_data(tiedot["energiat"], tiedot["intensiteetit"], tiedot["lkm"])
+    spektri = data["spektri"]
+    spektri.palauta_tausta() # Saman tiedoston aiemman tuonnin tausta korvataan.
+
+    if tiedot["taustaton"] is not None:
+        spektri.poista_tausta(spektri.intensiteetit - tiedot["taustaton"], tiedot["taustaton"])
+
+    data["tapa"] = tiedot["tapa"] if tiedot["tapa"] in yd.TAVAT else "summa"
+    data["piikit"] = tiedot["piikit"]
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], TUOTIIN.format(
+        polku, data["lkm"], len(data["piikit"])))
+    nayta_aktiivinen()
+
+def tyhjenna_valimuisti():
+    """
+    Mitätöi välimuistin, jolloin seuraava lataus jäsentää kaikki mittaustiedostot
+    uudelleen tekstimuodosta, ja poistaa tiedostokohtaiset matriisit.
+    """
+
+    vm.tyhjenna(VALIMUISTIN_KANSIO)
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], VALIMUISTI_TYHJENNETTY)
+
+    if poista_matriisi(): # Myös tiedostokohtaiset matriisit vievät levytilaa.
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], MATRIISIT_TYHJENNETTY)
+    else:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], MATRIISIT_KAYTOSSA)
+
+def seuraa_kansiota(kansio, lopetus, jono):
+    """
+    Seurantasäikeen pääfunktio. Tarkistaa kansion säännöllisesti ja lukee siihen
+    ilmestyneet uudet ja muuttuneet mittaustiedostot lisäävästi. Luetut tiedot
+    välitetään jonon kautta pääsäikeelle, joka päivittää kuvaajan. Jos lukeminen
+    epäonnistuu, jonoon välitetään poikkeus ja seuranta päättyy.
+    Käyttöliittymää ei saa käsitellä tästä säikeestä.
+    """
+
+    lkm = None # Edellisellä tarkistuksella kelvollisten tiedostojen lukumäärä.
+
+    while not lopetus.is_set():
+        try:
+            tulos = sl.lue_kansio(kansio, LATAUSPROSESSEJA, VALIMUISTIN_KANSIO, lisaava=True,
+                                  matriisi=matriisin_polku(kansio),
+                                  matriisin_tyyppi=MATRIISIN_TYYPPI,
+                                  valimuistin_koko=VALIMUISTIN_KOKO)
+        except Exception as virhe: # pylint: disable=broad-except
+            sl.unohda_kansio(kansio)
+            # Kansion tila voi olla kesken, joten seuraava lataus lukee kansion alusta.
+            jono.put(virhe)
+            return
+
+        if tulos[3] or tulos[2] != lkm:
+            # Välitetään tiedot vain, jos jotakin luettiin tai tiedostoja poistettiin.
+            rajoita_matriisit(kansio)
+            jono.put(tulos)
+            lkm = tulos[2]
+
+        lopetus.wait(SEURANNAN_VALI) # Odotetaan seuraavaan tarkistukseen tai lopetukseen.
+
+def aseta_harvennus(minimi, maksimi):
+    """
+    Asettaa kuvaajalle täyden datan energiavälin minimi...maksimi harvennettuna
+    piirtoalueen leveyden mukaan: lokeroita on yhtä monta kuin pikselisarakkeita.
+    """
+
+    energiat, intensiteetit = elementit["naytetty"]
+    elementit["indeksit"] = hv.harvenna(energiat, intensiteetit, minimi, maksimi,
+                                        elementit["piirto"].bbox.width)
+    elementit["graafi"].set_data(energiat[elementit["indeksit"]],
+                                 intensiteetit[elementit["indeksit"]])
+
+    for kansio, graafi in elementit["vertailut"].items():
+        spektri = istunto["aineistot"][kansio]["spektri"]
+        intensiteetit = naytettavat(spektri)
+        indeksit = hv.harvenna(spektri.energiat, intensiteetit, minimi, maksimi,
+                               elementit["piirto"].bbox.width)
+        graafi.set_data(spektri.energiat[indeksit],
+                        intensiteetit[indeksit] + elementit["siirtymat"][kansio])
+        # Muut aineistot harvennetaan samalla tavalla; siirtymä lisätään vain harvennettuihin.
+
+def harvenna_graafi(_=None):
+    """
+    Harventaa kuvaajan uudelleen näkyvän energiavälin mukaan. Kutsutaan, kun akselien
+    rajat tai piirtoalueen koko muuttuvat; matplotlib piirtää kuvaajan itse.
+    """
+
+    if elementit["graafi"]:
+        minimi, maksimi = sorted(elementit["piirto"].get_xlim()) # x-akseli voi olla käännetty.
+        aseta_harvennus(minimi, maksimi)
+
+def paivita_graafi(energiat, intensiteetit, skaalaa=False):
+    """
+    Päivittää piirretyn kuvaajan pisteet paikallaan luomatta akseleita uudelleen.
+    Täysi data otetaan käyttöön kopioimatta, ja kuvaajalle asetetaan siitä vain
+    harvennetut pisteet. Akselit skaalataan uudelleen vain, jos datan rajat muuttuivat
+    tai skaalaa on tosi (uusi kuvaaja). Piirto tehdään kerran, kun Tk ehtii (draw_idle).
+    """
+
+    elementit["naytetty"] = (np.asarray(energiat), np.asarray(intensiteetit))
+    piilota_esikatselut() # Esikatselu laskettiin vanhasta datasta.
+    paivita_vertailut()
+    aseta_harvennus(-np.inf, np.inf)
+    # Rajat lasketaan koko datasta; harvennus säilyttää jokaisen lokeron ääriarvot,
+    # joten ne ovat samat kuin täydellä datalla.
+    vanhat_rajat = elementit["piirto"].dataLim.frozen()
+    elementit["piirto"].relim(visible_only=True) # Piilotetut esikatselut eivät vaikuta rajoihin.
+
+    if skaalaa:
+        elementit["piirto"].set_autoscale_on(True)
+        # Uusi kuvaaja näytetään kokonaan, vaikka edellistä olisi zoomattu.
+
+    if skaalaa or elementit["piirto"].dataLim.bounds != vanhat_rajat.bounds:
+        elementit["piirto"].autoscale_view()
+
+    harvenna_graafi() # Zoomattu näkymä säilyy, joten harvennetaan näkyvä väli.
+    elementit["alue"].draw_idle()
+
+def naytettavat(spektri):
+    """
+    Palauttaa spektristä kuvaajalla näytettävät intensiteetit: taustattoman signaalin,
+    jos tausta on poistettu, muuten intensiteetit.
+    """
+
+    return spektri.intensiteetit if spektri.taustaton is None else spektri.taustaton
+
+def paivita_vertailut():
+    """
+    Luo kuvaajalle graafit istunnon muille aineistoille, joissa on dataa, ja poistaa
+    suljettujen ja aktiiviseksi vaihdettujen aineistojen graafit. Laskee aineistojen
+    pystysiirtymät näkymän mukaan; aktiivinen aineisto jää aina paikalleen, joten
+    pisteiden valinta ja esikatselut toimivat kuten yhdellä aineistolla. Graafeille
+    asetetaan data vasta harvennettaessa (ks. aseta_harvennus).
+    """
+
+    muut = [kansio for kansio, aineisto in istunto["aineistot"].items()
+            if kansio != istunto["aktiivinen"] and len(aineisto["spektri"].energiat)
+            and len(aineisto["spektri"].energiat) == len(aineisto["spektri"].intensiteetit)]
+
+    for kansio in list(elementit["vertailut"]):
+        if kansio not in muut:
+            elementit["vertailut"].pop(kansio).remove()
+
+    for kansio in muut:
+        if kansio not in elementit["vertailut"]:
+            elementit["vertailut"][kansio], = elementit["piirto"].plot(
+                [], [], linewidth=0.8, label=os.path.basename(kansio))
+
+    rajat = [(0.0, 0.0)] * (len(muut) + 1)
+
+    if istunto["nakyma"] == "pinottu": # Päällekkäin piirrettäessä rajoja ei tarvita.
+        kayrat = [elementit["naytetty"][1]] + [
+            naytettavat(istunto["aineistot"][kansio]["spektri"]) for kansio in muut]
+        rajat = [(np.min(kayra), np.max(kayra)) for kayra in kayrat]
+
+    siirtymat = it.siirtymat(rajat, istunto["nakyma"])
+    elementit["siirtymat"] = dict(zip(muut, siirtymat[1:]))
+
+    if muut: # Selite tarvitaan vain, kun aineistoja on useita.
+        elementit["graafi"].set_label(os.path.basename(istunto["aktiivinen"] or ""))
+        elementit["piirto"].legend()
+    elif elementit["piirto"].get_legend():
+        elementit["piirto"].get_legend().remove()
+
+def nayta_aktiivinen():
+    """
+    Ottaa aktiivisen aineiston käyttöön käyttöliittymässä: nollaa edellisen aineiston
+    pistevalinnat ja sovituksen, asettaa painikkeet aineiston tilan mukaan ja päivittää
+    piirretyn kuvaajan paikallaan.
+    """
+
+    nollaa_pisteet()
+    poista_sovitus()
+    data["tila"] = Odottaa.LEPO
+    napit["PIIRRA"].config(state="disabled" if onko_kuvaaja_piirretty(False) else "normal")
+    napit["POISTA"].config(state="disabled" if onko_tausta_poistettu(False) else "normal")
+    napit["YHDISTA"].config(text=NAPPI_YHDISTA.format(TAPOJEN_NIMET[data["tapa"]]))
+
+    if not onko_kuvaaja_piirretty(False):
+        return
+
+    if len(data["spektri"].energiat): # Aktiivisen aineiston graafi korvaa edellisen.
+        paivita_graafi(data["spektri"].energiat, naytettavat(data["spektri"]), skaalaa=True)
+    else: # Istunto tyhjeni, joten kuvaaja poistetaan.
+        elementit["graafi"].remove()
+        elementit["graafi"] = None
+        elementit["naytetty"] = (np.empty(0), np.empty(0))
+        poista_vertailut()
+        napit["PIIRRA"].config(state="normal")
+        elementit["alue"].draw_idle()
+
+def poista_vertailut():
+    """
+    Poistaa kuvaajalta muiden aineistojen graafit ja selitteen.
+    """
+
+    for graafi in elementit["vertailut"].values():
+        graafi.remove()
+
+    elementit["vertailut"] = {}
+
+    if elementit["piirto"].get_legend():
+        elementit["piirto"].get_legend().remove()
+
+def vaihda_aineisto():
+    """
+    Napinkäsittelijä, joka vaihtaa aktiiviseksi istunnon seuraavan aineiston.
+    Aineiston tiedot, tausta ja yhdistämistapa ovat muistissa, joten mitään ei lueta
+    levyltä eikä mitään lasketa uudelleen.
+    """
+
+    kansio = it.seuraava(istunto)
+
+    if kansio is None:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], EI_MUITA_AINEISTOJA)
+        return
+
+    valitse_aineisto(kansio)
+    nayta_aktiivinen()
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                 AKTIIVINEN_AINEISTO.format(kansio, data["lkm"]))
+
+def vaihda_nakyma():
+    """
+    Napinkäsittelijä, joka vaihtaa muiden aineistojen näyttötavan (päällekkäin tai
+    pinottuina aktiivisen yläpuolelle).
+    """
+
+    istunto["nakyma"] = it.NAKYMAT[(it.NAKYMAT.index(istunto["nakyma"]) + 1) % len(it.NAKYMAT)]
+    napit["NAKYMA"].config(text=NAPPI_NAKYMA.format(NAKYMIEN_NIMET[istunto["nakyma"]]))
+
+    if onko_kuvaaja_piirretty(False):
+        paivita_graafi(*elementit["naytetty"], skaalaa=True)
+
+def poista_aineisto(kansio, viesti):
+    """
+    Poistaa kansion aineiston istunnosta ja kirjoittaa viestin (muotoiltuna kansiolla)
+    tekstilaatikkoon. Jos aineisto oli aktiivinen, aktiiviseksi vaihdetaan seuraava
+    aineisto; muuten kuvaajalta poistetaan vain aineiston graafi. Aineiston matriisi
+    poistetaan levyltä, ellei kansiota seurata.
+    """
+
+    aineisto = it.hae(istunto, kansio, data)
+
+    if aineisto is None:
+        return
+
+    if aineisto["matriisi"] and not (seuranta["saie"] and seuranta["kansio"] == kansio):
+        poista_matriisi(kansio)
+        # Jos kansiota luetaan juuri nyt, matriisi jää levylle ja karsitaan aikanaan.
+
+    seuraava = it.seuraava(istunto) if kansio == istunto["aktiivinen"] else kansio
+    it.poista(istunto, kansio)
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], viesti.format(kansio))
+
+    if seuraava == kansio: # Aktiivinen aineisto ei vaihdu.
+        if onko_kuvaaja_piirretty(False):
+            paivita_graafi(*elementit["naytetty"]) # Poistaa aineiston graafin.
+
+        return
+
+    if seuraava is None: # Istunto tyhjeni; datasanakirjaan jää tyhjä spektri.
+        data.update(spektri=sl.Spektri(tyyppi=SPEKTRIN_TYYPPI), lkm=0, matriisi=None,
+                    piikit=vi.tyhjat_piikit())
+    else:
+        valitse_aineisto(seuraava)
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                     AKTIIVINEN_AINEISTO.format(seuraava, data["lkm"]))
+
+    nayta_aktiivinen()
+
+def sulje_aineisto():
+    """
+    Napinkäsittelijä, joka poistaa aktiivisen aineiston istunnosta ja vaihtaa
+    aktiiviseksi seuraavan aineiston (ks. poista_aineisto).
+    """
+
+    if istunto["aktiivinen"] is None:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], DATAA_EI_LADATTU)
+        return
+
+    poista_aineisto(istunto["aktiivinen"], AINEISTO_SULJETTU)
+
+def paivita_seurattu(energiat, summaintensiteetit, lkm, luettu):
+    """
+    Päivittää seuratun kansion aineiston seurantasäikeen lukemilla tiedoilla, vaikka
+    aktiivinen aineisto olisi jokin muu. Suljettu aineisto palaa istuntoon aktiiviseksi.
+    Jos kansiosta ei enää saada dataa, sen aineisto poistetaan istunnosta; seuranta
+    jatkuu, joten aineisto palaa, kun kansioon tulee taas kelvollisia tiedostoja.
+    """
+
+    if energiat is None or not lkm:
+        # Vanhaa energia-akselia ei yhdistetä uusiin intensiteetteihin (ks. aseta_data).
+        if seuranta["kansio"] in istunto["aineistot"]:
+            poista_aineisto(seuranta["kansio"], AINEISTO_TYHJENI)
+
+        return
+
+    palaava = seuranta["kansio"] not in istunto["aineistot"]
+
+    if palaava: # Aineisto on suljettu tai poistettu tyhjänä.
+        valitse_aineisto(seuranta["kansio"])
+
+    aineisto = it.hae(istunto, seuranta["kansio"], data)
+    aseta_data(energiat, summaintensiteetit, lkm, seuranta["matriisi"], aineisto)
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                 SEURANTA_PAIVITETTY.format(luettu, lkm))
+
+    if aineisto["tapa"] != "summa":
+        yhdista_data(aineisto)
+
+    palauta_tausta(aineisto)
+
+    if palaava: # Aineisto näytetään vasta, kun sen data on asetettu.
+        nayta_aktiivinen()
+    elif onko_kuvaaja_piirretty(False):
+        paivita_graafi(data["spektri"].energiat, naytettavat(data["spektri"]))
+
+def kasittele_seuranta():
+    """
+    Käsittelee pääsäikeessä seurantasäikeen lukemat tiedot: päivittää datasanakirjan
+    ja piirretyn kuvaajan. Ajastaa itsensä uudelleen niin kauan kuin seuranta on käynnissä.
+    """
+
+    tulos = None
+    virhe = None
+
+    while True: # Otetaan jonosta vain uusin tulos; vanhemmat ovat jo vanhentuneita.
+        try:
+            viesti = seuranta["jono"].get_nowait()
+        except queue.Empty:
+            break
+
+        if isinstance(viesti, Exception): # Seurantasäie päättyi virheeseen.
+            virhe = viesti
+        else:
+            tulos = viesti
+
+    if tulos is not None:
+        paivita_seurattu(*tulos)
+
+    if virhe is not None: # Säie on jo päättynyt, joten seuranta merkitään lopetetuksi.
+        seuranta["saie"] = None
+        napit["SEURAA"].config(text=NAPPI_SEURAA)
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                     SEURANTA_EPAONNISTUI.format(virhe))
+
+    if seuranta["saie"]:
+        ik.ajasta(SEURANNAN_PAIVITYSVALI, kasittele_seuranta)
+    else:
+        seuranta["ajastettu"] = False
+
+def palauta_tausta(aineisto=None):
+    """
+    Palauttaa aktiivisen (tai annetun) aineiston poistetun taustan, kun mittausdata on
+    muuttunut, sillä vanha tausta ei enää vastaa dataa.
+    """
+
+    if aineisto is None or aineisto is data:
+        if onko_tausta_poistettu(False):
+            data["spektri"].palauta_tausta()
+            data["piikit"] = vi.tyhjat_piikit()
+            poista_sovitus()
+            napit["POISTA"].config(state="normal")
+            ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], SEURANTA_TAUSTA_NOLLATTU)
+    else: # Muun kuin aktiivisen aineiston tausta palautetaan koskematta painikkeisiin.
+        aineisto["spektri"].palauta_tausta()
+        aineisto["piikit"] = vi.tyhjat_piikit()
+
+def kirjoita_hylkaykset(hylatyt, tiedostot):
+    """
+    Kirjoittaa tekstilaatikkoon, kuinka monta pistettä kustakin tiedostosta hylättiin.
+    Tiedostot luetellaan hylättyjen pisteiden määrän mukaan laskevassa järjestyksessä;
+    nimiä kirjoitetaan enintään HYLKAYKSIA_NAYTETAAN.
+    """
+
+    jarjestys = np.argsort(hylatyt, kind="stable")[::-1]
+    jarjestys = jarjestys[hylatyt[jarjestys] > 0] # Vain tiedostot, joista hylättiin jotakin.
+
+    if len(jarjestys) == 0: # Otsikon perään ei tulisi yhtään tiedostoa.
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], EI_HYLATTYJA)
+        return
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                 HYLATTIIN_PISTEITA.format(int(hylatyt.sum()), len(jarjestys)))
+
+    for indeksi in jarjestys[:HYLKAYKSIA_NAYTETAAN]:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], TIEDOSTON_HYLKAYKSET.format(
+            tiedostot[indeksi], int(hylatyt[indeksi])))
+
+    if len(jarjestys) > HYLKAYKSIA_NAYTETAAN:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                     MUITA_HYLKAYKSIA.format(len(jarjestys) - HYLKAYKSIA_NAYTETAAN))
+
+def yhdista_data(aineisto=None):
+    """
+    Yhdistää aktiivisen (tai annetun) aineiston mittaustiedostot sen tavalla
+    tiedostokohtaisesta intensiteettimatriisista ja korvaa aineiston intensiteetit
+    tuloksella. Sigmaleikkauksessa hylättyjen pisteiden määrät kirjoitetaan
+    tekstilaatikkoon. Palauttaa False, jos matriisia ei ole, jolloin data jää ennalleen.
+    """
+
+    if aineisto is None:
+        aineisto = data
+
+    luettu = mt.lue(aineisto["matriisi"]) if aineisto["matriisi"] else None
+
+    if luettu is None:
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], MATRIISIA_EI_OLE)
+        return False
+
+    _, intensiteetit, tiedostot = luettu
+    yhdistetyt, hylatyt = yd.yhdista(intensiteetit, aineisto["tapa"])
+    aineisto["spektri"].aseta_intensiteetit(yhdistetyt)
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"],
+                                 YHDISTETTIIN.format(TAPOJEN_NIMET[aineisto["tapa"]]))
+
+    if aineisto["tapa"] == "sigmaleikkaus":
+        kirjoita_hylkaykset(hylatyt, tiedostot)
+
+    return True
+
+def vaihda_yhdistamistapa():
+    """
+    Napinkäsittelijä, joka vaihtaa tiedostojen yhdistämistavan seuraavaan
+    (summa, keskiarvo, mediaani, sigmaleikattu keskiarvo) ja yhdistää ladatun datan
+    uudelleen tiedostokohtaisesta matriisista lukematta mittaustiedostoja.
+    """
+
+    data["tapa"] = yd.TAVAT[(yd.TAVAT.index(data["tapa"]) + 1) % len(yd.TAVAT)]
+    napit["YHDISTA"].config(text=NAPPI_YHDISTA.format(TAPOJEN_NIMET[data["tapa"]]))
+
+    if data["lkm"] and yhdista_data():
+        # Jos dataa ei ole vielä ladattu, tapa otetaan käyttöön latauksessa.
+        palauta_tausta()
+
+        if onko_kuvaaja_piirretty(False):
+            paivita_graafi(data["spektri"].energiat, data["spektri"].intensiteetit)
+
+def vaihda_seuranta():
+    """
+    Napinkäsittelijä, joka aloittaa käyttäjän valitseman kansion seuraamisen tai
+    lopettaa käynnissä olevan seurannan. Seuranta tapahtuu taustasäikeessä, joten
+    käyttöliittymä pysyy käytettävänä suurtenkin tiedostomäärien aikana.
+    """
+
+    if seuranta["saie"]: # Seuranta on käynnissä, joten se lopetetaan.
+        seuranta["lopetus"].set()
+        seuranta["saie"] = None
+        napit["SEURAA"].config(text=NAPPI_SEURAA)
+        ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], SEURANTA_LOPETETTU)
+        return
+
+    kansio = ik.avaa_hakemistoikkuna("Valitse seurattava kansio")
+
+    if not kansio: # Käyttäjä perui valinnan.
+        return
+
+    seuranta["kansio"] = kansio
+    seuranta["matriisi"] = matriisin_polku(kansio)
+    seuranta["lopetus"] = threading.Event()
+    seuranta["jono"] = queue.Queue()
+    # Uusi jono, jotta aiemman seurannan myöhästyneet tulokset eivät sekoitu uusiin.
+    seuranta["saie"] = threading.Thread(target=seuraa_kansiota,
+                                        args=(kansio, seuranta["lopetus"], seuranta["jono"]),
+                                        daemon=True)
+    # Daemon-säie ei estä ohjelman sulkemista.
+    seuranta["saie"].start()
+
+    napit["SEURAA"].config(text=NAPPI_LOPETA_SEURANTA)
+    napit["PIIRRA"].config(state="normal")
+    napit["POISTA"].config(state="normal")
+    ik.kirjoita_tekstilaatikkoon(elementit["tekstilaatikko"], SEURANTA_ALOITETTU.format(kansio))
+
+    if not seuranta["ajastettu"]: # Aiemman seurannan tarkistus voi olla vielä ajastettuna.
+        seuranta["ajastettu"] = True
+        ik.ajasta(SEURANNAN_PAIVITYSVALI, kasittele_seuranta)
+
+def aseta_lokaali():
+    """
+    Asettaa suomenkielisen localen, jotta saadaan käytettyä oikeaoppisesti desimaalipilkkua.
+    Jos yksikään LOKAALIT-listan nimistä ei ole käytettävissä, jatketaan oletuslocalella.
+    """
+
+    for nimi in LOKAALIT:
+        try:
+            locale.setlocale(locale.LC_ALL, nimi)
+        except locale.Error:
+            continue
+        return
+
 def main():
     """
     Luo käyttöliittymäikkunan, joka sisältää käyttöliittymän napit eri toimintoihin,
     kuvaajan ja tekstilaatikon. Oletuksena sovellus avataan koko näytölle.
     Käyttöliittymäelementtien koot voidaan määrätä vakioiden avulla.
+    Graafinen käyttöliittymä ladataan vasta tässä.
     """
 
+    global ik # pylint: disable=global-statement
+    import ikkunasto as ik # pylint: disable=import-outside-toplevel,redefined-outer-name
+    aseta_lokaali()
+
     ikkuna = ik.luo_ikkuna(OTSIKKO)
     ikkuna.state("zoomed") # Avataan oletuksena koko näytölle.
     nappikehys = ik.luo_kehys(ikkuna, ik.VASEN)
 
     napit["LATAA"] = ik.luo_nappi(nappikehys, NAPPI_LATAA, avaa_kansio)
+    napit["PERUUTA"] = ik.luo_nappi(nappikehys, NAPPI_PERUUTA, peruuta_lataus)
+    napit["PERUUTA"].config(state="disabled") # Käytössä vain latauksen aikana.
     napit["PIIRRA"] = ik.luo_nappi(nappikehys, NAPPI_PIIRRA, piirra_data)
     napit["POISTA"] = ik.luo_nappi(nappikehys, NAPPI_POISTA, poista_tausta)
     napit["LASKE"] = ik.luo_nappi(nappikehys, NAPPI_LASKE, laske_intensiteetit)
+    napit["ETSI"] = ik.luo_nappi(nappikehys, NAPPI_ETSI, etsi_piikit)
+    napit["SOVITA"] = ik.luo_nappi(nappikehys, NAPPI_SOVITA, sovita_piikit)
+    napit["YHDISTA"] = ik.luo_nappi(nappikehys, NAPPI_YHDISTA.format(TAPOJEN_NIMET[data["tapa"]]),
+                                    vaihda_yhdistamistapa)
     napit["TALLENNA"] = ik.luo_nappi(nappikehys, NAPPI_TALLENNA, tallenna_kuvaaja)
+    napit["VIE"] = ik.luo_nappi(nappikehys, NAPPI_VIE, vie_spektri)
+    napit["TUO"] = ik.luo_nappi(nappikehys, NAPPI_TUO, tuo_spektri)
+    napit["TYHJENNA"] = ik.luo_nappi(nappikehys, NAPPI_TYHJENNA, tyhjenna_valimuisti)
+    napit["SEURAA"] = ik.luo_nappi(nappikehys, NAPPI_SEURAA, vaihda_seuranta)
+    napit["VAIHDA"] = ik.luo_nappi(nappikehys, NAPPI_VAIHDA, vaihda_aineisto)
+    napit["NAKYMA"] = ik.luo_nappi(nappikehys,
+                                   NAPPI_NAKYMA.format(NAKYMIEN_NIMET[istunto["nakyma"]]),
+                                   vaihda_nakyma)
+    napit["SULJE"] = ik.luo_nappi(nappikehys, NAPPI_SULJE, sulje_aineisto)
     # Määritellään napit ja asetetaan niille käsittelijät.
 
     laatikkokehys = ik.luo_kehys(ikkuna, ik.VASEN) # Luodaan kehys tekstilaatikolle.
@@ -528,6 +1609,13 @@ def main():
                                                              KUVAAJAN_KOKO[0], KUVAAJAN_KOKO[1])
     elementit["piirto"] = elementit["kuvaaja"].add_subplot(1, 1, 1)
     # Luodaan kuvaaja ja sille subplot.
+    elementit["piirto"].callbacks.connect("xlim_changed", harvenna_graafi)
+    elementit["alue"].mpl_connect("resize_event", harvenna_graafi)
+    # Kuvaaja harvennetaan uudelleen zoomattaessa, panoroitaessa ja piirtoalueen koon
+    # muuttuessa (ks. harvennus.py).
+    elementit["alue"].mpl_connect("draw_event", tallenna_pohjakuva)
+    elementit["alue"].mpl_connect("motion_notify_event", esikatsele_valinta)
+    # Päällys piirretään blittaamalla tallennetun pohjakuvan päälle.
 
     elementit["piirto"].set_xlabel(X_AKSELI)
     elementit["piirto"].set_ylabel(Y_AKSELI) # Asetetaan akseleille nimet.
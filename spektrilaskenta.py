@@ -0,0 +1,774 @@
+"""
+Spektrilaskenta
+
+Spektrianalyysin laskennallinen ydin ilman graafista käyttöliittymää:
+mittaustiedostojen lukeminen ja summaaminen, lineaarisen taustan poisto sekä
+piikkien intensiteettien laskeminen numeerisella integroinnilla.
+Moduuli ei tuo tkinteriä eikä matplotlibiä, joten sitä voidaan käyttää myös
+komentoriviltä (ks. eraajo.py) ja palvelimilla, joilla ei ole näyttöä.
+"""
+
+import os # Hyödynnetään kansioiden ja tiedostojen "haravoinnissa".
+import io
+from re import search # RegExiä hyödynnetään tutkittaessa, onko tiedostonimet haluttua muotoa.
+from functools import partial
+import threading
+import numpy as np
+import valimuisti as vm
+import matriisi as mt
+
+TIEDOSTO_REGEX = r"^measurement_\d+.txt$"
+# Määrittää, minkä nimisistä tiedostoista etsitään mittausdataa (RegEx).
+VALIMUISTIN_KOKO = 8 * 1024 ** 3
+# Välimuistin oletusenimmäiskoko tavuina; pisimpään käyttämättä olleet tiedostot poistetaan
+# ensin. Raja riittää noin 1600 tiedostolle, joissa on 300 000 riviä.
+ENERGIATOLERANSSI = 0.01
+# Tiedoston energioiden katsotaan olevan samat kuin vertailuenergiat, jos ne poikkeavat
+# niistä kussakin pisteessä enintään tämän verran suhteessa vertailuhilan pienimpään
+# askeleeseen (esim. viimeisen desimaalin pyöristyserot).
+
+kansiot = {}
+# Luettujen kansioiden tila lisäävää latausta varten: kansion polku -> sanakirja, jossa ovat
+# vertailuenergiat, summaintensiteetit, kelvollisten tiedostojen lukumäärä sekä luetut
+# tiedostot (polku -> (välimuistiavain, hyväksyttiinkö)).
+latauslukko = threading.Lock() # Estää kahta säiettä lukemasta kansioita yhtä aikaa.
+
+def laske_parametrit(x_1, y_1, x_2, y_2):
+    """
+    Laskee suoran (joka ei ole muotoa x = a) kulmakertoimen ja vakiotermin, kun
+    on annettu kaksi suoran pistettä (x_1, y_1) ja (x_2, y_2).
+    """
+
+    k = (y_2 - y_1) / (x_2 - x_1)
+    b = (x_2 * y_1 - x_1 * y_2) / (x_2 - x_1)
+
+    return k, b
+
+def laske_pisteet_suoralla(k, b, kohdat):
+    """
+    Tuottaa taulukon pisteitä, jotka ovat annetulla kulmakertoimella ja vakiotermillä
+    määritetyn suoran arvoja annetuissa x-akselin pisteissä.
+    """
+
+    return k * np.asarray(kohdat, dtype=np.float64) + b
+    # Suora lasketaan koko taulukolle kerralla.
+
+def etsi_indeksit(mittausdata, minimi, maksimi):
+    """
+    Etsii annetusta järjestetystä numeerista dataa sisältävästä taulukosta alku- ja
+    päätepisteet siten, että alueen arvot ovat annettujen minimi- ja maksimiarvojen välissä.
+    Palauttaa näiden pisteiden indeksit; data[alku:loppu] on siis haluttu alue.
+
+    Nousevassa datassa alku on ensimmäinen minimiä suurempi tai yhtä suuri arvo ja loppu
+    ensimmäinen maksimia suurempi arvo. Laskevassa datassa (esim. sidosenergiat suurimmasta
+    pienimpään) alku on ensimmäinen maksimia pienempi tai yhtä suuri arvo ja loppu
+    ensimmäinen minimiä pienempi arvo. Jos alkua ei löydy, palautetaan (n, n), ja jos
+    loppua ei löydy, loppu on n (datan pituus).
+
+    Indeksit etsitään binäärihaulla, joten haku vie ajan O(log n).
+    """
+
+    data = np.asarray(mittausdata)
+    n = len(data)
+
+    if n > 1 and data[0] > data[-1]: # Laskeva data.
+        nouseva = data[::-1] # Käännetty näkymä; dataa ei kopioida.
+        alku = n - int(np.searchsorted(nouseva, maksimi, side="right"))
+        loppu = n - int(np.searchsorted(nouseva, minimi, side="left"))
+        # Nousevan näkymän viimeinen ehdon täyttävä indeksi j vastaa alkuperäistä indeksiä n-1-j.
+    else:
+        alku = int(np.searchsorted(data, minimi, side="left"))
+        loppu = int(np.searchsorted(data, maksimi, side="right"))
+
+    if alku == n:
+        # Alkua ei löydetty, joten alue on tyhjä datan lopussa.
+        return n, n
+
+    return alku, loppu
+
+def lahin_indeksi(energiat, energia):
+    """
+    Palauttaa annettua energiaa lähimmän mittauspisteen indeksin aidosti järjestetyssä
+    (nousevassa tai laskevassa) energiataulukossa. Jos kaksi pistettä ovat yhtä
+    lähellä, palautetaan ensimmäinen. Piste etsitään binäärihaulla, joten haku vie
+    ajan O(log n).
+    """
+
+    data = np.asarray(energiat)
+    n = len(data)
+
+    if n > 1 and data[0] > data[-1]: # Laskeva data.
+        oikea = n - int(np.searchsorted(data[::-1], energia, side="right"))
+        # Ensimmäinen indeksi, jonka energia on enintään annettu energia.
+    else:
+        oikea = int(np.searchsorted(data, energia, side="left"))
+        # Ensimmäinen indeksi, jonka energia on vähintään annettu energia.
+
+    if oikea <= 0:
+        return 0
+
+    if oikea >= n:
+        return n - 1
+
+    if abs(data[oikea - 1] - energia) <= abs(data[oikea] - energia):
+        return oikea - 1 # Annettu energia on lähempänä edellistä pistettä.
+
+    return oikea
+
+def lahin_piste(energiat, intensiteetit, energia):
+    """
+    Palauttaa annettua energiaa lähimmän mittauspisteen koordinaatit (x, y).
+    Vastaa pisteen valitsemista kuvaajalta.
+    """
+
+    indeksi = lahin_indeksi(energiat, energia)
+    return float(energiat[indeksi]), float(intensiteetit[indeksi])
+
+def poista_lineaarinen_tausta(energiat, intensiteetit, piste_a, piste_b):
+    """
+    Vähentää intensiteeteistä suoran, joka kulkee pisteiden piste_a ja piste_b
+    (monikot (x, y)) kautta. Palauttaa taustattomat intensiteetit taulukkona.
+    """
+
+    kulmakerroin, vakiotermi = laske_parametrit(piste_a[0], piste_a[1], piste_b[0], piste_b[1])
+    # Lasketaan pisteitä vastaavan suoran parametrit.
+    pisteet = laske_pisteet_suoralla(kulmakerroin, vakiotermi, energiat)
+
+    return np.asarray(intensiteetit) - pisteet
+    # Vähennetään intensiteeteistä suoran pisteet.
+
+def laske_intensiteetti(energiat, intensiteetit, minimi, maksimi):
+    """
+    Laskee piikin intensiteetin (pinta-ala) puolisuunnikassäännöllä energiavälillä
+    minimi...maksimi. Energiat voivat olla nousevassa tai laskevassa järjestyksessä.
+    Välin päätepisteet interpoloidaan samoin kuin laske_piikkien_intensiteetit
+    -funktiossa, joten tulos on sama kaikilla laskentareiteillä.
+    """
+
+    return float(laske_piikkien_intensiteetit(energiat, intensiteetit, [(minimi, maksimi)])[0])
+
+def kumulatiivinen_integraali(energiat, intensiteetit):
+    """
+    Laskee puolisuunnikassäännön kertymän: alkion k arvo on integraali
+    ensimmäisestä mittauspisteestä pisteeseen k. Kertymän avulla minkä tahansa
+    indeksivälin a:b integraali on K[b - 1] - K[a], joten yksittäinen väli ei enää
+    vaadi koko välin läpikäyntiä.
+    """
+
+    energiat = np.asarray(energiat, dtype=np.float64)
+    intensiteetit = np.asarray(intensiteetit, dtype=np.float64)
+    kertyma = np.zeros(len(energiat), dtype=np.float64)
+    np.cumsum(np.diff(energiat) * (intensiteetit[1:] + intensiteetit[:-1]) / 2, out=kertyma[1:])
+
+    return kertyma
+
+def laske_piikkien_intensiteetit(energiat, intensiteetit, ikkunat, kertyma=None):
+    """
+    Laskee usean piikin intensiteetit (pinta-alat) kerralla. Ikkunat on taulukko (tai
+    lista) (e_min, e_max) -pareja. Kunkin ikkunan intensiteetti on kahden kumulatiivisen
+    integraalin arvon erotus, ja ikkunan päätepisteet interpoloidaan lineaarisesti
+    mittauspisteiden välistä (ks. kertyma_kohdassa), joten käyttöliittymä, eräajo ja
+    automaattinen etsintä antavat samalle ikkunalle saman tuloksen (vrt. integroi_valilla).
+    Kaikki ikkunat käsitellään vektoroidusti yhdellä kumulatiivisella integraalilla, jonka
+    voi myös antaa valmiiksi laskettuna. Energiat voivat olla nousevassa tai laskevassa
+    järjestyksessä; intensiteetti on kummassakin integraali pienemmästä energiasta
+    suurempaan. Palauttaa intensiteetit taulukkona ikkunoiden järjestyksessä.
+    """
+
+    energiat = np.asarray(energiat, dtype=np.float64)
+    intensiteetit = np.asarray(intensiteetit, dtype=np.float64)
+    ikkunat = np.sort(np.asarray(ikkunat, dtype=np.float64).reshape(-1, 2), axis=1)
+
+    if kertyma is None:
+        kertyma = kumulatiivinen_integraali(energiat, intensiteetit)
+
+    return (kertyma_kohdassa(energiat, intensiteetit, kertyma, ikkunat[:, 1])
+            - kertyma_kohdassa(energiat, intensiteetit, kertyma, ikkunat[:, 0]))
+
+def kertyma_kohdassa(energiat, intensiteetit, kertyma, kohdat):
+    """
+    Palauttaa kumulatiivisen integraalin arvon annetuissa energioissa (luku tai taulukko).
+    Mittauspisteiden väliin osuvissa kohdissa intensiteetti interpoloidaan lineaarisesti,
+    ja datan ulkopuoliset kohdat rajataan datan reunoille. Energiat voivat olla nousevassa
+    tai laskevassa järjestyksessä; kummassakin tapauksessa tulos on integraali
+    ensimmäisestä mittauspisteestä annettuun kohtaan.
+    """
+
+    energiat = np.asarray(energiat)
+    intensiteetit = np.asarray(intensiteetit)
+    n = len(energiat)
+
+    if n < 2:
+        return np.zeros(np.shape(kohdat))
+
+    kohdat = np.clip(kohdat, min(energiat[0], energiat[-1]), max(energiat[0], energiat[-1]))
+
+    if energiat[0] > energiat[-1]: # Laskeva data, haetaan käännetystä näkymästä.
+        i = n - 1 - np.searchsorted(energiat[::-1], kohdat, side="right")
+    else:
+        i = np.searchsorted(energiat, kohdat, side="right") - 1
+
+    i = np.clip(i, 0, n - 2) # Välin i alkupiste; kohta on pisteiden i ja i + 1 välissä.
+    matka = kohdat - energiat[i]
+    kulmakerroin = (intensiteetit[i + 1] - intensiteetit[i]) / (energiat[i + 1] - energiat[i])
+    intensiteetti_kohdassa = intensiteetit[i] + kulmakerroin * matka
+    # Interpoloidaan intensiteetti kohtaan ja lisätään välin alusta kohtaan ulottuva
+    # puolisuunnikas pisteen i kertymään.
+
+    return kertyma[i] + matka * (intensiteetit[i] + intensiteetti_kohdassa) / 2
+
+def integroi_valilla(energiat, intensiteetit, kertyma, minimi, maksimi):
+    """
+    Laskee intensiteetin (pinta-ala) energiavälillä minimi...maksimi kahden
+    kumulatiivisen integraalin arvon erotuksena, joten yksittäinen kysely vie ajan
+    O(log n). Välin päätepisteet interpoloidaan lineaarisesti mittauspisteiden välistä.
+    Yhden ikkunan tapaus laske_piikkien_intensiteetit -funktiosta.
+    """
+
+    return float(laske_piikkien_intensiteetit(energiat, intensiteetit, [(minimi, maksimi)],
+                                              kertyma)[0])
+
+def _tarkista_pituus(energiat, intensiteetit):
+    """
+    Nostaa ValueErrorin, jos intensiteettejä on eri määrä kuin energioita. Vanhaa
+    energia-akselia ei saa yhdistää uusiin, eripituisiin intensiteetteihin.
+    """
+
+    if len(energiat) != len(intensiteetit):
+        raise ValueError(f"Energioita on {len(energiat)}, mutta intensiteettejä "
+                         f"{len(intensiteetit)}.")
+
+class Spektri:
+    """
+    Spektri yhtenäisinä numpy-taulukoina: energia-akseli, tiedostojen yhdistetyt
+    intensiteetit, poistettu tausta ja taustaton signaali sekä taustattoman signaalin
+    kumulatiivinen integraali. Energiat ovat aina float64-taulukko; intensiteetit
+    tallennetaan annetulla tietotyypillä (float64 tai float32, joka puolittaa muistin).
+    __slots__ estää jokaiselle oliolle luotavan attribuuttisanakirjan.
+
+    Taulukot muunnetaan tietotyyppiin vain, jos ne eivät jo ole yhtenäisiä ja oikean
+    tyyppisiä, joten lataus ja taustan poisto eivät kopioi dataa turhaan. Tausta ja
+    taustaton signaali ovat None, kun taustaa ei ole poistettu.
+    """
+
+    __slots__ = ("tyyppi", "energiat", "intensiteetit", "tausta", "taustaton", "kertyma")
+
+    def __init__(self, energiat=(), intensiteetit=(), tyyppi="float64"):
+        self.tyyppi = np.dtype(tyyppi)
+        self.energiat = np.empty(0)
+        self.intensiteetit = np.empty(0, dtype=self.tyyppi)
+        self.tausta = None
+        self.taustaton = None
+        self.kertyma = None
+        self.aseta(energiat, intensiteetit)
+        # Kaikki attribuutit alustetaan ensin, jotta olio on eheä, vaikka aseta epäonnistuisi.
+
+    def aseta(self, energiat, intensiteetit):
+        """
+        Asettaa energia-akselin ja yhdistetyt intensiteetit. Kumulatiivinen integraali
+        mitätöidään; poistettu tausta säilyy, kunnes se palautetaan. Nostaa ValueErrorin
+        (spektriä muuttamatta), jos taulukot ovat eripituisia.
+        """
+
+        energiat = np.ascontiguousarray(energiat, dtype=np.float64)
+        _tarkista_pituus(energiat, intensiteetit)
+        self.energiat = energiat
+        self.aseta_intensiteetit(intensiteetit)
+
+    def aseta_intensiteetit(self, intensiteetit):
+        """
+        Korvaa yhdistetyt intensiteetit samalla energia-akselilla (esim. toisella
+        yhdistämistavalla) ja mitätöi kumulatiivisen integraalin. Nostaa ValueErrorin,
+        jos intensiteettejä on eri määrä kuin energioita.
+        """
+
+        _tarkista_pituus(self.energiat, intensiteetit)
+        self.intensiteetit = np.ascontiguousarray(intensiteetit, dtype=self.tyyppi)
+        self.kertyma = None
+
+    def poista_tausta(self, tausta, taustaton=None):
+        """
+        Asettaa taustan (taulukko koko energia-akselille) ja vähentää sen intensiteeteistä.
+        Valmiiksi laskettu taustaton signaali (esim. tiedostosta luettu) voidaan antaa,
+        jolloin vähennystä ei tehdä.
+        """
+
+        self.tausta = np.ascontiguousarray(tausta, dtype=self.tyyppi)
+        self.taustaton = (self.intensiteetit - self.tausta if taustaton is None
+                          else np.ascontiguousarray(taustaton, dtype=self.tyyppi))
+        self.kertyma = None
+
+    def palauta_tausta(self):
+        """
+        Palauttaa poistetun taustan, esim. kun intensiteetit ovat muuttuneet.
+        """
+
+        self.tausta = None
+        self.taustaton = None
+        self.kertyma = None
+
+    def hae_kertyma(self):
+        """
+        Palauttaa taustattoman signaalin kumulatiivisen integraalin. Se lasketaan vain,
+        jos sitä ei ole vielä laskettu nykyisestä datasta ja taustasta.
+        """
+
+        if self.kertyma is None:
+            self.kertyma = kumulatiivinen_integraali(self.energiat, self.taustaton)
+
+        return self.kertyma
+
+def lue_tiedosto(polku):
+    """"
+    Lukee mittausdatatiedoston.
+    Palauttaa löydetyt energiat ja intensiteetit yhtenäisinä float64-taulukkoina, jos tiedoston
+    "muotoseikat" ovat kunnossa: sen tulee sisältää rivejä, joilla on kullakin kaksi liukulukua
+    välilyönnillä erotettuna.
+    (Muista vaatimuksista huolehditaan lue_data -funktiossa.)
+    Muuten palautetaan monikko, joka sisältää kaksi totuusarvoa.
+
+    Tiedosto luetaan kerralla ja jäsennetään numpyn loadtxt-funktiolla, jolloin rivejä
+    ei tarvitse käsitellä yksitellen Pythonissa. Rivinvaihdot voivat olla muotoa
+    "\n", "\r\n" tai "\r" kuten tekstitilassa luettaessa.
+
+    Nopeus: 300 000 rivin tiedosto jäsentyy noin kaksi kertaa rivi kerrallaan lukevaa
+    toteutusta nopeammin (esim. 0,26 s -> 0,13 s; 17 merkitsevän numeron arvoilla ero on
+    pienempi). Tavoitteena ollutta kymmenkertaista nopeutusta ei saavutettu: lähes koko
+    aika kuluu liukulukujen muuntamiseen loadtxt:n C-jäsentimessä, eikä numpy tarjoa
+    tätä nopeampaa muunnosta. Toistuvia latauksia nopeuttaa välimuisti (ks. valimuisti.py).
+    """
+
+    try:
+        with open(polku, "rb") as lahde:
+            sisalto = lahde.read()
+
+        if not sisalto.strip():
+            # Tyhjästä tiedostosta ei saada mittausdataa, joten se hylätään.
+            return False, False
+
+        if b"\r" in sisalto:
+            sisalto = sisalto.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+            # Muutetaan Windowsin ja vanhan Macin rivinvaihdot "\n":ksi, jotta rivit
+            # lasketaan oikein.
+
+        rivimaara = sisalto.count(b"\n") + (not sisalto.endswith(b"\n"))
+        # Lasketaan rivien määrä; viimeinen rivi ei välttämättä pääty rivinvaihtoon.
+        taulukko = np.loadtxt(io.BytesIO(sisalto), dtype=np.float64, comments=None, ndmin=2)
+        # loadtxt nostaa ValueErrorin, jos rivien tietojen määrä vaihtelee
+        # tai tietoja ei voida muuttaa liukuluvuiksi.
+    except (ValueError, IOError, IndexError):
+        # tietoja ei voitu muuttaa liukuluvuiksi; tiedostoa ei voitu lukea;
+        # rivillä oli eri määrä arvoja kuin muilla
+        return False, False
+        # Jos tapahtui virhe, tiedosto ei ole kelvollinen ja se hylätään saman tien.
+
+    if taulukko.shape != (rivimaara, 2):
+        # Tiedosto hylätään, jos rivillä ei ole oikeaa määrää tietoja
+        # (loadtxt ohittaa tyhjät rivit, joten ne huomataan rivimäärästä).
+        return False, False
+
+    energiat, intensiteetit = np.ascontiguousarray(taulukko.T)
+    # Transpoosin kopio on muistissa rivijärjestyksessä, joten sarakkeista saadaan
+    # yhtenäiset taulukot.
+    return energiat, intensiteetit
+
+def etsi_tiedostot(polku):
+    """
+    Käy läpi polun sisältämät tiedostot alikansioita myöten ja palauttaa listan
+    muotoa measurement_X.txt olevien tiedostojen poluista os.walkin järjestyksessä.
+    """
+
+    polut = []
+
+    for kansiopolku, _, tiedostot in os.walk(polku):
+        # os.walkista saadaan kansiopolku, alikansion nimi ja tiedostonimi.
+        for tiedosto in tiedostot:
+            if search(TIEDOSTO_REGEX, tiedosto):
+                # Tutkitaan RegExillä, onko tiedostonimi haluttua muotoa
+                # (määrätty tiedoston alussa).
+                polut.append(os.path.join(kansiopolku, tiedosto)) # Muodostetaan koko polku.
+
+    return polut
+
+def hilan_raja(viite_energiat, toleranssi=ENERGIATOLERANSSI):
+    """
+    Laskee suurimman sallitun energiapoikkeaman: toleranssi kertaa vertailuhilan
+    pienin askel. Yhden pisteen hilalla poikkeamaa ei sallita.
+    """
+
+    askeleet = np.abs(np.diff(viite_energiat))
+    return toleranssi * float(askeleet.min()) if askeleet.size else 0.0
+
+def sovita_hilaan(viite_energiat, energiat, intensiteetit, raja):
+    """
+    Palauttaa tiedoston intensiteetit vertailuenergioiden hilassa sekä tiedon, jouduttiinko
+    ne interpoloimaan. Jos energiat poikkeavat vertailuenergioista kussakin pisteessä
+    enintään rajan verran, intensiteetit palautetaan sellaisinaan. Muuten ne interpoloidaan
+    lineaarisesti vertailuhilaan, jos energiat ovat aidosti monotoniset ja kattavat koko
+    vertailuhilan. Muulloin palautetaan (None, False), jolloin tiedosto hylätään.
+    """
+
+    if len(energiat) == len(viite_energiat) and \
+            np.max(np.abs(energiat - viite_energiat)) <= raja:
+        # Koko hila verrataan kerralla taulukko-operaationa.
+        return intensiteetit, False
+
+    askeleet = np.diff(energiat)
+
+    if not askeleet.size or not (np.all(askeleet < 0) or np.all(askeleet > 0)):
+        return None, False # Energiat eivät ole järjestyksessä; tiedostoa ei voida tulkita.
+
+    if min(energiat[0], energiat[-1]) > np.min(viite_energiat) + raja or \
+            max(energiat[0], energiat[-1]) < np.max(viite_energiat) - raja:
+        return None, False # Hila ei kata vertailuhilaa; reunoja ei ekstrapoloida.
+
+    return interpoloi_hilaan(viite_energiat, energiat, intensiteetit), True
+
+def interpoloi_hilaan(viite_energiat, energiat, intensiteetit):
+    """
+    Interpoloi aidosti monotonisen hilan intensiteetit lineaarisesti vertailuenergioihin.
+    Samoilla taulukoilla tulos on aina sama, joten summaan lisätty tiedosto voidaan
+    vähentää siitä tarkasti (ks. vahenna_muuttuneet).
+    """
+
+    if len(energiat) > 1 and energiat[0] > energiat[-1]:
+        energiat = energiat[::-1] # Laskeva data käännetään interpolointia varten.
+        intensiteetit = intensiteetit[::-1]
+
+    return np.interp(viite_energiat, energiat, intensiteetit)
+
+# pylint: disable-next=too-many-arguments
+def summaa_tiedostot(tulokset, viite_energiat=None, summaintensiteetit=None, *,
+                     peruutus=None, edistyminen=None, rivi=None, toleranssi=ENERGIATOLERANSSI):
+    """
+    Laskee yhteen lue_tiedosto -funktion palauttamat (energiat, intensiteetit) -parit
+    siinä järjestyksessä, jossa ne annetaan.
+    Ensimmäisen kelvollisen tiedoston energiat toimivat vertailukohtana. Jos tiedoston
+    energiat poikkeavat niistä enemmän kuin toleranssi (ks. ENERGIATOLERANSSI),
+    intensiteetit interpoloidaan vertailuenergioihin; tiedosto hylätään vain, jos sitä
+    ei voida interpoloida (ks. sovita_hilaan).
+    Jos vertailuenergiat ja summaintensiteetit annetaan, aiempaa summaa jatketaan.
+    Summaus keskeytetään, jos peruutus (threading.Event) asetetaan; edistyminen-funktiota
+    kutsutaan jokaisen tiedoston jälkeen sen indeksillä, tiedolla, hyväksyttiinkö se,
+    ja tiedolla, interpoloitiinko se.
+    rivi-funktiota kutsutaan jokaisen hyväksytyn tiedoston indeksillä, vertailuenergioilla
+    ja intensiteeteillä ennen seuraavan tiedoston käsittelyä (esim. matriisiin tallentamista
+    varten).
+    Palauttaa energiat (None, jos yksikään tiedosto ei kelvannut), summaintensiteetit
+    ja listan, joka kertoo kunkin tiedoston kohdalla, hyväksyttiinkö se.
+    """
+
+    hyvaksytyt = []
+    raja = None if viite_energiat is None else hilan_raja(viite_energiat, toleranssi)
+
+    if viite_energiat is None:
+        # Ensimmäisen kelvollisen tiedoston kohdalla täytyy tallettaa energiat
+        # ja luoda oikean pituinen intensiteettipuskuri.
+        summaintensiteetit = np.zeros(1)
+        # Täytetään summaintensiteetit nollilla siltä varalta, että tiedostoja ei saatu ladattua.
+        # Taulukon pituus on tällöin merkityksetön.
+
+    for indeksi, (energiat, intensiteetit) in enumerate(tulokset):
+        if peruutus is not None and peruutus.is_set():
+            break # Käyttäjä perui latauksen; jäljellä olevia tiedostoja ei käsitellä.
+
+        hyvaksytty = energiat is not False # Itse tiedosto oli kelvollinen.
+        sovitettu = False
+
+        if hyvaksytty and viite_energiat is None: # Jos kyseessä on ensimmäinen tiedosto...
+            summaintensiteetit = np.zeros(len(intensiteetit), dtype=np.float64)
+            # varataan oikean pituinen summaintensiteettipuskuri ja täytetään se nollilla.
+            viite_energiat = np.array(energiat)
+            # Kopioidaan energiat, sillä välimuistista saatu taulukko on vain luettavissa.
+            raja = hilan_raja(viite_energiat, toleranssi)
+        elif hyvaksytty:
+            # Muuten verrataan, ovatko tiedostojen sisältämät energiatiedot samat, ja
+            # tarvittaessa interpoloidaan intensiteetit vertailuenergioihin tai hylätään
+            # tiedosto.
+            intensiteetit, sovitettu = sovita_hilaan(viite_energiat, energiat, intensiteetit,
+                                                     raja)
+            hyvaksytty = intensiteetit is not None
+
+        if hyvaksytty:
+            np.add(summaintensiteetit, intensiteetit, out=summaintensiteetit)
+            # Lisätään tiedoston intensiteetit suoraan puskuriin (element-wise addition),
+            # jolloin muistissa on kerrallaan vain summa ja yhden tiedoston data.
+
+            if rivi is not None:
+                rivi(indeksi, viite_energiat, intensiteetit)
+
+        hyvaksytyt.append(hyvaksytty)
+
+        if edistyminen is not None:
+            edistyminen(indeksi, hyvaksytty, sovitettu)
+
+    return viite_energiat, summaintensiteetit, hyvaksytyt
+
+def vahenna_muuttuneet(tila, avaimet, valimuisti):
+    """
+    Vähentää kansion tilan summasta ne aiemmin luetut tiedostot, jotka on poistettu tai
+    joita on muokattu (avain on muuttunut), ja poistaa ne luettujen tiedostojen joukosta.
+    Tiedostojen vanhat intensiteetit haetaan välimuistista; vertailuenergioihin
+    interpoloidut tiedostot interpoloidaan uudelleen samalla tavalla kuin summattaessa.
+    Palauttaa False, jos jonkin tiedoston vanhoja tietoja ei löytynyt, jolloin kansio
+    on luettava kokonaan uudelleen.
+    """
+
+    for polku, (avain, hyvaksytty, sovitettu) in list(tila["tiedostot"].items()):
+        if avaimet.get(polku, False) == avain:
+            continue # Tiedosto on ennallaan.
+
+        if hyvaksytty:
+            vanhat = vm.hae(valimuisti, avain) if valimuisti and avain else None
+
+            if vanhat is None or vanhat[0] is False:
+                return False
+
+            intensiteetit = vanhat[1]
+
+            if sovitettu: # Summaan lisättiin tiedoston interpoloidut intensiteetit.
+                intensiteetit = interpoloi_hilaan(tila["energiat"], vanhat[0], vanhat[1])
+
+            if len(intensiteetit) != len(tila["summaintensiteetit"]):
+                return False # Tiedosto ei vastaa summaa; kansio luetaan uudelleen.
+
+            np.subtract(tila["summaintensiteetit"], intensiteetit, out=tila["summaintensiteetit"])
+            tila["lkm"] -= 1 # Vähennetään tiedoston osuus summasta ja lukumäärästä.
+
+        del tila["tiedostot"][polku]
+
+    return True
+
+# pylint: disable-next=too-many-arguments
+def lue_kansio(polku, prosesseja=1, valimuisti=None, *, lisaava=False, peruutus=None,
+               edistyminen=None, matriisi=None, matriisin_tyyppi="float64",
+               toleranssi=ENERGIATOLERANSSI, valimuistin_koko=VALIMUISTIN_KOKO):
+    """
+    Käy läpi polun sisältämät tiedostot alikansioita myöten.
+    Lukee muotoa measurement_X.txt olevista tiedostoista mittausdatan ja
+    laskee niiden summaintensiteetit.
+    Tiedosto hylätään, jos sen "muotoseikat" eivät ole kunnossa tai sen energioita ei
+    voida sovittaa vertailuenergioihin. Energiat katsotaan samoiksi toleranssin
+    (ks. ENERGIATOLERANSSI) rajoissa; muussa hilassa mitattu tiedosto interpoloidaan
+    vertailuenergioihin (ks. summaa_tiedostot).
+
+    Jos prosesseja on suurempi kuin yksi, tiedostot jäsennetään rinnakkain
+    prosessipoolissa. Tulokset summataan silti samassa järjestyksessä kuin
+    yhdellä prosessilla, joten lopputulos on täsmälleen sama.
+
+    Jos valimuisti on annettu, se on kansio, josta muuttumattomien tiedostojen
+    jäsennetyt tiedot haetaan ja johon uusien tiedostojen tiedot tallennetaan.
+    Välimuisti karsitaan enintään valimuistin_koko tavun kokoiseksi; luetun kansion
+    tiedostot säilytetään kuitenkin aina (ks. valimuisti.karsi).
+
+    Jos lisaava on True ja kansio on luettu aiemmin, aiempaa summaa jatketaan:
+    vain uudet tiedostot luetaan, ja muuttuneet tai poistetut tiedostot vähennetään
+    summasta (muuttuneet luetaan uudelleen). Jos vähentäminen ei onnistu, koska
+    tiedoston vanhoja tietoja ei ole välimuistissa, kansio luetaan kokonaan uudelleen.
+    Funktiota voidaan kutsua myös taustasäikeestä, sillä se ei käsittele datasanakirjaa.
+    Lataus voidaan keskeyttää asettamalla peruutus (threading.Event). Edistymisestä
+    ilmoitetaan kutsumalla edistyminen-funktiota jokaisen tiedoston jälkeen sen polulla,
+    tiedolla, hyväksyttiinkö se, ja tiedolla, interpoloitiinko se vertailuenergioihin
+    (kutsu tehdään lukevasta säikeestä).
+
+    Jos matriisi on annettu, se on kansio, johon hyväksyttyjen tiedostojen intensiteetit
+    tallennetaan summan lisäksi riveittäin (ks. matriisi.py) annetulla tietotyypillä.
+    Lisäävässä latauksessa matriisia jatketaan ja siitä poistetaan muuttuneiden ja
+    poistettujen tiedostojen rivit; jos matriisista puuttuu kansion tilan tiedostoja,
+    kansio luetaan kokonaan uudelleen.
+
+    Palauttaa energiat (None, jos yksikään tiedosto ei kelvannut), kopion summaintensiteeteistä,
+    kelvollisten tiedostojen lukumäärän sekä nyt luettujen tiedostojen lukumäärän.
+    Keskeytetty lataus palauttaa None; jo käsitellyt tiedostot jäävät kuitenkin kansion
+    tilaan, joten seuraava lisäävä lataus jatkaa siitä.
+    """
+
+    asetukset = {
+        "prosesseja": prosesseja,
+        "valimuisti": valimuisti,
+        "lisaava": lisaava,
+        "peruutus": peruutus,
+        "edistyminen": edistyminen,
+        "matriisi": matriisi,
+        "matriisin_tyyppi": matriisin_tyyppi,
+        "toleranssi": toleranssi,
+        "valimuistin_koko": valimuistin_koko
+    }
+
+    with latauslukko:
+        # Vain yksi säie kerrallaan saa muokata kansioiden tilaa.
+        return _lue_kansio(os.path.realpath(polku) if polku else "", asetukset)
+        # Tyhjä polku (esim. peruttu kansiovalinta) ei sisällä tiedostoja.
+
+def _matriisin_rivit(tila, matriisi):
+    """
+    Palauttaa kansion tilan hyväksyttyjen tiedostojen joukon tai None, jos matriisista
+    puuttuu niitä (tai matriisia ei ole). Lukee vain matriisin tiedot.
+    """
+
+    pidettavat = {polku for polku, (_, hyvaksytty, _) in tila["tiedostot"].items()
+                  if hyvaksytty}
+    tiedot = mt.lue_tiedot(matriisi)
+
+    if tiedot is None or not pidettavat <= set(tiedot["tiedostot"]):
+        return None
+
+    return pidettavat
+
+def _jatka_matriisia(tila, matriisi):
+    """
+    Karsii matriisista kansion tilaan kuulumattomat rivit ja avaa sen jatkamista varten.
+    Palauttaa kirjoittimen tai None, jos matriisista puuttuu tilan tiedostoja, jolloin
+    matriisia ei voida jatkaa.
+    """
+
+    pidettavat = _matriisin_rivit(tila, matriisi)
+
+    if pidettavat is None:
+        return None
+
+    if not mt.karsi(matriisi, pidettavat):
+        return None
+
+    return mt.jatka(matriisi)
+
+def _summaa_polut(polut, lukija, prosesseja, jatko):
+    """
+    Lukee polut lukijalla (tarvittaessa prosessipoolissa) ja summaa ne
+    summaa_tiedostot -funktiolla, jolle jatko-sanakirja annetaan avainsana-argumentteina.
+    Palauttaa summaa_tiedostot -funktion tuloksen.
+    """
+
+    if prosesseja > 1 and len(polut) > 1:
+        from concurrent.futures import ProcessPoolExecutor # pylint: disable=import-outside-toplevel
+        # Tuodaan vasta tarvittaessa, sillä multiprocessingin tuominen hidastaa käynnistystä.
+
+        with ProcessPoolExecutor(max_workers=prosesseja) as pooli:
+            palakoko = max(1, len(polut) // (prosesseja * 4))
+            # Annetaan prosesseille tiedostoja useampi kerrallaan, jotta
+            # prosessien välinen viestintä ei hidasta pienten tiedostojen lukemista.
+            tulos = summaa_tiedostot(pooli.map(lukija, polut, chunksize=palakoko), **jatko)
+            # map palauttaa tulokset polkujen järjestyksessä.
+
+            if jatko["peruutus"] is not None and jatko["peruutus"].is_set():
+                pooli.shutdown(wait=False, cancel_futures=True)
+                # Perutaan vielä aloittamattomat tiedostot, jotta poolia ei jäädä odottamaan.
+    else:
+        tulos = summaa_tiedostot(map(lukija, polut), **jatko)
+
+    return tulos
+
+def _kansion_tila(kansio, avaimet, asetukset):
+    """
+    Hakee kansion aiemman tilan lisäävää latausta varten ja vähentää siitä muuttuneet ja
+    poistetut tiedostot. Jos tilaa ei ole tai sitä (tai matriisia) ei voida jatkaa,
+    palautetaan uusi tyhjä tila, ja vanha matriisi tyhjennetään. Palauttaa tilan ja
+    jatketun matriisin kirjoittimen (None, jos matriisia ei jatkettu).
+    """
+
+    matriisi = asetukset["matriisi"]
+    tila = kansiot.get(kansio) if asetukset["lisaava"] else None
+    luettuja = len(tila["tiedostot"]) if tila is not None else 0
+
+    if tila is not None and not vahenna_muuttuneet(tila, avaimet, asetukset["valimuisti"]):
+        tila = None
+
+    kirjoitin = None
+
+    if tila is not None and matriisi and tila["lkm"]:
+        if len(tila["tiedostot"]) < luettuja or not avaimet.keys() <= tila["tiedostot"].keys():
+            kirjoitin = _jatka_matriisia(tila, matriisi)
+            jatkettu = kirjoitin is not None
+        else: # Kansio on ennallaan; matriisiin ei kosketa, kunhan se on tallella.
+            jatkettu = _matriisin_rivit(tila, matriisi) is not None
+
+        if not jatkettu:
+            tila = None # Matriisia ei voitu jatkaa, joten se kootaan alusta.
+
+    if tila is None: # Kansio luetaan alusta alkaen.
+        tila = {"energiat": None, "summaintensiteetit": np.zeros(1), "tiedostot": {}, "lkm": 0}
+
+        if matriisi:
+            mt.tyhjenna(matriisi) # Vanha matriisi ei enää vastaa kansiota.
+
+    return tila, kirjoitin
+
+def _lue_kansio(kansio, asetukset):
+    """
+    Toteuttaa lue_kansio -funktion; kutsutaan latauslukon ollessa varattuna.
+    asetukset on sanakirja lue_kansio -funktion valinnaisista parametreista.
+    """
+
+    avaimet = {tiedosto: vm.muodosta_avain(tiedosto) for tiedosto in etsi_tiedostot(kansio)}
+    # Tiedoston avain muuttuu, kun sen koko tai muokkausaika muuttuu.
+    tila, kirjoitin = _kansion_tila(kansio, avaimet, asetukset)
+
+    polut = [tiedosto for tiedosto in avaimet if tiedosto not in tila["tiedostot"]]
+    # Luetaan vain tiedostot, joita ei ole vielä laskettu summaan.
+    lukija = lue_tiedosto
+
+    if asetukset["valimuisti"]:
+        lukija = partial(vm.lue, asetukset["valimuisti"], lukija=lue_tiedosto)
+        # Tiedosto jäsennetään vain, jos sitä ei löydy välimuistista.
+
+    sovitetut = set() # Vertailuenergioihin interpoloitujen tiedostojen indeksit.
+
+    def ilmoitus(indeksi, hyvaksytty, sovitettu):
+        if sovitettu:
+            sovitetut.add(indeksi) # Tarvitaan, kun tiedosto myöhemmin vähennetään summasta.
+
+        if asetukset["edistyminen"]:
+            asetukset["edistyminen"](polut[indeksi], hyvaksytty, sovitettu)
+            # Muutetaan indeksi tiedoston poluksi.
+
+    def tallenna_rivi(indeksi, energiat, intensiteetit):
+        nonlocal kirjoitin
+
+        if kirjoitin is None: # Ensimmäinen rivi; matriisi luodaan vertailuenergioista.
+            kirjoitin = mt.aloita(asetukset["matriisi"], energiat, asetukset["matriisin_tyyppi"])
+
+        mt.lisaa(kirjoitin, polut[indeksi], intensiteetit)
+
+    jatko = {"viite_energiat": tila["energiat"], "summaintensiteetit": tila["summaintensiteetit"],
+             "peruutus": asetukset["peruutus"], "edistyminen": ilmoitus,
+             "rivi": tallenna_rivi if asetukset["matriisi"] else None,
+             "toleranssi": asetukset["toleranssi"]}
+    # Jatketaan kansion aiempaa summaa (ks. summaa_tiedostot).
+
+    try:
+        energiat, summaintensiteetit, hyvaksytyt = _summaa_polut(
+            polut, lukija, asetukset["prosesseja"], jatko)
+    finally:
+        if kirjoitin is not None:
+            mt.sulje(kirjoitin)
+            # Matriisin tiedot päivitetään vasta, kun rivit on kirjoitettu. Jos summaus
+            # keskeytyi virheeseen, ylimääräiset rivit karsitaan seuraavalla latauskerralla.
+
+    if asetukset["valimuisti"]:
+        vm.karsi(asetukset["valimuisti"], asetukset["valimuistin_koko"], set(avaimet.values()))
+        # Pidetään välimuisti kokorajoissa poistamatta kansion omia tiedostoja.
+
+    tila["tiedostot"].update({tiedosto: (avaimet[tiedosto], hyvaksytty, indeksi in sovitetut)
+                              for indeksi, (tiedosto, hyvaksytty)
+                              in enumerate(zip(polut, hyvaksytyt))})
+    # Muistetaan luetut tiedostot seuraavaa lisäävää latausta varten.
+
+    tila["energiat"] = energiat
+    tila["summaintensiteetit"] = summaintensiteetit
+    tila["lkm"] += sum(hyvaksytyt)
+    kansiot[kansio] = tila
+
+    if len(hyvaksytyt) < len(polut): # Lataus keskeytettiin.
+        return None
+
+    return energiat, summaintensiteetit.copy(), tila["lkm"], len(polut)
+    # Palautetaan kopio, jotta seuraava lisäävä lataus ei muuta jo palautettua summaa.
+
+def unohda_kansio(polku):
+    """
+    Poistaa kansion tilan muistista, kun sitä ei enää tarvita lisäävään lataukseen
+    (esim. eräajossa, jossa kukin kansio käsitellään vain kerran).
+    """
+
+    with latauslukko:
+        kansiot.pop(os.path.realpath(polku) if polku else "", None)
@@ -0,0 +1,232 @@
+"""
+Taustat
+
+Taustamallit, joilla spektristä voidaan poistaa tausta. Jokainen malli on funktio,
+joka saa ensimmäisinä argumentteinaan energiat ja intensiteetit sekä mallikohtaiset
+asetukset avainsana-argumentteina ja palauttaa taustan koko energia-akselille
+taulukkona. Mallit lasketaan numpy-taulukko-operaatioina, joten pisteitä ei käydä
+läpi Python-silmukoissa.
+
+Mallit:
+    lineaarinen  suora kahden pisteen (x, y) kautta (vrt. käyttöliittymä)
+    polynomi     pienimmän neliösumman polynomi useammalle taustaksi tiedetylle alueelle
+    shirley      iteratiivinen Shirley-tausta energiavälillä
+    tougaard     Tougaardin yleiseen vaikutusalaan perustuva tausta energiavälillä
+
+Shirley- ja Tougaard-taustat olettavat sidosenergia-asteikon: tausta kasvaa piikin
+pienemmän energian puolelta suuremman energian puolelle. Energiavälin ulkopuolella
+tausta jatkuu vakiona välin päätepisteiden arvoissa.
+"""
+
+import numpy as np
+import spektrilaskenta as sl
+
+SHIRLEY_TOLERANSSI = 1e-6
+# Shirley-iterointi lopetetaan, kun tausta muuttuu kierroksella vähemmän kuin tämä
+# suhteessa intensiteettien suurimpaan itseisarvoon.
+SHIRLEY_KIERROKSIA = 100 # Iterointikierrosten enimmäismäärä.
+TOUGAARD_B = 2866.0 # Tougaardin yleisen vaikutusalan kertoimet (eV^2 ja eV^2).
+TOUGAARD_C = 1643.0
+
+def _nousevaksi(energiat, intensiteetit):
+    """
+    Palauttaa energiat ja intensiteetit liukulukutaulukkoina nousevassa järjestyksessä
+    sekä tiedon, käännettiinkö ne (laskeva data).
+    """
+
+    energiat = np.asarray(energiat, dtype=np.float64)
+    intensiteetit = np.asarray(intensiteetit, dtype=np.float64)
+    laskeva = len(energiat) > 1 and energiat[0] > energiat[-1]
+
+    if laskeva:
+        return energiat[::-1], intensiteetit[::-1], True # Käännetyt näkymät; ei kopioida.
+
+    return energiat, intensiteetit, False
+
+def _valin_data(energiat, intensiteetit, minimi, maksimi):
+    """
+    Palauttaa energiavälin energiat ja intensiteetit nousevassa järjestyksessä sekä
+    välin sijainnin (alku, loppu, pisteiden määrä, laskeva) _laajenna -funktiota varten.
+    Väliin täytyy osua vähintään kaksi mittauspistettä.
+    """
+
+    n = len(energiat)
+    energiat, intensiteetit, laskeva = _nousevaksi(energiat, intensiteetit)
+    alku, loppu = sl.etsi_indeksit(energiat, min(minimi, maksimi), max(minimi, maksimi))
+
+    if loppu - alku < 2:
+        raise ValueError(f"Energiavälille {minimi}...{maksimi} osuu alle kaksi "
+                         "mittauspistettä.")
+
+    return energiat[alku:loppu], intensiteetit[alku:loppu], (alku, loppu, n, laskeva)
+
+def _laajenna(tausta, sijainti):
+    """
+    Sijoittaa energiavälillä lasketun taustan koko energia-akselin pituiseen taulukkoon
+    (sijainti, ks. _valin_data). Välin ulkopuolella tausta on välin päätepisteiden arvo.
+    Laskeva data käännetään takaisin alkuperäiseen järjestykseen.
+    """
+
+    alku, loppu, n, laskeva = sijainti
+    koko = np.empty(n)
+    koko[:alku] = tausta[0]
+    koko[alku:loppu] = tausta
+    koko[loppu:] = tausta[-1]
+
+    if laskeva:
+        return koko[::-1].copy()
+
+    return koko
+
+def lineaarinen(energiat, _intensiteetit, piste_a, piste_b):
+    """
+    Suora, joka kulkee pisteiden piste_a ja piste_b (monikot (x, y)) kautta.
+    Intensiteettejä ei tarvita, mutta ne otetaan vastaan kuten muissakin malleissa.
+    """
+
+    kulmakerroin, vakiotermi = sl.laske_parametrit(piste_a[0], piste_a[1], piste_b[0], piste_b[1])
+    return sl.laske_pisteet_suoralla(kulmakerroin, vakiotermi, energiat)
+
+def polynomi(energiat, intensiteetit, alueet, aste=1):
+    """
+    Sovittaa pienimmän neliösumman menetelmällä aste-asteisen polynomin niihin
+    mittauspisteisiin, jotka osuvat annetuille taustaksi tiedetyille alueille
+    (lista (e_min, e_max) -monikoita), ja laskee sen arvot koko energia-akselilla.
+    """
+
+    energiat = np.asarray(energiat, dtype=np.float64)
+    intensiteetit = np.asarray(intensiteetit, dtype=np.float64)
+    maski = np.zeros(len(energiat), dtype=bool)
+
+    for minimi, maksimi in alueet:
+        alku, loppu = sl.etsi_indeksit(energiat, min(minimi, maksimi), max(minimi, maksimi))
+        maski[alku:loppu] = True
+        # Alueet voivat olla päällekkäisiä; kukin piste otetaan sovitukseen kerran.
+
+    if np.count_nonzero(maski) <= aste:
+        raise ValueError(f"Taustan alueilla on liian vähän mittauspisteitä {aste}. asteen "
+                         "polynomille.")
+
+    sovitus = np.polynomial.Polynomial.fit(energiat[maski], intensiteetit[maski], aste)
+    # Polynomial.fit skaalaa energiat välille [-1, 1], joten korkeakaan aste ei tee
+    # sovituksesta numeerisesti epävakaata.
+
+    return sovitus(energiat)
+
+def _shirley_kierros(x, y, tausta):
+    """
+    Laskee Shirley-taustan seuraavan arvion edellisestä: tausta kulkee välin
+    pienemmän ja suuremman energian pään intensiteettien y[0] ja y[-1] välillä
+    taustattoman piikin kertyvän pinta-alan suhteessa.
+    """
+
+    kertyma = sl.kumulatiivinen_integraali(x, y - tausta)
+
+    if kertyma[-1] == 0:
+        # Piikillä ei ole pinta-alaa, joten tausta on suora päätepisteiden välillä.
+        return y[0] + (y[-1] - y[0]) * (x - x[0]) / (x[-1] - x[0])
+
+    return y[0] + (y[-1] - y[0]) * kertyma / kertyma[-1]
+
+# pylint: disable-next=too-many-arguments
+def shirley(energiat, intensiteetit, minimi, maksimi, *, toleranssi=SHIRLEY_TOLERANSSI,
+            kierroksia=SHIRLEY_KIERROKSIA):
+    """
+    Laskee Shirley-taustan energiavälillä minimi...maksimi. Tausta kulkee välin
+    päätepisteiden intensiteettien kautta, ja kussakin pisteessä se on verrannollinen
+    taustattoman piikin pinta-alaan välin pienemmän energian päästä kyseiseen pisteeseen.
+    Koska pinta-ala riippuu taustasta, tausta ratkaistaan iteroimalla; jokainen kierros
+    lasketaan koko välille kerralla kumulatiivisena integraalina.
+    """
+
+    x, y, sijainti = _valin_data(energiat, intensiteetit, minimi, maksimi)
+    raja = toleranssi * max(float(np.max(np.abs(y))), np.finfo(np.float64).tiny)
+
+    tausta = np.full(len(y), y[0]) # Alkuarvauksena vakiotausta.
+
+    for _ in range(kierroksia):
+        uusi = _shirley_kierros(x, y, tausta)
+        muutos = float(np.max(np.abs(uusi - tausta)))
+        tausta = uusi
+
+        if muutos <= raja:
+            break
+
+    return _laajenna(tausta, sijainti)
+
+def _konvoluutio(spektri, hila, kerroin_b, kerroin_c):
+    """
+    Laskee tasavälisessä hilassa mitatun spektrin ja Tougaardin vaikutusalan
+    konvoluution Fourier-muunnoksella.
+    """
+
+    m = len(hila)
+    askel = hila[1] - hila[0]
+    haviot = askel * np.arange(m)
+    vaikutusala = kerroin_b * haviot / (kerroin_c + haviot ** 2) ** 2
+
+    koko = 1 << int(2 * m - 1).bit_length()
+    # Täydennetään nollilla vähintään pituuteen 2m - 1, jottei konvoluutio ole kehämäinen.
+    return np.fft.irfft(np.fft.rfft(spektri, koko) * np.fft.rfft(vaikutusala, koko),
+                        koko)[:m] * askel
+
+# pylint: disable-next=too-many-arguments
+def tougaard(energiat, intensiteetit, minimi, maksimi, *, kerroin_b=TOUGAARD_B,
+             kerroin_c=TOUGAARD_C, sovita=True):
+    """
+    Laskee Tougaard-taustan energiavälillä minimi...maksimi käyttäen kaksiparametrista
+    yleistä vaikutusalaa K(T) = B * T / (C + T^2)^2, missä T on energiahäviö.
+    Kunkin pisteen tausta on spektrin ja vaikutusalan konvoluutio välin pienemmän
+    energian päästä kyseiseen pisteeseen; konvoluutio lasketaan Fourier-muunnoksella
+    tasavälisessä hilassa (epätasavälinen data interpoloidaan sellaiseksi).
+    Jos sovita on tosi, taustan kerroin valitaan niin, että tausta osuu välin suuremman
+    energian päätepisteeseen; muuten käytetään annettua kerrointa B sellaisenaan.
+    """
+
+    x, y, sijainti = _valin_data(energiat, intensiteetit, minimi, maksimi)
+
+    hila = np.linspace(x[0], x[-1], len(x))
+    tasavalinen = np.allclose(np.diff(x), hila[1] - hila[0], rtol=1e-6, atol=0)
+    spektri = y if tasavalinen else np.interp(hila, x, y)
+
+    spektri = spektri - spektri[0] # Vähennetään pienemmän energian pään taso.
+    konvoluutio = _konvoluutio(spektri, hila, kerroin_b, kerroin_c)
+
+    if sovita and konvoluutio[-1] != 0:
+        konvoluutio *= spektri[-1] / konvoluutio[-1]
+
+    tausta = y[0] + konvoluutio
+
+    if not tasavalinen:
+        tausta = np.interp(x, hila, tausta) # Takaisin alkuperäisiin energioihin.
+
+    return _laajenna(tausta, sijainti)
+
+MALLIT = {
+    "lineaarinen": lineaarinen,
+    "polynomi": polynomi,
+    "shirley": shirley,
+    "tougaard": tougaard
+}
+# Taustamallien nimet ja niitä vastaavat funktiot.
+
+def laske_tausta(malli, energiat, intensiteetit, **asetukset):
+    """
+    Laskee nimetyn taustamallin (ks. MALLIT) taustan annetuilla asetuksilla.
+    """
+
+    try:
+        funktio = MALLIT[malli]
+    except KeyError:
+        raise ValueError(f"Tuntematon taustamalli: {malli}") from None
+
+    return funktio(energiat, intensiteetit, **asetukset)
+
+def poista_tausta(malli, energiat, intensiteetit, **asetukset):
+    """
+    Vähentää intensiteeteistä nimetyn taustamallin taustan. Palauttaa taustattomat
+    intensiteetit taulukkona.
+    """
+
+    return np.asarray(intensiteetit, dtype=np.float64) - laske_tausta(malli, energiat,
+                                                                      intensiteetit, **asetukset)
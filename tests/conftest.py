@@ -0,0 +1,33 @@
+"""
+Testien yhteiset apufunktiot.
+
+Ohjelman moduulit ovat projektin juurikansiossa, joten se lisätään moduulien
+hakupolkuun. Testit eivät tuo tkinteriä eikä matplotlibiä.
+"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def kirjoita_mittaus(polku, energiat, intensiteetit, rivinvaihto="\n"):
+    """
+    Kirjoittaa mittaustiedoston, jonka riveillä on energia ja intensiteetti
+    välilyönnillä erotettuina.
+    """
+
+    rivit = (f"{float(energia)!r} {float(intensiteetti)!r}" for energia, intensiteetti
+             in zip(energiat, intensiteetit))
+    # repr antaa liukuluvun tarkasti, joten luettu arvo on täsmälleen sama.
+
+    with open(polku, "w", newline="", encoding="utf-8") as kohde:
+        kohde.write(rivinvaihto.join(rivit) + rivinvaihto)
+
+@pytest.fixture(name="mittaus")
+def fixture_mittaus():
+    """
+    Antaa testeille kirjoita_mittaus -funktion.
+    """
+
+    return kirjoita_mittaus
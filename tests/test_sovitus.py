@@ -0,0 +1,145 @@
+"""
+Piikkien sovituksen testit: tunnetuista parametreista lasketun spektrin parametrit
+ja pinta-alat on saatava sovituksella takaisin.
+"""
+
+import numpy as np
+import pytest
+import sovitus as sv
+import piikit as pk
+
+ENERGIAT = np.linspace(270, 300, 1501)
+
+def spektri(muodot, parametrit, energiat=ENERGIAT):
+    """
+    Laskee komponenttien summan annetuilla parametreilla (yksiulotteinen taulukko).
+    """
+
+    malli, _ = sv.arvioi(muodot, energiat, np.asarray(parametrit, dtype=np.float64)[None, :])
+    return malli[0]
+
+def todelliset_pinta_alat(muodot, parametrit):
+    """
+    Laskee komponenttien pinta-alat todellisista parametreista.
+    """
+
+    pinta_alat = []
+    alku = 0
+
+    for muoto in muodot:
+        maara = sv.MUODOT[muoto][1]
+        pinta_alat.append(float(sv.pinta_ala(muoto, np.asarray(parametrit[alku:alku + maara]))))
+        alku += maara
+
+    return pinta_alat
+
+@pytest.mark.parametrize("muodot, todelliset, alkuarvot", [
+    (["gauss"], (5.0, 285.0, 1.5), [(4.0, 284.6, 2.0)]),
+    (["lorentz"], (3.0, 286.0, 0.8), [(2.0, 285.7, 1.2)]),
+    (["pseudovoigt"], (4.0, 284.0, 1.2, 0.3), [(3.0, 284.3, 1.5, 0.5)]),
+    (["gauss", "lorentz"], (5.0, 283.5, 1.4, 3.0, 286.0, 1.0),
+     [(4.0, 283.2, 1.8), (2.5, 286.4, 1.4)]),
+    (["pseudovoigt", "pseudovoigt"], (4.0, 284.0, 1.5, 0.2, 2.0, 286.5, 1.2, 0.7),
+     [(3.5, 283.7, 1.2, 0.5), (2.5, 286.8, 1.5, 0.5)]),
+])
+def test_palauttaa_tunnetut_parametrit(muodot, todelliset, alkuarvot):
+    """
+    Kohinattomasta spektristä sovitus löytää täsmälleen sen parametrit ja pinta-alat.
+    """
+
+    tulos = sv.sovita(ENERGIAT, spektri(muodot, todelliset), 276, 294, muodot, alkuarvot)
+
+    assert np.allclose(tulos["parametrit"], todelliset, rtol=1e-6, atol=1e-6)
+    assert np.allclose(tulos["pinta_alat"], todelliset_pinta_alat(muodot, todelliset),
+                       rtol=1e-6)
+    assert tulos["neliosumma"] < 1e-12
+
+def test_laskeva_energia_antaa_saman_tuloksen():
+    """
+    Laskevassa järjestyksessä annettu spektri sovitetaan samoin kuin nouseva.
+    """
+
+    muodot = ["gauss", "gauss"]
+    todelliset = (5.0, 283.5, 1.4, 3.0, 286.0, 1.2)
+    alkuarvot = [(4.0, 283.2, 1.8), (2.5, 286.4, 1.4)]
+    intensiteetit = spektri(muodot, todelliset)
+
+    nouseva = sv.sovita(ENERGIAT, intensiteetit, 276, 294, muodot, alkuarvot)
+    laskeva = sv.sovita(ENERGIAT[::-1], intensiteetit[::-1], 276, 294, muodot, alkuarvot)
+
+    assert np.allclose(laskeva["parametrit"], nouseva["parametrit"], rtol=1e-9)
+    assert np.allclose(laskeva["parametrit"], todelliset, rtol=1e-6)
+
+def test_kohinainen_spektri():
+    """
+    Kohinaisesta spektristä keskikohdat ja pinta-alat saadaan kohinan tarkkuudella.
+    """
+
+    muodot = ["pseudovoigt", "pseudovoigt"]
+    todelliset = (4.0, 284.0, 1.5, 0.4, 2.0, 287.0, 1.2, 0.6)
+    kohina = np.random.default_rng(3).normal(0, 0.02, ENERGIAT.size)
+    intensiteetit = spektri(muodot, todelliset) + kohina
+
+    muodot, alkuarvot = sv.arvaa_alkuarvot(ENERGIAT, intensiteetit, [284.0, 287.0],
+                                           [(282.0, 286.0), (285.5, 288.5)])
+    tulos = sv.sovita(ENERGIAT, intensiteetit, 276, 294, muodot, alkuarvot)
+
+    assert np.allclose(tulos["parametrit"][[1, 5]], (284.0, 287.0), atol=0.01)
+    assert np.allclose(tulos["pinta_alat"], todelliset_pinta_alat(muodot, todelliset),
+                       rtol=0.02)
+
+def test_etsinnan_alkuarvoista():
+    """
+    Piikkien etsinnästä muodostetuilla alkuarvoilla sovitus löytää molemmat piikit.
+    """
+
+    muodot = ["gauss", "gauss"]
+    todelliset = (5.0, 282.0, 1.5, 3.0, 290.0, 2.0)
+    intensiteetit = spektri(muodot, todelliset)
+
+    sijainnit, ikkunat = pk.etsi_piikit(ENERGIAT, intensiteetit)
+    muodot, alkuarvot = sv.arvaa_alkuarvot(ENERGIAT, intensiteetit, sijainnit, ikkunat,
+                                           muoto="gauss")
+    tulos = sv.sovita(ENERGIAT, intensiteetit, 274, 298, muodot, alkuarvot)
+    jarjestys = np.argsort(tulos["parametrit"][1::3])
+
+    assert np.allclose(tulos["parametrit"].reshape(-1, 3)[jarjestys].ravel(), todelliset,
+                       rtol=1e-6)
+
+def test_joukkosovitus_vastaa_yksittaisia():
+    """
+    Moneen spektriin kerralla sovitettu malli antaa kullekin samat parametrit kuin
+    erikseen sovitettu.
+    """
+
+    muodot = ["gauss", "lorentz"]
+    todelliset = np.array([[5.0, 283.5, 1.4, 3.0, 286.0, 1.0],
+                           [2.0, 283.8, 1.6, 4.0, 285.8, 0.9],
+                           [6.0, 283.2, 1.2, 1.0, 286.3, 1.1]])
+    intensiteetit = np.stack([spektri(muodot, rivi) for rivi in todelliset])
+    alkuarvot = [(4.0, 283.4, 1.5), (2.5, 286.1, 1.2)]
+
+    joukko = sv.sovita_joukko(ENERGIAT, intensiteetit, 276, 294, muodot, alkuarvot)
+
+    assert joukko["parametrit"].shape == todelliset.shape
+    assert np.allclose(joukko["parametrit"], todelliset, rtol=1e-6)
+
+    for rivi, parametrit in zip(intensiteetit, joukko["parametrit"]):
+        yksittainen = sv.sovita(ENERGIAT, rivi, 276, 294, muodot, alkuarvot)
+        assert np.allclose(parametrit, yksittainen["parametrit"], rtol=1e-8)
+
+def test_virheelliset_syotteet():
+    """
+    Tuntematon muoto, väärä alkuarvojen määrä ja liian kapea väli nostavat ValueErrorin.
+    """
+
+    intensiteetit = spektri(["gauss"], (5.0, 285.0, 1.5))
+
+    with pytest.raises(ValueError):
+        sv.sovita(ENERGIAT, intensiteetit, 276, 294, ["voigt"], [(5.0, 285.0, 1.5)])
+
+    with pytest.raises(ValueError):
+        sv.sovita(ENERGIAT, intensiteetit, 276, 294, ["gauss"], [(5.0, 285.0)])
+
+    with pytest.raises(ValueError):
+        sv.sovita(ENERGIAT, intensiteetit, 285.001, 285.002, ["gauss"], [(5.0, 285.0, 1.5)])
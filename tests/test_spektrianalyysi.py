@@ -0,0 +1,134 @@
+"""
+Käyttöliittymän latauslogiikan testit ilman graafista käyttöliittymää: ikkunasto
+korvataan tekstit muistiin keräävällä korvikkeella, eikä kuvaajaa piirretä.
+"""
+
+import os
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import spektrilaskenta as sl
+import spektrianalyysi as sa
+import istunto as it
+
+HILA = np.linspace(270, 280, 51)
+
+@pytest.fixture(name="tekstit")
+def fixture_tekstit(monkeypatch, tmp_path):
+    """
+    Korvaa ikkunaston ja ohjelman tilan testikohtaisilla, jotta testit eivät vaikuta
+    toisiinsa. Palauttaa listan tekstilaatikkoon kirjoitetuista teksteistä.
+    """
+
+    tekstit = []
+    monkeypatch.setattr(sa, "ik", SimpleNamespace(
+        kirjoita_tekstilaatikkoon=lambda laatikko, teksti, tyhjaa=False: tekstit.append(teksti),
+        ajasta=lambda viive, kasittelija: None,
+        avaa_hakemistoikkuna=None))
+    monkeypatch.setattr(sa, "napit", {nimi: SimpleNamespace(config=lambda **asetukset: None)
+                                      for nimi in sa.napit})
+    monkeypatch.setattr(sa, "piirra_paallys", lambda: None) # Kuvaajaa ei ole.
+    monkeypatch.setattr(sa, "istunto", it.uusi())
+    monkeypatch.setattr(sa, "data", dict(sa.data, spektri=sl.Spektri(tyyppi=sa.SPEKTRIN_TYYPPI)))
+    monkeypatch.setattr(sa, "lataus", dict(sa.lataus))
+    monkeypatch.setattr(sa, "MATRIISIEN_KANSIO", str(tmp_path / "matriisit"))
+    monkeypatch.setattr(sa, "VALIMUISTIN_KANSIO", str(tmp_path / "valimuisti"))
+    monkeypatch.setattr(sa, "LATAUSPROSESSEJA", 1)
+    monkeypatch.setattr(sl, "kansiot", {})
+
+    return tekstit
+
+def lataa(kansio):
+    """
+    Lataa kansion kuten Lataa-painike: kansio valitaan, lataussäie odotetaan loppuun
+    ja tulos käsitellään pääsäikeen tapaan.
+    """
+
+    sa.ik.avaa_hakemistoikkuna = lambda otsikko: str(kansio)
+    sa.avaa_kansio()
+    sa.lataus["saie"].join()
+    sa.kasittele_lataus()
+
+def luo_kansio(polku, mittaus, kertoimet):
+    """
+    Luo mittauskansion, jonka tiedostojen intensiteetit ovat kertoimet kertaa
+    sama käyrä. Palauttaa kansion polun.
+    """
+
+    polku.mkdir()
+
+    for numero, kerroin in enumerate(kertoimet, start=1):
+        mittaus(polku / f"measurement_{numero}.txt", HILA, kerroin * (HILA - 260))
+
+    return str(polku)
+
+def tyhjenna(kansio):
+    """
+    Poistaa kansion mittaustiedostot.
+    """
+
+    for polku in sl.etsi_tiedostot(kansio):
+        os.remove(polku)
+
+def test_aktiivisen_kansion_tyhjeneminen_poistaa_aineiston(tekstit, tmp_path, mittaus):
+    """
+    Kun aktiivisen aineiston kansio tyhjenee, aineisto poistetaan ja aktiiviseksi
+    vaihdetaan jäljellä oleva aineisto; vanhaa energia-akselia ei yhdistetä tyhjään summaan.
+    """
+
+    kansio_a = luo_kansio(tmp_path / "a", mittaus, [1, 2])
+    kansio_b = luo_kansio(tmp_path / "b", mittaus, [3, 4, 5])
+    lataa(kansio_a)
+    lataa(kansio_b)
+    assert sa.istunto["aktiivinen"] == kansio_b
+
+    tyhjenna(kansio_b)
+    lataa(kansio_b)
+
+    assert list(sa.istunto["aineistot"]) == [kansio_a]
+    assert sa.istunto["aktiivinen"] == kansio_a
+    assert sa.data["lkm"] == 2
+    assert np.array_equal(sa.data["spektri"].intensiteetit, 3 * (HILA - 260))
+    assert sa.AINEISTO_TYHJENI.format(kansio_b) in tekstit
+
+    tyhjenna(kansio_a)
+    lataa(kansio_a)
+
+    assert sa.istunto["aktiivinen"] is None
+    assert not sa.istunto["aineistot"]
+    assert sa.data["lkm"] == 0
+    assert len(sa.data["spektri"].energiat) == len(sa.data["spektri"].intensiteetit) == 0
+
+def test_ei_aktiivisen_kansion_tyhjeneminen(tekstit, tmp_path, mittaus):
+    """
+    Kun muu kuin aktiivinen kansio tyhjenee, vain sen aineisto poistetaan ja aktiivinen
+    aineisto säilyy ennallaan.
+    """
+
+    kansio_a = luo_kansio(tmp_path / "a", mittaus, [1, 2])
+    kansio_b = luo_kansio(tmp_path / "b", mittaus, [3, 4, 5])
+    lataa(kansio_a)
+    lataa(kansio_b)
+
+    tyhjenna(kansio_a)
+    lataa(kansio_a)
+
+    assert list(sa.istunto["aineistot"]) == [kansio_b]
+    assert sa.istunto["aktiivinen"] == kansio_b
+    assert sa.data["lkm"] == 3
+    assert np.array_equal(sa.data["spektri"].intensiteetit, 12 * (HILA - 260))
+    assert sa.AINEISTO_TYHJENI.format(kansio_a) in tekstit
+
+def test_tyhjaa_kansiota_ei_lisata_istuntoon(tekstit, tmp_path, mittaus):
+    """
+    Kansio, josta ei koskaan saatu dataa, ei tule istuntoon.
+    """
+
+    kansio_a = luo_kansio(tmp_path / "a", mittaus, [1])
+    tyhja = luo_kansio(tmp_path / "tyhja", mittaus, [])
+    lataa(kansio_a)
+    lataa(tyhja)
+
+    assert list(sa.istunto["aineistot"]) == [kansio_a]
+    assert sa.istunto["aktiivinen"] == kansio_a
+    assert sa.AINEISTO_TYHJENI.format(tyhja) not in tekstit
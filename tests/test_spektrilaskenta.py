@@ -0,0 +1,342 @@
+"""
+Spektrilaskennan testit: mittaustiedostojen jäsentäminen, energiavälien haku,
+lähimmän mittauspisteen haku, piikkien integrointi ja kansion lisäävä lukeminen.
+"""
+
+import os
+import numpy as np
+import pytest
+import spektrilaskenta as sl
+
+def vanha_lue_tiedosto(polku):
+    """
+    Alkuperäinen rivi kerrallaan lukeva jäsennin, johon lue_tiedosto -funktiota verrataan.
+    """
+
+    energiat = []
+    intensiteetit = []
+
+    try:
+        with open(polku, encoding="utf-8") as lahde:
+            for rivi in lahde.readlines():
+                tiedot = rivi.rstrip().split()
+
+                if not len(tiedot) == 2:
+                    return False, False
+
+                energiat.append(float(tiedot[0]))
+                intensiteetit.append(float(tiedot[1]))
+    except (ValueError, IOError, IndexError):
+        return False, False
+
+    return energiat, intensiteetit
+
+@pytest.mark.parametrize("sisalto", [
+    "270.0 1.5\n270.5 2.5\n271.0 3.5\n", # Tavallinen tiedosto.
+    "270.0 1.5\r\n270.5 2.5\r\n271.0 3.5\r\n", # Windowsin rivinvaihdot.
+    "270.0 1.5\r270.5 2.5\r271.0 3.5\r", # Vanhan Macin rivinvaihdot.
+    "270.0 1.5\n270.5 2.5", # Viimeinen rivi ilman rivinvaihtoa.
+    "2.7e2\t-1.25E-3\n  270.5   4\t\n", # Tieteellinen esitys, sarkaimet ja välilyönnit.
+    "270.0 1.5\n\n270.5 2.5\n", # Tyhjä rivi kesken datan.
+    "270.0 1.5\n270.5 2.5\n\n", # Ylimääräinen tyhjä rivi lopussa.
+    "270.0 1.5 0.3\n270.5 2.5 0.3\n", # Liikaa sarakkeita.
+    "270.0 1.5\n270.5\n", # Rivillä liian vähän tietoja.
+    "270.0 1.5\n270.5 abc\n", # Arvo ei ole luku.
+    "   \n", # Pelkkiä välilyöntejä.
+])
+def test_jasentaa_kuten_vanha_jasennin(tmp_path, sisalto):
+    """
+    Kelvollinen tiedosto jäsentyy samoiksi luvuiksi ja viallinen hylätään kuten ennen.
+    """
+
+    polku = tmp_path / "measurement_1.txt"
+    polku.write_bytes(sisalto.encode("utf-8"))
+
+    odotettu = vanha_lue_tiedosto(polku)
+    energiat, intensiteetit = sl.lue_tiedosto(str(polku))
+
+    if odotettu[0] is False:
+        assert energiat is False and intensiteetit is False
+    else:
+        assert energiat.dtype == np.float64 and intensiteetit.dtype == np.float64
+        assert np.array_equal(energiat, odotettu[0])
+        assert np.array_equal(intensiteetit, odotettu[1])
+
+def test_sama_tulos_kaikilla_rivinvaihdoilla(tmp_path, mittaus):
+    """
+    Rivinvaihtojen muoto ei vaikuta jäsennettyihin arvoihin.
+    """
+
+    energiat = np.linspace(270, 300, 501)
+    intensiteetit = np.random.default_rng(0).normal(100, 10, energiat.size)
+    tulokset = []
+
+    for i, rivinvaihto in enumerate(("\n", "\r\n", "\r")):
+        polku = tmp_path / f"measurement_{i}.txt"
+        mittaus(polku, energiat, intensiteetit, rivinvaihto)
+        tulokset.append(sl.lue_tiedosto(str(polku)))
+
+    for luetut_energiat, luetut_intensiteetit in tulokset:
+        assert np.array_equal(luetut_energiat, energiat)
+        assert np.array_equal(luetut_intensiteetit, intensiteetit)
+
+def test_tyhja_ja_puuttuva_tiedosto_hylataan(tmp_path):
+    """
+    Tyhjästä tai puuttuvasta tiedostosta ei saada dataa.
+    """
+
+    polku = tmp_path / "measurement_1.txt"
+    polku.write_bytes(b"")
+
+    assert sl.lue_tiedosto(str(polku)) == (False, False)
+    assert sl.lue_tiedosto(str(tmp_path / "measurement_2.txt")) == (False, False)
+
+def vanha_etsi_indeksit(mittausdata, minimi, maksimi):
+    """
+    Alkuperäinen lineaarinen haku nousevasta datasta, johon etsi_indeksit -funktiota
+    verrataan.
+    """
+
+    alku = -1
+    loppu = -1
+    i = None
+
+    for i, luku in enumerate(mittausdata):
+        if luku >= minimi and alku == -1:
+            alku = i
+
+        if luku > maksimi and loppu == -1:
+            loppu = i
+
+        if alku > -1 and loppu > -1:
+            return alku, loppu
+
+    if alku > -1 and loppu == -1:
+        return alku, i + 1
+
+    return i + 1, i + 1
+
+def valit(energiat):
+    """
+    Palauttaa testattavat energiavälit: satunnaiset välit, mittauspisteisiin osuvat
+    rajat sekä datan ulkopuolelle ulottuvat välit.
+    """
+
+    pienin, suurin = min(energiat), max(energiat)
+    satunnaiset = np.sort(np.random.default_rng(1).uniform(pienin - 1, suurin + 1, (50, 2)))
+    pisteissa = [(energiat[3], energiat[7]), (energiat[0], energiat[0]),
+                 (energiat[-1], energiat[-1])]
+    ulkona = [(pienin - 5, pienin - 1), (suurin + 1, suurin + 5), (pienin - 1, suurin + 1)]
+
+    return [tuple(vali) for vali in satunnaiset] + pisteissa + ulkona
+
+ENERGIAT = np.round(np.linspace(270, 280, 101), 10)
+
+def test_etsi_indeksit_nouseva_kuten_vanha_haku():
+    """
+    Nousevassa datassa binäärihaku antaa samat indeksit kuin alkuperäinen lineaarinen haku.
+    """
+
+    for minimi, maksimi in valit(ENERGIAT):
+        assert sl.etsi_indeksit(ENERGIAT, minimi, maksimi) == vanha_etsi_indeksit(
+            ENERGIAT.tolist(), minimi, maksimi)
+
+@pytest.mark.parametrize("energiat", [ENERGIAT, ENERGIAT[::-1]], ids=["nouseva", "laskeva"])
+def test_etsi_indeksit_rajaa_valin_pisteet(energiat):
+    """
+    Kummassakin järjestyksessä alue sisältää täsmälleen välille osuvat mittauspisteet.
+    """
+
+    for minimi, maksimi in valit(energiat):
+        alku, loppu = sl.etsi_indeksit(energiat, minimi, maksimi)
+        valilla = (energiat >= minimi) & (energiat <= maksimi)
+
+        assert np.array_equal(energiat[alku:loppu], energiat[valilla])
+
+@pytest.mark.parametrize("energiat", [ENERGIAT, ENERGIAT[::-1]], ids=["nouseva", "laskeva"])
+def test_lahin_indeksi_kuten_taysi_haku(energiat):
+    """
+    Binäärihaku löytää saman pisteen kuin koko taulukon läpikäynti, myös datan
+    ulkopuolella ja mittauspisteiden kohdalla.
+    """
+
+    kohdat = np.concatenate([np.random.default_rng(2).uniform(265, 285, 200), energiat[::10]])
+
+    for energia in kohdat:
+        assert sl.lahin_indeksi(energiat, energia) == int(np.argmin(np.abs(energiat - energia)))
+
+@pytest.mark.parametrize("energiat", [np.arange(5.0), np.arange(5.0)[::-1]],
+                         ids=["nouseva", "laskeva"])
+def test_lahin_indeksi_tasapelissa_ensimmainen(energiat):
+    """
+    Kun kaksi pistettä ovat yhtä lähellä, palautetaan taulukossa ensimmäinen.
+    """
+
+    for energia in (0.5, 1.5, 2.5, 3.5):
+        assert sl.lahin_indeksi(energiat, energia) == int(np.argmin(np.abs(energiat - energia)))
+
+def valin_integraali(energiat, intensiteetit, minimi, maksimi):
+    """
+    Vertailuarvo: puolisuunnikassääntö välin mittauspisteille, joihin on lisätty
+    lineaarisesti interpoloidut päätepisteet. Välin datan ulkopuolinen osa ei kerrytä
+    pinta-alaa.
+    """
+
+    jarjestys = np.argsort(energiat)
+    x, y = energiat[jarjestys], intensiteetit[jarjestys]
+    minimi, maksimi = max(minimi, x[0]), min(maksimi, x[-1])
+
+    if minimi >= maksimi:
+        return 0.0
+
+    valilla = (x > minimi) & (x < maksimi)
+    kohdat = np.concatenate([[minimi], x[valilla], [maksimi]])
+    arvot = np.interp(kohdat, x, y)
+
+    return float(np.sum(np.diff(kohdat) * (arvot[1:] + arvot[:-1]) / 2))
+
+@pytest.mark.parametrize("kaanna", [False, True], ids=["nouseva", "laskeva"])
+def test_piikkien_intensiteetit_samat_kaikilla_reiteilla(kaanna):
+    """
+    Erä- ja yksittäislaskenta antavat samalle ikkunalle saman, reunoilta interpoloidun
+    pinta-alan kummassakin energiajärjestyksessä.
+    """
+
+    energiat = np.linspace(270, 300, 3001)
+    intensiteetit = 5 * np.exp(-(energiat - 285) ** 2 / 2) + 0.1
+
+    if kaanna:
+        energiat, intensiteetit = energiat[::-1], intensiteetit[::-1]
+
+    ikkunat = [(283.0031, 286.9977), (280, 290), (284.004, 284.006), (100, 200), (299, 400)]
+    kertyma = sl.kumulatiivinen_integraali(energiat, intensiteetit)
+    erana = sl.laske_piikkien_intensiteetit(energiat, intensiteetit, ikkunat)
+
+    for (minimi, maksimi), intensiteetti in zip(ikkunat, erana):
+        odotettu = valin_integraali(energiat, intensiteetit, minimi, maksimi)
+        assert intensiteetti == pytest.approx(odotettu, rel=1e-9, abs=1e-12)
+        assert sl.integroi_valilla(energiat, intensiteetit, kertyma, minimi,
+                                   maksimi) == pytest.approx(intensiteetti, rel=1e-12)
+        assert sl.laske_intensiteetti(energiat, intensiteetit, minimi,
+                                      maksimi) == pytest.approx(intensiteetti, rel=1e-12)
+
+HILA = np.linspace(270, 280, 51)
+
+def mittauksen_intensiteetit(numero):
+    """
+    Palauttaa tiedoston kokonaislukuintensiteetit, joten summa on laskujärjestyksestä
+    riippumatta tarkka.
+    """
+
+    return (np.arange(len(HILA)) * numero + 100 * numero) % 997
+
+@pytest.fixture(name="kansio")
+def fixture_kansio(tmp_path, mittaus):
+    """
+    Luo kansion, jossa on neljä mittaustiedostoa, ja unohtaa kansion tilan testin jälkeen.
+    """
+
+    kansio = tmp_path / "data"
+    kansio.mkdir()
+
+    for numero in range(1, 5):
+        mittaus(kansio / f"measurement_{numero}.txt", HILA, mittauksen_intensiteetit(numero))
+
+    yield kansio
+    sl.unohda_kansio(str(kansio))
+
+def kansion_summa(kansio):
+    """
+    Vertailuarvo: kansion kelvollisten tiedostojen intensiteettien summa ja lukumäärä.
+    """
+
+    tulokset = [sl.lue_tiedosto(polku) for polku in sl.etsi_tiedostot(str(kansio))]
+    kelvolliset = [intensiteetit for energiat, intensiteetit in tulokset
+                   if energiat is not False]
+
+    return np.sum(kelvolliset, axis=0), len(kelvolliset)
+
+def tarkista(tulos, kansio, luettuja):
+    """
+    Tarkistaa, että lisäävän latauksen summa ja lukumäärä vastaavat kansion nykyistä
+    sisältöä ja että tiedostoja luettiin odotettu määrä.
+    """
+
+    energiat, summaintensiteetit, lkm, luettu = tulos
+    summa, kelvollisia = kansion_summa(kansio)
+
+    assert np.array_equal(energiat, HILA)
+    assert np.array_equal(summaintensiteetit, summa)
+    assert (lkm, luettu) == (kelvollisia, luettuja)
+
+def muokkaa(polku, mittaus, numero):
+    """
+    Kirjoittaa tiedoston uudelleen eri sisällöllä ja siirtää sen muokkausaikaa, jotta
+    muutos huomataan karkean aikaleiman tiedostojärjestelmissäkin.
+    """
+
+    tiedot = os.stat(polku)
+    mittaus(polku, HILA, mittauksen_intensiteetit(numero))
+    os.utime(polku, ns=(tiedot.st_atime_ns, tiedot.st_mtime_ns + 10 ** 9))
+
+def test_lisaava_lataus_lukee_vain_uudet_tiedostot(kansio, mittaus):
+    """
+    Uusi kelvollinen tiedosto lisätään summaan ja viallinen hylätään lukematta
+    aiempia tiedostoja uudelleen.
+    """
+
+    tarkista(sl.lue_kansio(str(kansio), lisaava=True), kansio, 4)
+    tarkista(sl.lue_kansio(str(kansio), lisaava=True), kansio, 0)
+
+    mittaus(kansio / "measurement_5.txt", HILA, mittauksen_intensiteetit(5))
+    (kansio / "measurement_6.txt").write_text("270.0 1.0 2.0\n", encoding="utf-8")
+    tarkista(sl.lue_kansio(str(kansio), lisaava=True), kansio, 2)
+
+def test_muuttunut_ja_poistettu_tiedosto_vahennetaan_summasta(kansio, mittaus, tmp_path):
+    """
+    Välimuistin avulla muuttuneen tiedoston vanha osuus vähennetään ja vain se luetaan
+    uudelleen; poistettu tiedosto vähennetään lukematta mitään.
+    """
+
+    valimuisti = str(tmp_path / "valimuisti")
+    tarkista(sl.lue_kansio(str(kansio), valimuisti=valimuisti, lisaava=True), kansio, 4)
+
+    muokkaa(kansio / "measurement_2.txt", mittaus, 7)
+    tarkista(sl.lue_kansio(str(kansio), valimuisti=valimuisti, lisaava=True), kansio, 1)
+
+    os.remove(kansio / "measurement_3.txt")
+    tarkista(sl.lue_kansio(str(kansio), valimuisti=valimuisti, lisaava=True), kansio, 0)
+
+    muokkaa(kansio / "measurement_1.txt", mittaus, 8)
+    os.remove(kansio / "measurement_4.txt")
+    mittaus(kansio / "measurement_9.txt", HILA, mittauksen_intensiteetit(9))
+    tarkista(sl.lue_kansio(str(kansio), valimuisti=valimuisti, lisaava=True), kansio, 2)
+
+def test_ilman_valimuistia_muuttunut_kansio_luetaan_alusta(kansio, mittaus):
+    """
+    Ilman välimuistia muuttuneen tiedoston vanhaa osuutta ei tunneta, joten kansio
+    luetaan kokonaan uudelleen; poistettu tiedosto johtaa samaan.
+    """
+
+    tarkista(sl.lue_kansio(str(kansio), lisaava=True), kansio, 4)
+
+    muokkaa(kansio / "measurement_2.txt", mittaus, 7)
+    tarkista(sl.lue_kansio(str(kansio), lisaava=True), kansio, 4)
+
+    os.remove(kansio / "measurement_3.txt")
+    tarkista(sl.lue_kansio(str(kansio), lisaava=True), kansio, 3)
+
+def test_tyhjentynyt_kansio_ei_palauta_dataa(kansio):
+    """
+    Kun kansion kaikki tiedostot poistetaan, lisäävä lataus ei palauta energioita.
+    """
+
+    sl.lue_kansio(str(kansio), lisaava=True)
+
+    for polku in sl.etsi_tiedostot(str(kansio)):
+        os.remove(polku)
+
+    energiat, _, lkm, luettu = sl.lue_kansio(str(kansio), lisaava=True)
+
+    assert energiat is None
+    assert (lkm, luettu) == (0, 0)
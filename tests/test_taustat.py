@@ -0,0 +1,162 @@
+"""
+Taustamallien testit: kukin malli tuottaa tunnetun taustan, ja laskeva energia-akseli
+antaa saman taustan käänteisessä järjestyksessä.
+"""
+
+import numpy as np
+import pytest
+import spektrilaskenta as sl
+import taustat
+
+ENERGIAT = np.linspace(270, 300, 601)
+PIIKKI = 10 * np.exp(-(ENERGIAT - 285) ** 2 / 2)
+
+def shirley_spektri(matala, korkea):
+    """
+    Rakentaa spektrin, jonka tausta on Shirley-iteroinnin kiintopiste: taustan nousu
+    kussakin pisteessä on verrannollinen piikin pinta-alaan välin alusta pisteeseen.
+    Palauttaa intensiteetit ja taustan.
+    """
+
+    kertyma = sl.kumulatiivinen_integraali(ENERGIAT, PIIKKI)
+    tausta = matala + (korkea - matala) * kertyma / kertyma[-1]
+    return tausta + PIIKKI, tausta
+
+def test_lineaarinen_kulkee_pisteiden_kautta():
+    """
+    Lineaarinen tausta kulkee valittujen pisteiden kautta ja vastaa käyttöliittymän
+    taustan poistoa.
+    """
+
+    intensiteetit = PIIKKI + 0.1 * ENERGIAT
+    piste_a = sl.lahin_piste(ENERGIAT, intensiteetit, 274)
+    piste_b = sl.lahin_piste(ENERGIAT, intensiteetit, 296)
+
+    tausta = taustat.laske_tausta("lineaarinen", ENERGIAT, intensiteetit,
+                                  piste_a=piste_a, piste_b=piste_b)
+
+    assert tausta[sl.lahin_indeksi(ENERGIAT, 274)] == pytest.approx(piste_a[1])
+    assert tausta[sl.lahin_indeksi(ENERGIAT, 296)] == pytest.approx(piste_b[1])
+    assert np.array_equal(
+        taustat.poista_tausta("lineaarinen", ENERGIAT, intensiteetit,
+                              piste_a=piste_a, piste_b=piste_b),
+        sl.poista_lineaarinen_tausta(ENERGIAT, intensiteetit, piste_a, piste_b))
+
+def test_polynomi_sovittuu_taustan_alueisiin():
+    """
+    Piikin ulkopuolisiin alueisiin sovitettu polynomi löytää toisen asteen taustan
+    koko energia-akselille.
+    """
+
+    tausta = 0.02 * (ENERGIAT - 280) ** 2 - 0.5 * ENERGIAT + 300
+    intensiteetit = tausta + PIIKKI * (np.abs(ENERGIAT - 285) < 6)
+
+    tulos = taustat.laske_tausta("polynomi", ENERGIAT, intensiteetit,
+                                 alueet=[(270, 278), (292, 300)], aste=2)
+
+    assert np.allclose(tulos, tausta, rtol=1e-9)
+
+    with pytest.raises(ValueError):
+        taustat.laske_tausta("polynomi", ENERGIAT, intensiteetit, alueet=[(270, 270.1)],
+                             aste=3)
+
+@pytest.mark.parametrize("kaanna", [False, True], ids=["nouseva", "laskeva"])
+def test_shirley_loytaa_kiintopisteen(kaanna):
+    """
+    Shirley-iterointi palauttaa taustan, jonka kiintopisteeksi spektri on rakennettu.
+    """
+
+    intensiteetit, odotettu = shirley_spektri(2.0, 7.0)
+    energiat = ENERGIAT
+
+    if kaanna:
+        energiat, intensiteetit, odotettu = energiat[::-1], intensiteetit[::-1], odotettu[::-1]
+
+    tausta = taustat.laske_tausta("shirley", energiat, intensiteetit, minimi=270, maksimi=300)
+
+    assert np.allclose(tausta, odotettu, atol=1e-4)
+
+def test_shirley_valin_ulkopuolella():
+    """
+    Tausta kulkee välin päätepisteiden intensiteettien kautta, kasvaa välillä
+    monotonisesti ja jatkuu välin ulkopuolella päätepisteiden arvoissa.
+    """
+
+    intensiteetit, _ = shirley_spektri(2.0, 7.0)
+    alku, loppu = sl.etsi_indeksit(ENERGIAT, 280, 290)
+
+    tausta = taustat.laske_tausta("shirley", ENERGIAT, intensiteetit, minimi=280, maksimi=290)
+
+    assert tausta[alku] == intensiteetit[alku]
+    assert tausta[loppu - 1] == pytest.approx(intensiteetit[loppu - 1])
+    assert np.all(np.diff(tausta[alku:loppu]) >= 0)
+    assert np.all(tausta[:alku] == tausta[alku])
+    assert np.all(tausta[loppu:] == tausta[loppu - 1])
+
+def tougaard_vertailu(intensiteetit, kerroin_b, kerroin_c):
+    """
+    Vertailuarvo: Tougaard-taustan konvoluutio suoraan summana tasavälisessä hilassa.
+    """
+
+    askel = ENERGIAT[1] - ENERGIAT[0]
+    haviot = askel * np.arange(len(ENERGIAT))
+    vaikutusala = kerroin_b * haviot / (kerroin_c + haviot ** 2) ** 2
+    spektri = intensiteetit - intensiteetit[0]
+
+    return intensiteetit[0] + np.convolve(spektri, vaikutusala)[:len(ENERGIAT)] * askel
+
+def test_tougaard_vastaa_suoraa_konvoluutiota():
+    """
+    Fourier-muunnoksella laskettu tausta vastaa suoraan summattua konvoluutiota.
+    """
+
+    intensiteetit = PIIKKI + 1.0
+    tausta = taustat.laske_tausta("tougaard", ENERGIAT, intensiteetit, minimi=270,
+                                  maksimi=300, kerroin_b=3000.0, sovita=False)
+
+    assert np.allclose(tausta, tougaard_vertailu(intensiteetit, 3000.0, taustat.TOUGAARD_C),
+                       rtol=1e-10, atol=1e-10)
+
+def test_tougaard_sovitetaan_valin_paahan():
+    """
+    Sovitettu tausta osuu välin kumpaankin päätepisteeseen, ja laskeva data antaa
+    saman taustan käänteisessä järjestyksessä.
+    """
+
+    intensiteetit = PIIKKI + 1.0 + 3.0 * (ENERGIAT > 285)
+    alku, loppu = sl.etsi_indeksit(ENERGIAT, 275, 295)
+
+    nouseva = taustat.laske_tausta("tougaard", ENERGIAT, intensiteetit, minimi=275, maksimi=295)
+    laskeva = taustat.laske_tausta("tougaard", ENERGIAT[::-1], intensiteetit[::-1], minimi=275,
+                                   maksimi=295)
+
+    assert nouseva[alku] == pytest.approx(intensiteetit[alku])
+    assert nouseva[loppu - 1] == pytest.approx(intensiteetit[loppu - 1])
+    assert np.allclose(laskeva[::-1], nouseva, rtol=1e-12)
+
+def test_tougaard_epatasavalinen_hila():
+    """
+    Epätasavälinen data interpoloidaan tasaväliseen hilaan, joten tausta on lähes
+    sama kuin tasavälisellä datalla.
+    """
+
+    energiat = np.sort(np.concatenate([ENERGIAT[::2], ENERGIAT[1::6] + 0.01]))
+    intensiteetit = np.interp(energiat, ENERGIAT, PIIKKI + 1.0)
+
+    tausta = taustat.laske_tausta("tougaard", energiat, intensiteetit, minimi=275, maksimi=295)
+    tasavalinen = taustat.laske_tausta("tougaard", ENERGIAT, PIIKKI + 1.0, minimi=275,
+                                       maksimi=295)
+
+    assert np.allclose(tausta, np.interp(energiat, ENERGIAT, tasavalinen), atol=0.05)
+
+def test_tuntematon_malli_ja_liian_kapea_vali():
+    """
+    Tuntematon malli ja väli, jolle osuu alle kaksi mittauspistettä, nostavat ValueErrorin.
+    """
+
+    with pytest.raises(ValueError):
+        taustat.laske_tausta("eksponentti", ENERGIAT, PIIKKI)
+
+    for malli in ("shirley", "tougaard"):
+        with pytest.raises(ValueError):
+            taustat.laske_tausta(malli, ENERGIAT, PIIKKI, minimi=285.001, maksimi=285.002)
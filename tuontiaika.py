@@ -0,0 +1,62 @@
+"""
+Tuontiaika
+
+Mittaa, kuinka kauan moduulien tuominen (import) kestää, kun laskentaa käytetään
+ilman graafista käyttöliittymää. Kukin moduuli tuodaan omassa Python-prosessissaan,
+jotta aiemmat tuonnit eivät vaikuta tulokseen, ja mittaus toistetaan useasti.
+Lisäksi tarkistetaan, ettei tkinteriä tai matplotlibiä tuotu.
+
+Käyttö:
+    python tuontiaika.py [toistoja]
+"""
+
+import os
+import subprocess
+import sys
+
+MODUULIT = ["numpy", "spektrilaskenta", "spektrianalyysi", "eraajo"]
+# numpy on vertailukohta: muiden moduulien tuonnin tulisi maksaa lähes saman verran.
+KAYTTOLIITTYMA = ("tkinter", "matplotlib")
+
+MITTAUS = """
+import sys, time
+alku = time.perf_counter()
+import {}
+kesto = time.perf_counter() - alku
+gui = [nimi for nimi in sys.modules if nimi.split(".")[0] in {!r}]
+print(kesto, len(gui))
+"""
+
+def mittaa(moduuli, toistoja):
+    """
+    Tuo moduulin toistoja kertaa erillisissä prosesseissa.
+    Palauttaa nopeimman tuontiajan sekunteina sekä tiedon, tuotiinko
+    käyttöliittymäkirjastoja.
+    """
+
+    tulokset = []
+    gui = False
+
+    for _ in range(toistoja):
+        tuloste = subprocess.run([sys.executable, "-c", MITTAUS.format(moduuli, KAYTTOLIITTYMA)],
+                                 capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+        tulokset.append(float(tuloste[0]))
+        gui = gui or int(tuloste[1]) > 0
+
+    return min(tulokset), gui
+
+def main():
+    """
+    Mittaa MODUULIT-listan moduulien tuontiajat ja tulostaa ne.
+    """
+
+    toistoja = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for moduuli in MODUULIT:
+        kesto, gui = mittaa(moduuli, toistoja)
+        varoitus = "  (tuo käyttöliittymäkirjastoja!)" if gui else ""
+        print(f"{moduuli:<16} {kesto * 1000:8.1f} ms{varoitus}")
+
+if __name__ == "__main__":
+    main()
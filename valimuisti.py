@@ -0,0 +1,156 @@
+"""
+Välimuisti
+
+Levylle tallentuva välimuisti jäsennetyille mittaustiedostoille.
+Kunkin tiedoston energiat ja intensiteetit talletetaan .npy-tiedostoksi, jonka nimi
+muodostetaan tiedoston polusta, koosta ja muokkausajasta. Muuttumaton tiedosto
+saadaan siis seuraavalla latauskerralla suoraan välimuistista, mutta uusi tai
+muokattu tiedosto jäsennetään uudelleen.
+
+Välimuistin koko pidetään annetussa rajassa poistamalla pisimpään käyttämättä
+olleet tiedostot (LRU). Käyttöaikana toimii .npy-tiedoston muokkausaika, jota
+päivitetään aina, kun tiedosto luetaan välimuistista. Juuri luetun kansion tiedostoja
+ei poisteta: kansio luetaan joka kerta samassa järjestyksessä, joten rajaa suuremman
+kansion alkupään tiedostot poistuisivat muuten aina ennen seuraavaa latausta.
+"""
+
+import os
+from hashlib import sha1
+import numpy as np
+
+PAATE = ".npy"
+
+def muodosta_avain(polku):
+    """
+    Muodostaa mittaustiedoston välimuistiavaimen sen polusta, koosta ja muokkausajasta.
+    Palauttaa None, jos tiedoston tietoja ei saatu luettua.
+    """
+
+    try:
+        tiedot = os.stat(polku)
+    except OSError:
+        return None
+
+    tunniste = f"{os.path.realpath(polku)}\0{tiedot.st_size}\0{tiedot.st_mtime_ns}"
+    return sha1(tunniste.encode("utf-8")).hexdigest()
+    # Tiivisteestä saadaan tiedostonimeksi kelpaava avain.
+
+def hae(kansio, avain):
+    """
+    Hakee avainta vastaavat energiat ja intensiteetit välimuistista.
+    Taulukot luetaan muistikuvauksena (memory map), joten niitä ei kopioida muistiin
+    ennen kuin niitä käytetään.
+    Palauttaa None, jos avainta ei löytynyt, ja monikon (False, False), jos tiedosto
+    on aiemmin todettu kelvottomaksi.
+    """
+
+    polku = os.path.join(kansio, avain + PAATE)
+
+    try:
+        taulukko = np.load(polku, mmap_mode="r")
+        os.utime(polku) # Päivitetään käyttöaika LRU-poistoa varten.
+    except (OSError, ValueError):
+        # Tiedostoa ei ole tai se on vioittunut; tulkitaan, ettei sitä löytynyt.
+        return None
+
+    if taulukko.size == 0:
+        # Tyhjä taulukko merkitsee kelvotonta mittaustiedostoa.
+        return False, False
+
+    return taulukko[0], taulukko[1]
+
+def tallenna(kansio, avain, energiat, intensiteetit):
+    """
+    Tallentaa energiat ja intensiteetit välimuistiin annetulla avaimella.
+    Kelvottomasta tiedostosta (energiat on False) tallennetaan tyhjä taulukko,
+    jotta sitä ei tarvitse jäsentää joka latauskerralla uudelleen.
+    Tallennusvirheet ohitetaan, sillä välimuisti ei ole välttämätön.
+    """
+
+    if energiat is False:
+        taulukko = np.empty(0)
+    else:
+        taulukko = np.vstack((energiat, intensiteetit)) # Rivit: energiat, intensiteetit.
+
+    polku = os.path.join(kansio, avain + PAATE)
+    valiaikainen = f"{polku}.{os.getpid()}.tmp"
+    # Kirjoitetaan ensin väliaikaiseen tiedostoon, jotta rinnakkaiset prosessit
+    # eivät koskaan näe puolivalmista tiedostoa.
+
+    try:
+        os.makedirs(kansio, exist_ok=True)
+        with open(valiaikainen, "wb") as kohde:
+            np.save(kohde, taulukko)
+        os.replace(valiaikainen, polku)
+    except OSError:
+        try:
+            os.remove(valiaikainen)
+        except OSError:
+            pass
+
+def lue(kansio, polku, lukija):
+    """
+    Palauttaa mittaustiedoston energiat ja intensiteetit välimuistista, jos tiedosto
+    ei ole muuttunut. Muuten tiedosto jäsennetään annetulla lukijafunktiolla
+    (esim. spektrianalyysi.lue_tiedosto) ja tulos tallennetaan välimuistiin.
+    """
+
+    avain = muodosta_avain(polku)
+
+    if avain is None:
+        return lukija(polku) # Lukija huolehtii virheellisen tiedoston hylkäämisestä.
+
+    tulos = hae(kansio, avain)
+
+    if tulos is None: # Tiedosto on uusi tai se on muuttunut.
+        tulos = lukija(polku)
+        tallenna(kansio, avain, *tulos)
+
+    return tulos
+
+def karsi(kansio, enimmaiskoko, sailytettavat=()):
+    """
+    Pienentää välimuistin enintään annetun kokoiseksi (tavuina) poistamalla
+    pisimpään käyttämättä olleet tiedostot. Sailytettavat-avaimia (esim. juuri luetun
+    kansion tiedostot) ei poisteta, vaikka välimuisti jäisi niiden vuoksi rajaa suuremmaksi.
+    """
+
+    try:
+        tiedostot = [tiedosto for tiedosto in os.scandir(kansio)
+                     if tiedosto.name.endswith(PAATE)]
+    except OSError:
+        return
+
+    tiedot = []
+
+    for tiedosto in tiedostot:
+        if tiedosto.name[:-len(PAATE)] in sailytettavat:
+            continue
+
+        try:
+            tila = tiedosto.stat()
+        except OSError:
+            continue
+        tiedot.append((tila.st_mtime, tila.st_size, tiedosto.path))
+
+    koko = sum(tieto[1] for tieto in tiedot)
+    # Säilytettävät eivät kasvata kokoa, joten muita tiedostoja ei poisteta niiden vuoksi.
+    tiedot.sort() # Vanhin käyttöaika ensin.
+
+    for _, tiedoston_koko, polku in tiedot:
+        if koko <= enimmaiskoko:
+            break
+
+        try:
+            os.remove(polku)
+        except OSError:
+            continue
+
+        koko -= tiedoston_koko
+
+def tyhjenna(kansio):
+    """
+    Mitätöi koko välimuistin poistamalla kaikki sen tiedostot.
+    """
+
+    karsi(kansio, 0)
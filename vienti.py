@@ -0,0 +1,167 @@
+"""
+Vienti
+
+Analysoidun spektrin tallentaminen ja lukeminen yhtenä binääritiedostona (numpyn
+npz-arkisto), jolloin aineiston voi jakaa ilman tuhansia mittaustiedostoja ja sen
+voi avata jäsentämättä niitä uudelleen. Arkistossa ovat
+    versio              muodon versio (MUODON_VERSIO)
+    energiat            energia-akseli (float64)
+    intensiteetit       tiedostojen yhdistetyt intensiteetit
+    taustaton           taustaton signaali (vain, jos tausta on poistettu)
+    taustan_malli       taustamallin nimi (ks. taustat.MALLIT; vain taustattoman kanssa)
+    taustan_parametrit  taustamallin parametrit (lineaarisella kulmakerroin ja vakiotermi)
+    lkm                 yhdistettyjen mittaustiedostojen lukumäärä
+    tapa                yhdistämistapa (ks. yhdistaminen.TAVAT)
+    piikit              integroidut piikit riveittäin: huippu, e_min, e_max, intensiteetti
+
+Arkisto on zip-tiedosto, jonka taulukot ovat erillisiä npy-tiedostoja, joten kustakin
+taulukosta luetaan vain pyydetyt. Pakkaamattoman arkiston (pakkaa=False) suuret
+taulukot voidaan lisäksi avata muistikuvauksina (np.memmap) suoraan arkistosta, jolloin
+avaaminen ei riipu spektrin koosta. Moduuli ei tuo matplotlibiä.
+"""
+
+import os
+import struct
+import zipfile
+import numpy as np
+import spektrilaskenta as sl
+
+MUODON_VERSIO = 1
+PAATE = ".npz"
+SUURET = ("energiat", "intensiteetit", "taustaton") # Taulukot, jotka voidaan muistikuvata.
+PIIKIN_SARAKKEET = 4 # Piikkitaulukon sarakkeet: huippu, e_min, e_max, intensiteetti.
+PAIKALLINEN_OTSAKE = 30 # Zip-tiedoston paikallisen otsakkeen kiinteän osan koko tavuina.
+
+def tyhjat_piikit():
+    """
+    Palauttaa tyhjän piikkitaulukon.
+    """
+
+    return np.empty((0, PIIKIN_SARAKKEET))
+
+def lineaarisen_taustan_parametrit(energiat, tausta):
+    """
+    Laskee lineaarisen taustan kulmakertoimen ja vakiotermin taustan päätepisteistä.
+    Yhden pisteen spektrissä tausta on vakio.
+    """
+
+    if len(energiat) < 2 or energiat[0] == energiat[-1]:
+        return np.array([0.0, float(tausta[0]) if len(tausta) else 0.0])
+
+    return np.array(sl.laske_parametrit(energiat[0], tausta[0], energiat[-1], tausta[-1]))
+
+# pylint: disable-next=too-many-arguments
+def tallenna(polku, spektri, lkm, *, tapa="summa", piikit=None, taustan_malli="lineaarinen",
+             taustan_parametrit=None, pakkaa=True):
+    """
+    Tallentaa spektrin (spektrilaskenta.Spektri) ja analyysin tulokset npz-arkistoon.
+    piikit on taulukko (tai lista) rivejä (huippu, e_min, e_max, intensiteetti).
+    Lineaarisen taustan parametrit lasketaan spektrin taustasta, jos niitä ei anneta.
+    Arkisto kirjoitetaan väliaikaisen tiedoston kautta, joten keskeytynyt tallennus ei
+    jätä puolivalmista tiedostoa.
+    """
+
+    taulukot = {
+        "versio": np.array(MUODON_VERSIO),
+        "energiat": spektri.energiat,
+        "intensiteetit": spektri.intensiteetit,
+        "lkm": np.array(lkm, dtype=np.int64),
+        "tapa": np.array(tapa),
+        "piikit": np.asarray(tyhjat_piikit() if piikit is None else piikit,
+                             dtype=np.float64).reshape(-1, PIIKIN_SARAKKEET)
+    }
+
+    if spektri.taustaton is not None:
+        if taustan_parametrit is None and taustan_malli == "lineaarinen":
+            taustan_parametrit = lineaarisen_taustan_parametrit(spektri.energiat, spektri.tausta)
+
+        taulukot["taustaton"] = spektri.taustaton
+        taulukot["taustan_malli"] = np.array(taustan_malli)
+        taulukot["taustan_parametrit"] = np.asarray(
+            () if taustan_parametrit is None else taustan_parametrit, dtype=np.float64)
+
+    valiaikainen = f"{polku}.{os.getpid()}.tmp"
+
+    with open(valiaikainen, "wb") as tiedosto:
+        (np.savez_compressed if pakkaa else np.savez)(tiedosto, **taulukot)
+        # Tiedostoon kirjoitettaessa numpy ei lisää nimeen .npz-päätettä.
+
+    os.replace(valiaikainen, polku)
+
+def _muistikuvaa(polku, arkisto, nimi):
+    """
+    Avaa arkiston pakkaamattoman taulukon muistikuvauksena (vain luku). Palauttaa None,
+    jos taulukko on pakattu, tyhjä tai sen otsaketta ei tunnisteta.
+    """
+
+    info = arkisto.getinfo(nimi + ".npy")
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open(polku, "rb") as tiedosto:
+        tiedosto.seek(info.header_offset)
+        nimen_pituus, lisan_pituus = struct.unpack(
+            "<HH", tiedosto.read(PAIKALLINEN_OTSAKE)[PAIKALLINEN_OTSAKE - 4:])
+        tiedosto.seek(info.header_offset + PAIKALLINEN_OTSAKE + nimen_pituus + lisan_pituus)
+        # Paikallisen otsakkeen lisäkenttä voi poiketa keskushakemiston vastaavasta,
+        # joten pituudet luetaan paikallisesta otsakkeesta.
+        versio = np.lib.format.read_magic(tiedosto)
+
+        if versio == (1, 0):
+            muoto, fortran, tyyppi = np.lib.format.read_array_header_1_0(tiedosto)
+        elif versio == (2, 0):
+            muoto, fortran, tyyppi = np.lib.format.read_array_header_2_0(tiedosto)
+        else:
+            return None
+
+        alku = tiedosto.tell()
+
+    if tyyppi.hasobject or 0 in muoto: # Tyhjää taulukkoa ei voi muistikuvata.
+        return None
+
+    return np.memmap(polku, dtype=tyyppi, mode="r", shape=muoto,
+                     order="F" if fortran else "C", offset=alku)
+
+def lue(polku, taulukot=SUURET, muistikuvaus=False):
+    """
+    Lukee tallenna-funktiolla tallennetun arkiston sanakirjaksi, jonka avaimet ovat
+    arkiston taulukoiden nimet (ks. moduulin kuvaus); taustan malli ja parametrit ovat
+    None, jos taustaa ei ole poistettu. Suurista taulukoista (SUURET) luetaan vain
+    taulukot-parametrissa luetellut, muut ovat None. Jos muistikuvaus on tosi,
+    pakkaamattomat suuret taulukot avataan muistikuvauksina lukematta niitä muistiin.
+    Nostaa ValueErrorin, jos tiedosto ei ole spektriarkisto.
+    """
+
+    try:
+        arkisto = np.load(polku, allow_pickle=False)
+
+        if not isinstance(arkisto, np.lib.npyio.NpzFile): # Esim. yksittäinen npy-tiedosto.
+            raise ValueError(f"Tiedosto {polku} ei ole spektriarkisto.")
+
+        with arkisto:
+            if "versio" not in arkisto.files or int(arkisto["versio"]) > MUODON_VERSIO:
+                raise ValueError(f"Tiedosto {polku} ei ole tuettu spektriarkisto.")
+
+            tiedot = {"lkm": int(arkisto["lkm"]), "tapa": str(arkisto["tapa"]),
+                      "piikit": arkisto["piikit"], "taustan_malli": None,
+                      "taustan_parametrit": None}
+
+            if "taustaton" in arkisto.files:
+                tiedot["taustan_malli"] = str(arkisto["taustan_malli"])
+                tiedot["taustan_parametrit"] = arkisto["taustan_parametrit"]
+
+            for nimi in SUURET:
+                tiedot[nimi] = None
+
+                if nimi in taulukot and nimi in arkisto.files:
+                    if muistikuvaus:
+                        tiedot[nimi] = _muistikuvaa(polku, arkisto.zip, nimi)
+
+                    if tiedot[nimi] is None: # Pakattu taulukko puretaan muistiin.
+                        tiedot[nimi] = arkisto[nimi]
+    except (zipfile.BadZipFile, KeyError, EOFError) as virhe:
+        # Tyhjästä tai katkenneesta tiedostosta np.load nostaa EOFErrorin.
+        raise ValueError(f"Tiedosto {polku} ei ole eheä spektriarkisto.") from virhe
+
+    return tiedot
@@ -0,0 +1,87 @@
+"""
+Yhdistäminen
+
+Mittaustiedostojen yhdistäminen tiedostokohtaisesta intensiteettimatriisista
+(ks. matriisi.py) summaa kestävämmillä tavoilla: keskiarvo, mediaani ja sigma-
+leikattu keskiarvo, jossa kunkin energian poikkeavat arvot hylätään ennen keskiarvoa.
+Yksi kohinainen tai saturoitunut mittaus ei tällöin pilaa koko tulosta.
+
+Matriisi käsitellään energia-akselin suuntaisina paloina, joihin kuuluvat kaikki
+tiedostot, joten mediaania varten muistissa on kerrallaan vain yksi pala eikä
+koko matriisia.
+"""
+
+import numpy as np
+
+TAVAT = ("summa", "keskiarvo", "mediaani", "sigmaleikkaus") # Yhdistämistavat.
+KAPPA = 3.0
+# Sigmaleikkauksessa hylätään arvot, jotka poikkeavat keskiarvosta enemmän kuin
+# KAPPA keskihajontaa.
+LEIKKAUSKIERROKSIA = 5 # Sigmaleikkauksen kierrosten enimmäismäärä.
+PALAN_KOKO = 64 * 1024 ** 2 # Kerralla käsiteltävän palan enimmäiskoko tavuina.
+
+def sigmaleikkaa(pala, kappa=KAPPA, kierroksia=LEIKKAUSKIERROKSIA):
+    """
+    Laskee palan (tiedostot x energiat) sarakkeiden sigmaleikatut keskiarvot.
+    Kullakin kierroksella hylätään arvot, jotka poikkeavat jäljellä olevien arvojen
+    keskiarvosta enemmän kuin kappa keskihajontaa; kierrokset lopetetaan, kun mitään
+    ei enää hylätä. Palauttaa keskiarvot ja hylkäysmaskin (tosi = hylätty).
+    """
+
+    hylatyt = np.zeros(pala.shape, dtype=bool)
+    keskiarvo = pala.mean(axis=0)
+
+    for _ in range(kierroksia):
+        poikkeamat = np.abs(pala - keskiarvo)
+        jaljella = np.where(hylatyt, 0, poikkeamat) # Hylätyt arvot eivät vaikuta hajontaan.
+        maara = pala.shape[0] - hylatyt.sum(axis=0)
+        hajonta = np.sqrt(np.einsum("ij,ij->j", jaljella, jaljella) / maara)
+        uudet = ~hylatyt & (poikkeamat > kappa * hajonta)
+        # Hajonnan ollessa nolla mitään ei hylätä, sillä kaikki arvot ovat samat.
+
+        if not uudet.any():
+            break
+
+        hylatyt |= uudet
+        maara -= uudet.sum(axis=0)
+        keskiarvo = np.where(hylatyt, 0, pala).sum(axis=0) / maara
+        # Keskiarvo lasketaan uudelleen vain jäljelle jääneistä arvoista.
+
+    return keskiarvo, hylatyt
+
+def yhdista(intensiteetit, tapa="summa", kappa=KAPPA, kierroksia=LEIKKAUSKIERROKSIA,
+            palan_koko=PALAN_KOKO):
+    """
+    Yhdistää intensiteettimatriisin (tiedostot x energiat, esim. np.memmap) rivit
+    annetulla tavalla (ks. TAVAT). Matriisi luetaan energia-akselin suuntaisina
+    paloina. Palauttaa yhdistetyt intensiteetit float64-taulukkona ja kunkin tiedoston
+    hylättyjen pisteiden määrän (nollia, jos tapa ei hylkää mitään).
+    """
+
+    if tapa not in TAVAT:
+        raise ValueError(f"Tuntematon yhdistämistapa: {tapa}")
+
+    tiedostoja, pisteita = intensiteetit.shape
+    tulos = np.zeros(pisteita)
+    hylatyt = np.zeros(tiedostoja, dtype=np.int64)
+
+    if tiedostoja == 0:
+        return tulos, hylatyt
+
+    leveys = max(1, palan_koko // (8 * tiedostoja)) # Palan leveys energioina.
+
+    for alku in range(0, pisteita, leveys):
+        pala = np.asarray(intensiteetit[:, alku:alku + leveys], dtype=np.float64)
+        # Kopioidaan pala muistiin; muistikuvauksesta luetaan vain tämän palan sarakkeet.
+
+        if tapa == "summa":
+            tulos[alku:alku + leveys] = pala.sum(axis=0)
+        elif tapa == "keskiarvo":
+            tulos[alku:alku + leveys] = pala.mean(axis=0)
+        elif tapa == "mediaani":
+            tulos[alku:alku + leveys] = np.median(pala, axis=0)
+        else:
+            tulos[alku:alku + leveys], maski = sigmaleikkaa(pala, kappa, kierroksia)
+            hylatyt += maski.sum(axis=1)
+
+    return tulos, hylatyt